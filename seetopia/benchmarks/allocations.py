@@ -0,0 +1,164 @@
+"""Per frame memory allocation benchmark of the measurement stage.
+
+Replays a recording made with :class:`src.core.replay.Recorder` through
+:func:`baseline_measurements`, the measurement stage as it was before the
+buffer pool, and through
+:func:`src.core.oak_pipeline.OakPipeline.draw_measurements` with the
+preallocated :class:`src.utils.buffers.FrameWorkspace`, and reports the
+memory allocated and released within each frame.
+
+From the ``seetopia`` directory,
+
+>>> python -m benchmarks.allocations path/to/recording --frames 300
+"""
+
+import argparse
+import functools
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from src.core import oak_pipeline as op
+from src.core import replay
+from src.utils import utils
+
+
+def baseline_measurements(oak, frame, detections, draw=True):
+    """Measurement stage before the buffer pool, with the same copies and
+    allocations: the copy of the frame made by ``decode_barcode`` on every
+    frame, a fresh image for every step and for the overlays, the ``float64``
+    dilation kernel built on every frame and the final same size resize.
+    Barcodes are not decoded, only the edge detection is emulated.
+
+    Returns
+    -------
+    img
+        Frame with the bounding boxes drawn
+    dict
+        Dimensions of the object (length,width,depth)
+    """
+    cv = oak.settings.cv
+    obj_h = 0
+    height, width = frame.shape[:2]
+    img_bar = frame.copy()  # noqa: F841, made by decode_barcode
+    img_wrap = frame.copy()
+    img_blur = cv2.GaussianBlur(
+        img_wrap, (cv.kernel_gauss, cv.kernel_gauss), cv.iter_gauss
+    )
+    img_gray = cv2.cvtColor(img_blur, cv2.COLOR_BGR2GRAY)
+    img_canny = cv2.Canny(img_gray, oak.threshold1, oak.threshold2)
+    kernel = np.ones((cv.kernel_dilate, cv.kernel_dilate))
+    img_dil = cv2.dilate(img_canny, kernel, iterations=cv.iter_dilate)
+    img_contour, obj_l, obj_w = utils.get_bounding_rect(
+        img_wrap_shadow=img_wrap,
+        img=img_dil,
+        img_contour=img_wrap,
+        scale_factor=oak.scale_factor,
+        area_min=oak.area_min,
+        draw=False,
+        regular_box=False,
+        color=(0, 255, 255),
+    )
+    for detection in detections:
+        x1 = int(detection.xmin * width)
+        y1 = int(detection.ymin * height)
+        try:
+            label = oak.label_map[detection.label]
+        except (IndexError, TypeError):
+            label = detection.label
+        if label == "object":
+            obj_h = oak.base_depth - int(detection.spatialCoordinates.z) / 10
+            if draw:
+                cv2.putText(
+                    img_contour,
+                    "Z: {:.2f} cm".format(obj_h),
+                    (x1 + 18, y1 + 95),
+                    cv2.FONT_HERSHEY_TRIPLEX,
+                    0.5,
+                    oak.color,
+                )
+    img_contour = cv2.resize(img_contour, (width, height))
+    return img_contour, {"length": obj_l, "width": obj_w, "depth": obj_h}
+
+
+def run(measure, device, n_frames, draw=True, warmup=5):
+    """Processes ``n_frames`` frames and traces the allocations of each.
+
+    Parameters
+    ----------
+    measure : callable
+        Measurement stage, called with the frame, its detections and
+        ``draw``, eg. ``OakPipeline.draw_measurements``
+    device : :class:`src.core.replay.ReplayDevice`
+        Source of the ``rgb`` and ``detections`` queues
+    n_frames : int
+        Number of measured frames
+    draw : bool, optional
+        Passed on to ``draw_measurements``, by default True
+    warmup : int, optional
+        Number of frames processed before measuring, by default 5
+
+    Returns
+    -------
+    np array
+        Peak transient bytes allocated within each frame
+    int
+        Bytes retained after the last frame compared to the first one
+    float
+        Mean time per frame in milliseconds
+    """
+    preview_queue = device.getOutputQueue(name="rgb")
+    detection_nn_queue = device.getOutputQueue(name="detections")
+    inputs = [
+        (preview_queue.get().getCvFrame(), detection_nn_queue.get().detections)
+        for _ in range(len(device))
+    ]
+    for i in range(warmup):
+        measure(*inputs[i % len(inputs)], draw=draw)
+
+    transient = np.zeros(n_frames)
+    tracemalloc.start()
+    start_memory, _ = tracemalloc.get_traced_memory()
+    start_time = time.perf_counter()
+    for i in range(n_frames):
+        frame, detections = inputs[i % len(inputs)]
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        measure(frame, detections, draw=draw)
+        _, peak = tracemalloc.get_traced_memory()
+        transient[i] = peak - before
+    elapsed = time.perf_counter() - start_time
+    end_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return transient, end_memory - start_memory, elapsed * 1000 / n_frames
+
+
+def report(name, transient, retained, latency):
+    """Prints the allocation statistics of one run"""
+    print(
+        f"{name:<10} transient/frame: mean {transient.mean() / 1024:8.1f} KiB"
+        f" | max {transient.max() / 1024:8.1f} KiB"
+        f" | retained {retained / 1024:6.1f} KiB | {latency:.2f} ms/frame"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", help="directory written by replay.Recorder")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--no-draw", action="store_true")
+    args = parser.parse_args()
+
+    oak = op.OakPipeline()
+    stages = (
+        ("before", functools.partial(baseline_measurements, oak)),
+        ("after", oak.draw_measurements),
+    )
+    for name, measure in stages:
+        with replay.ReplayDevice(args.recording, fps=None, loop=True) as device:
+            report(name, *run(measure, device, args.frames, draw=not args.no_draw))
+    oak.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Micro benchmark of the box measurements of
+:func:`src.utils.utils.get_bounding_rect`.
+
+Compares measuring the contours one at a time, as done before
+:func:`src.utils.utils.measure_boxes`, with the batched measurements and
+with :func:`src.utils.utils.draw_boxes` rendering them, on a synthetic
+frame with ``--boxes`` objects and ``--noise`` speckles.
+
+From the ``seetopia`` directory,
+
+>>> python -m benchmarks.bounding_rect --boxes 50 --noise 0.05
+"""
+
+import argparse
+import timeit
+import cv2
+import numpy as np
+from src.utils import utils
+
+
+def synthetic_contours(boxes, noise, seed=0):
+    """Returns the contours of a 600x600 frame with ``boxes`` rotated boxes
+    and a ``noise`` fraction of speckle pixels"""
+    rng = np.random.default_rng(seed)
+    img = (rng.random((600, 600)) < noise).astype(np.uint8) * 255
+    for _ in range(boxes):
+        center = rng.uniform(40, 560, 2)
+        size = rng.uniform(20, 60, 2)
+        box = cv2.boxPoints((tuple(center), tuple(size), rng.uniform(0, 90)))
+        cv2.fillPoly(img, [box.astype(np.int32)], 255)
+    contours, _ = cv2.findContours(img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    return contours
+
+
+def per_contour(contours, scale_factor, area_min):
+    """Measures the contours one at a time"""
+    measured = []
+    for cnt in contours:
+        if cv2.contourArea(cnt) <= area_min:
+            continue
+        box = cv2.boxPoints(cv2.minAreaRect(cnt)).astype(np.int32)
+        points = utils.re_order(box)
+        obj_l = round(
+            utils.find_distance(
+                points[0] // scale_factor[0], points[1] // scale_factor[0]
+            )
+            / 10,
+            1,
+        )
+        obj_w = round(
+            utils.find_distance(
+                points[0] // scale_factor[1], points[2] // scale_factor[1]
+            )
+            / 10,
+            1,
+        )
+        measured.append((obj_l, obj_w))
+    return measured
+
+
+def run(contours, number, area_min=200, scale_factor=(0.92, 0.92)):
+    """Times each way of measuring ``contours``
+
+    Returns
+    -------
+    dict
+        Milliseconds per frame, keyed by the measuring function
+    """
+    canvas = np.zeros((600, 600, 3), dtype=np.uint8)
+    cases = {
+        "per contour": lambda: per_contour(contours, scale_factor, area_min),
+        "measure_boxes": lambda: utils.measure_boxes(contours, scale_factor, area_min),
+        "+ draw_boxes": lambda: utils.draw_boxes(
+            canvas, utils.measure_boxes(contours, scale_factor, area_min)
+        ),
+    }
+    return {
+        name: min(timeit.repeat(case, number=number, repeat=5)) / number * 1000
+        for name, case in cases.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boxes", type=int, default=50)
+    parser.add_argument("--noise", type=float, default=0.0)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    contours = synthetic_contours(args.boxes, args.noise)
+    kept = len(utils.measure_boxes(contours, (0.92, 0.92), 200).index)
+    print(f"{len(contours)} contours, {kept} measured")
+    for name, elapsed in run(contours, args.number).items():
+        print(f"{name:<16} {elapsed:8.3f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""End-to-end throughput benchmark of the host side capture loop.
+
+Replays a recording made with :class:`src.core.replay.Recorder` through the
+same queues used by :func:`src.qa_app_demo.QAApp._start_pipeline` and runs
+barcode decoding, :func:`src.core.oak_pipeline.OakPipeline.draw_measurements`
+and the display hand-off as fast as possible. The latency of each stage
+recorded by :class:`src.utils.latency.LatencyTracer` is reported as well.
+
+From the ``seetopia`` directory,
+
+>>> python -m benchmarks.capture_loop path/to/recording --frames 500
+>>> python -m benchmarks.capture_loop path/to/recording --no-render
+"""
+
+import argparse
+import time
+import numpy as np
+from src.core import oak_pipeline as op
+from src.core import replay
+from src.core import stream_sync
+from src.conf import config
+
+cfg = config.cfg
+
+
+def display_handoff(frame):
+    """Mirrors the work done on a frame by :func:`src.qa_app_demo.QAApp._display_frame`
+    before it is uploaded to the texture"""
+    return np.ascontiguousarray(frame).reshape(-1)
+
+
+def run(oak, device, n_frames, warmup=20):
+    """Runs the capture loop over ``device`` and measures per frame latency.
+
+    Parameters
+    ----------
+    oak : :class:`src.core.oak_pipeline.OakPipeline`
+        Pipeline used to process the frames
+    device : :class:`src.core.replay.ReplayDevice`
+        Source of the ``rgb`` and ``detections`` queues
+    n_frames : int
+        Number of measured frames
+    warmup : int, optional
+        Number of frames processed before measuring, by default 20
+
+    Returns
+    -------
+    float
+        Frames per second
+    np array
+        Per frame latencies in milliseconds
+    """
+    queues = {
+        name: device.getOutputQueue(
+            name=name,
+            maxSize=cfg.calib.out_queue_max_size,
+            blocking=cfg.calib.out_queue_blocking,
+        )
+        for name in ("rgb", "detections")
+    }
+    sync = stream_sync.StreamSync(list(queues))
+    latencies = np.zeros(n_frames)
+    for i in range(warmup + n_frames):
+        if i == warmup:
+            start_time = time.perf_counter()
+        frame_start = time.perf_counter()
+        with oak.latency.stage("queue_wait"):
+            messages = sync.get(device, queues)
+        in_preview = messages["rgb"]
+        in_nn = messages["detections"]
+        with oak.latency.stage("get_cv_frame"):
+            frame = in_preview.getCvFrame()
+        oak.latency.frame()
+        _, _, img_contour, _ = oak.process_frame(
+            frame, in_nn.detections, seq=in_preview.getSequenceNum()
+        )
+        display_handoff(img_contour)
+        if i >= warmup:
+            latencies[i - warmup] = (time.perf_counter() - frame_start) * 1000
+    fps = oak.calc_fps(n_frames, start_time, time.perf_counter())
+    return fps, latencies
+
+
+def report(fps, latencies):
+    """Prints the throughput and latency percentiles"""
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"frames:  {len(latencies)}")
+    print(f"fps:     {fps:.1f}")
+    print(f"latency: p50 {p50:.2f} ms | p95 {p95:.2f} ms | p99 {p99:.2f} ms")
+    print(f"         max {latencies.max():.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", help="directory written by replay.Recorder")
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument(
+        "--no-render", action="store_true", help="measure without the overlays"
+    )
+    args = parser.parse_args()
+
+    oak = op.OakPipeline()
+    oak.render = not args.no_render
+    with replay.ReplayDevice(args.recording, fps=None, loop=True) as device:
+        device.startPipeline()
+        fps, latencies = run(oak, device, args.frames, args.warmup)
+    oak.close()
+    report(fps, latencies)
+    print(f"gated:   {oak.gated_frames} static frames reused")
+    # Per stage breakdown, warmup frames included
+    print(oak.latency.report())
+
+
+if __name__ == "__main__":
+    main()
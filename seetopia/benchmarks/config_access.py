@@ -0,0 +1,78 @@
+"""Micro benchmark of the configuration reads made on the per frame paths.
+
+Compares reading the parameters of
+:func:`src.core.oak_pipeline.OakPipeline.draw_measurements` from the
+composed OmegaConf ``DictConfig``, through the lazy ``cfg`` proxy, and from
+the frozen snapshot of :func:`src.conf.config.runtime`, and reports the
+overhead per frame.
+
+From the ``seetopia`` directory,
+
+>>> python -m benchmarks.config_access --number 100000
+"""
+
+import argparse
+import timeit
+from src.conf import config
+
+# Parameters read per frame by draw_measurements and scan_barcode_rois
+FRAME_READS = (
+    "kernel_gauss",
+    "kernel_gauss",
+    "iter_gauss",
+    "iter_dilate",
+    "barcode_roi_pad",
+    "barcode_full_frame_interval",
+    "barcode_scales",
+    "height_percentile",
+)
+
+
+def frame_reads(root):
+    """Returns a function making the reads of one frame from ``root``"""
+
+    def read():
+        for name in FRAME_READS:
+            getattr(root.cv, name)
+
+    return read
+
+
+def run(number):
+    """Times the reads of one frame from each form of the configuration
+
+    Returns
+    -------
+    dict
+        Microseconds per frame, keyed by the form of the configuration
+    """
+    sources = {
+        "DictConfig": config.get_config(),
+        "lazy cfg": config.cfg,
+        "snapshot": config.runtime(),
+    }
+    results = {}
+    for name, root in sources.items():
+        read = frame_reads(root)
+        elapsed = min(timeit.repeat(read, number=number, repeat=5))
+        results[name] = elapsed / number * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    results = run(args.number)
+    snapshot = results["snapshot"]
+    print(f"{len(FRAME_READS)} config reads per frame")
+    for name, per_frame in results.items():
+        print(
+            f"{name:<12} {per_frame:8.2f} us/frame"
+            f" | overhead vs snapshot {per_frame - snapshot:8.2f} us/frame"
+        )
+
+
+if __name__ == "__main__":
+    main()
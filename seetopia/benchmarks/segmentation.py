@@ -0,0 +1,98 @@
+"""Benchmark of the segmentation modes of
+:func:`src.core.oak_pipeline.OakPipeline.draw_measurements`.
+
+Measures a textured box on a green mat under a drifting lighting, on
+synthetic frames, with the edge detection and with the background model of
+:class:`src.utils.background.BackgroundModel` learned from the empty mat.
+Reports the runtime per frame and the error and jitter of the measured
+length and width.
+
+From the ``seetopia`` directory,
+
+>>> python -m benchmarks.segmentation --frames 300 --drift 0.05
+"""
+
+import argparse
+import time
+import cv2
+import numpy as np
+from src.core import oak_pipeline as op
+from src.conf import config
+
+BOX = ((150, 150), (120, 80), 20)  # centre, size in px and angle
+
+
+def synthetic_frames(n, drift, size=300, seed=0):
+    """Returns ``n`` frames of the empty mat and ``n`` frames of the mat with
+    a textured box, the brightness drifting by up to ``drift``"""
+    rng = np.random.default_rng(seed)
+    mat = np.empty((size, size, 3), dtype=np.float32)
+    mat[:] = (60, 140, 60)
+    mat += rng.normal(0, 4, mat.shape)
+    scene = mat.copy()
+    box = cv2.boxPoints(BOX).astype(np.int32)
+    mask = np.zeros((size, size), dtype=np.uint8)
+    cv2.fillPoly(mask, [box], 255)
+    # Printed packaging with a glossy highlight
+    texture = rng.integers(90, 230, (size // 8, size // 8, 3)).astype(np.float32)
+    texture = cv2.resize(texture, (size, size), interpolation=cv2.INTER_NEAREST)
+    cv2.circle(texture, BOX[0], 20, (250, 250, 250), -1)
+    scene[mask > 0] = texture[mask > 0]
+
+    def frames(base):
+        out = []
+        for i in range(n):
+            gain = 1 + drift * np.sin(2 * np.pi * i / n)
+            frame = base * gain + rng.normal(0, 3, base.shape)
+            out.append(np.clip(frame, 0, 255).astype(np.uint8))
+        return out
+
+    return frames(mat), frames(scene)
+
+
+def run(oak, empty, scene):
+    """Learns the empty mat and measures the scene
+
+    Returns
+    -------
+    float
+        Milliseconds per frame
+    np array
+        Length and width measured in each frame, in cm
+    """
+    oak.background.reset()
+    for frame in empty:
+        oak.draw_measurements(frame, [], draw=False)
+    measured = []
+    start = time.perf_counter()
+    for frame in scene:
+        _, dimension = oak.draw_measurements(frame, [], draw=False)
+        measured.append(sorted((dimension["length"], dimension["width"])))
+    elapsed = time.perf_counter() - start
+    return elapsed / len(scene) * 1000, np.array(measured)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--drift", type=float, default=0.05)
+    args = parser.parse_args()
+
+    empty, scene = synthetic_frames(args.frames, args.drift)
+    oak = op.OakPipeline()
+    scale = np.asarray(oak.scale_factor)
+    truth = np.sort(np.asarray(BOX[1]) / scale / 10)
+    for mode in ("edges", "background"):
+        config.reload([f"cv.segmentation={mode}"])
+        ms, measured = run(oak, empty, scene)
+        error = np.abs(measured - truth).mean()
+        jitter = measured.std(axis=0).mean()
+        print(
+            f"{mode:<12} {ms:8.3f} ms/frame"
+            f" | error {error:6.2f} cm | jitter {jitter:6.2f} cm"
+        )
+    oak.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Start up benchmark: import time profile and time to first frame.
+
+Profiles the imports of a module with ``python -X importtime`` and reports
+the slowest ones, then measures in fresh interpreters how long it takes to
+import the pipeline, compose the configuration, build
+:class:`src.core.oak_pipeline.OakPipeline` and process the first frame of a
+recording made with :class:`src.core.replay.Recorder`.
+
+From the ``seetopia`` directory,
+
+>>> python -m benchmarks.startup path/to/recording --runs 5
+>>> python -m benchmarks.startup --profile src.qa_app_demo --top 20
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile(module, top=15):
+    """Imports ``module`` in a fresh interpreter with ``-X importtime``.
+
+    Parameters
+    ----------
+    module : str
+        Module to import, eg. ``src.qa_app_demo``
+    top : int, optional
+        Number of imports returned, by default 15
+
+    Returns
+    -------
+    list
+        ``(cumulative_us, self_us, name)`` of the ``top`` slowest imports,
+        slowest first
+    int
+        Cumulative import time of ``module`` in microseconds
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.append((int(cumulative_us), int(self_us), name.rstrip()))
+    total = max(cumulative for cumulative, _, _ in imports)
+    return sorted(imports, reverse=True)[:top], total
+
+
+def first_frame(recording):
+    """Runs in the child interpreter and returns the elapsed time of each
+    start up stage, in milliseconds"""
+    stages = {}
+    start = last = time.perf_counter()
+
+    def stage(name):
+        nonlocal last
+        now = time.perf_counter()
+        stages[name] = (now - last) * 1000
+        last = now
+
+    from src.core import oak_pipeline as op
+    from src.core import replay
+    from src.conf import config
+
+    stage("imports")
+    config.get_config()
+    stage("config")
+    oak = op.OakPipeline()
+    stage("pipeline")
+    device = replay.ReplayDevice(recording, fps=None, loop=False)
+    device.startPipeline()
+    preview_queue = device.getOutputQueue(name="rgb")
+    detection_nn_queue = device.getOutputQueue(name="detections")
+    stage("device")
+    in_preview = preview_queue.get()
+    oak.process_frame(
+        in_preview.getCvFrame(),
+        detection_nn_queue.get().detections,
+        seq=in_preview.getSequenceNum(),
+    )
+    stage("first_frame")
+    stages["total"] = (last - start) * 1000
+    # Wall clock, to be compared with the launch time in the parent
+    stages["ready"] = time.time()
+    oak.close()
+    return stages
+
+
+def time_to_first_frame(recording, runs=5):
+    """Measures :func:`first_frame` in ``runs`` fresh interpreters.
+
+    Returns
+    -------
+    dict
+        Median elapsed time of each stage in milliseconds, ``process`` being
+        the wall time from launching the interpreter to the first frame
+    """
+    samples = []
+    for _ in range(runs):
+        launch = time.time()
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup", recording, "--child"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            raise RuntimeError(f"First frame run failed:\n{result.stderr}")
+        stages = json.loads(result.stdout.strip().splitlines()[-1])
+        stages["process"] = (stages.pop("ready") - launch) * 1000
+        samples.append(stages)
+    return {k: statistics.median(s[k] for s in samples) for k in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "recording", nargs="?", help="directory written by replay.Recorder"
+    )
+    parser.add_argument("--profile", default="src.qa_app_demo")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(first_frame(args.recording)), flush=True)
+        return
+
+    if args.profile:
+        imports, total = import_profile(args.profile, args.top)
+        print(f"import {args.profile}: {total / 1000:.1f} ms")
+        for cumulative, self_us, name in imports:
+            print(
+                f"  {cumulative / 1000:8.1f} ms  (self {self_us / 1000:6.1f} ms) {name}"
+            )
+    if args.recording:
+        stages = time_to_first_frame(args.recording, args.runs)
+        print(f"time to first frame (median of {args.runs} runs)")
+        for name, elapsed in stages.items():
+            print(f"  {name:<12} {elapsed:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
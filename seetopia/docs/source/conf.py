@@ -64,6 +64,18 @@ extlinks = {
         "https://docs.opencv.org/3.4/d3/dc0/group__imgproc__shape.html#ga17ed9f5d79ae97bd4c7cf18403e1689a",
         "find_contours",
     ),
+    "contour_area": (
+        "https://docs.opencv.org/3.4/d3/dc0/group__imgproc__shape.html#ga2c759ed9f497d4a618048a2f56dc97f1",
+        "contour_area",
+    ),
+    "min_area_rect": (
+        "https://docs.opencv.org/3.4/d3/dc0/group__imgproc__shape.html#ga3d476a3417130ae5154aea421ca7ead9",
+        "min_area_rect",
+    ),
+    "accumulate_weighted": (
+        "https://docs.opencv.org/3.4/d7/df3/group__imgproc__motion.html#ga4f9552b541187f61f6818e8d2d826bc7",
+        "accumulate_weighted",
+    ),
     "depthai_pipeline": (
         "https://docs.luxonis.com/projects/api/en/latest/references/python/#depthai.Pipeline",
         "depthai_pipeline",
@@ -1,7 +1,15 @@
 import sys
 import os
-from .qa_app_demo import QAApp
-from kivy.resources import resource_add_path
+
+
+def __getattr__(name):
+    # The kivy app is imported on first use, so that ``src.core`` and
+    # ``src.utils`` can be imported without loading kivy
+    if name == "QAApp":
+        from .qa_app_demo import QAApp
+
+        return QAApp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def main():
@@ -17,6 +25,9 @@ def main():
     >>> resource_add_path(os.path.join(sys._MEIPASS))
 
     """
+    from kivy.resources import resource_add_path
+    from .qa_app_demo import QAApp
+
     if hasattr(sys, "_MEIPASS"):
         resource_add_path(os.path.join(sys._MEIPASS))
     QAApp().run()
@@ -5,6 +5,7 @@ from hydra.core.config_store import ConfigStore
 from hydra.experimental import compose, initialize
 from omegaconf import MISSING, OmegaConf
 from ..utils import utils  # ..
+import threading
 from dataclasses import dataclass
 from typing import List
 
@@ -68,7 +69,38 @@ class CvDefaultConfig(CvConfig):
     g_color: int = MISSING
     b_color: int = MISSING
     display: bool = MISSING
+    preview_screens: List = MISSING
     debug: bool = MISSING
+    barcode_async: bool = MISSING
+    barcode_workers: int = MISSING
+    barcode_roi: bool = MISSING
+    barcode_roi_pad: float = MISSING
+    barcode_scales: List = MISSING
+    barcode_full_frame_interval: int = MISSING
+    matcher: str = MISSING
+    match_ratio: float = MISSING
+    device_edges: bool = MISSING
+    device_edge_thres: int = MISSING
+    segmentation: str = MISSING
+    background_learn_frames: int = MISSING
+    background_alpha: float = MISSING
+    background_thres: int = MISSING
+    background_depth_thres: float = MISSING
+    change_gate: bool = MISSING
+    change_thumb: int = MISSING
+    change_thres: int = MISSING
+    change_ratio: float = MISSING
+    change_refresh: int = MISSING
+    height_source: str = MISSING
+    height_percentile: int = MISSING
+    measure_window: int = MISSING
+    measure_min_samples: int = MISSING
+    measure_lock_std: float = MISSING
+    measure_unlock_tol: float = MISSING
+    measure_unlock_frames: int = MISSING
+    measure_max_missing: int = MISSING
+    latency_window: int = MISSING
+    latency_dir: str = MISSING
 
 
 @dataclass
@@ -118,6 +150,15 @@ class OakDConfig(CalibConfig):
     base_depth: int = MISSING
     syncnn: bool = MISSING
     full_frame_tracking: bool = MISSING
+    replay_fpath: str = MISSING
+    replay_fps: float = MISSING
+    record_fpath: str = MISSING
+    devices: List = MISSING
+    frame_ring_name: str = MISSING
+    frame_ring_slots: int = MISSING
+    sync_max_pending: int = MISSING
+    sync_max_skew: float = MISSING
+    depth_full_fov: bool = MISSING
 
 
 @dataclass
@@ -138,6 +179,20 @@ class DbConfig:
         connections available"""
 
     driver: str = MISSING
+    barcode_miss_ttl: float = MISSING
+    barcode_appear_timeout: float = MISSING
+    descriptor_cache: bool = MISSING
+    wms_url: str = MISSING
+    wms_timeout: float = MISSING
+    wms_retries: int = MISSING
+    wms_backoff: float = MISSING
+    wms_pool_size: int = MISSING
+    master_data_ttl: float = MISSING
+    master_data_max_size: int = MISSING
+    journal_fpath: str = MISSING
+    journal_batch_size: int = MISSING
+    journal_backoff: float = MISSING
+    journal_max_backoff: float = MISSING
 
 
 @dataclass
@@ -233,5 +288,173 @@ def load_config(cfg: Config) -> None:
     print(OmegaConf.to_yaml(cfg))
 
 
-hydra.initialize(config_path="conf", job_name="test_app")
-cfg = hydra.compose(config_name="configs")
+_cfg = None
+_runtime = None
+_cfg_lock = threading.RLock()
+_listeners = []
+_node_classes = {}
+
+
+def get_config():
+    """Initialises Hydra and composes the configuration on first use, then
+    returns the same configuration on every call.
+
+    Returns
+    -------
+    :class:`omegaconf.DictConfig`
+        Composed ``configs`` configuration
+    """
+    global _cfg
+    if _cfg is None:
+        with _cfg_lock:
+            if _cfg is None:
+                hydra.initialize(config_path="conf", job_name="test_app")
+                _cfg = hydra.compose(config_name="configs")
+    return _cfg
+
+
+class LazyConfig:
+    """Stand-in for the composed configuration, which defers
+    :func:`get_config` until an attribute is first read. Modules can bind
+    ``cfg = config.cfg`` at import time without paying for Hydra.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_config(), name)
+
+    def __repr__(self):
+        return repr(get_config()) if _cfg is not None else "LazyConfig(<not loaded>)"
+
+
+cfg = LazyConfig()
+
+
+class FrozenConfig:
+    """Read only, ``__slots__`` based copy of a configuration node, built by
+    :func:`freeze`. Reading a value is a plain attribute lookup, unlike the
+    ``DictConfig`` nodes of OmegaConf, so it is the form of the configuration
+    read on the per frame paths. Use :func:`reload` to change it.
+    """
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            f"{type(self).__name__} is read only, use src.conf.config.reload()"
+        )
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read only")
+
+    def __repr__(self):
+        values = ", ".join(f"{k}={getattr(self, k)!r}" for k in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+    def to_dict(self):
+        """Returns the node as nested ``dict`` and ``list``"""
+        return {k: _thaw(getattr(self, k)) for k in self.__slots__}
+
+
+def _thaw(value):
+    if isinstance(value, FrozenConfig):
+        return value.to_dict()
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+def freeze(node, name="Runtime"):
+    """Compiles a configuration node into :class:`FrozenConfig` objects.
+
+    Each mapping becomes an instance of a class whose ``__slots__`` are the
+    keys of the mapping, and lists become tuples.
+
+    Parameters
+    ----------
+    node :
+        ``DictConfig``, ``dict``, ``list`` or value
+    name : str, optional
+        Class name of the root node, by default "Runtime"
+
+    Returns
+    -------
+    :class:`FrozenConfig`
+        Frozen copy of ``node``
+    """
+    if OmegaConf.is_config(node):
+        node = OmegaConf.to_container(node, resolve=True)
+    if isinstance(node, dict):
+        keys = tuple(str(k) for k in node)
+        cls = _node_classes.get((name, keys))
+        if cls is None:
+            cls = _node_classes[(name, keys)] = type(
+                name, (FrozenConfig,), {"__slots__": keys}
+            )
+        frozen = object.__new__(cls)
+        for key, value in zip(keys, node.values()):
+            object.__setattr__(
+                frozen, key, freeze(value, name + key.title().replace("_", ""))
+            )
+        return frozen
+    if isinstance(node, (list, tuple)):
+        return tuple(freeze(value, name) for value in node)
+    return node
+
+
+def runtime():
+    """Returns the frozen snapshot of the configuration, compiled with
+    :func:`freeze` on first use.
+
+    >>> cv = config.runtime().cv
+    >>> cv.kernel_gauss
+
+    Returns
+    -------
+    :class:`FrozenConfig`
+        Snapshot with the ``model``, ``calib``, ``db`` and ``cv`` groups
+    """
+    global _runtime
+    if _runtime is None:
+        with _cfg_lock:
+            if _runtime is None:
+                _runtime = freeze(get_config())
+    return _runtime
+
+
+def on_reload(callback):
+    """Registers ``callback``, called with the new snapshot by :func:`reload`"""
+    with _cfg_lock:
+        _listeners.append(callback)
+
+
+def remove_listener(callback):
+    """Unregisters a ``callback`` registered with :func:`on_reload`"""
+    with _cfg_lock:
+        if callback in _listeners:
+            _listeners.remove(callback)
+
+
+def reload(overrides=()):
+    """Composes the configuration again, eg. after the ``yaml`` files were
+    edited, compiles a new snapshot and notifies the :func:`on_reload`
+    listeners.
+
+    Parameters
+    ----------
+    overrides : list, optional
+        Hydra overrides, eg. ``["cv.iter_dilate=2"]``, by default ()
+
+    Returns
+    -------
+    :class:`FrozenConfig`
+        New snapshot, also returned by :func:`runtime` from now on
+    """
+    global _cfg, _runtime
+    with _cfg_lock:
+        get_config()
+        _cfg = hydra.compose(config_name="configs", overrides=list(overrides))
+        _runtime = freeze(_cfg)
+        snapshot, listeners = _runtime, list(_listeners)
+    for callback in listeners:
+        callback(snapshot)
+    return snapshot
@@ -0,0 +1,113 @@
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+BarcodeResult = namedtuple("BarcodeResult", ["seq", "data", "type"])
+"""Decoded barcode along with the sequence number of the frame it came from"""
+
+
+class BarcodeWorker:
+    """Decodes barcodes off the capture loop on a pool of worker threads.
+
+    Frames are submitted with their sequence number and the workers always
+    pick up the most recent frame. A frame waiting for a free worker is
+    replaced (dropped) when a newer one is submitted, so a slow decode never
+    builds a backlog and never blocks the caller.
+
+    .. note::
+        :pyzbar:`pyzbar` releases the GIL while scanning, so decoding runs in
+        parallel with the measurement and display work of the capture loop.
+
+    Parameters
+    ----------
+    decode : callable
+        Function returning ``(barcodeData, barcodeType)`` for a frame and the
+        keyword arguments given to :func:`submit`, usually
+        :func:`src.core.oak_pipeline.OakPipeline.decode_barcode`
+    workers : int, optional
+        Number of decoding threads, by default 1
+    callback : callable, optional
+        Invoked from the worker thread with every newly published
+        :class:`BarcodeResult`, by default None
+    result: :class:`BarcodeResult`
+        Latest published result
+    dropped: int
+        Number of frames replaced before they were decoded
+    """
+
+    def __init__(self, decode, workers=1, callback=None):
+        self.decode = decode
+        self.workers = max(1, workers)
+        self.callback = callback
+        self.result = BarcodeResult(-1, None, None)
+        self.dropped = 0
+        self._busy = 0
+        self._pending = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="barcode"
+        )
+
+    def _run(self, seq, frame, kwargs):
+        """Decodes ``frame`` and keeps draining the pending frame until
+        there is nothing newer left to decode"""
+        while True:
+            try:
+                barcodeData, barcodeType = self.decode(frame, **kwargs)
+            except Exception:
+                # Need to be logged
+                barcodeData, barcodeType = None, None
+            result = None
+            with self._lock:
+                if seq > self.result.seq:
+                    self.result = result = BarcodeResult(seq, barcodeData, barcodeType)
+                done = self._pending is None
+                if done:
+                    self._busy -= 1
+                else:
+                    seq, frame, kwargs = self._pending
+                    self._pending = None
+            if result is not None and self.callback:
+                self.callback(result)
+            if done:
+                return
+
+    def close(self):
+        """Drops the pending frame and stops the workers. Frames submitted
+        afterwards are ignored."""
+        with self._lock:
+            self._closed = True
+            self._pending = None
+            self._executor.shutdown(wait=False)
+
+    def latest(self):
+        """Returns the latest published :class:`BarcodeResult`"""
+        return self.result
+
+    def submit(self, seq, frame, **kwargs):
+        """Queues a frame for decoding without blocking.
+
+        .. note::
+            The frame is read from another thread, so it must not be written
+            to by the caller after submission.
+
+        Parameters
+        ----------
+        seq : int
+            Sequence number of the frame
+        frame :
+            Current frame transmitted from oak cam module
+        kwargs :
+            Passed on to ``decode`` along with the frame
+        """
+        with self._lock:
+            if self._closed:
+                return
+            if self._busy < self.workers:
+                self._busy += 1
+                self._executor.submit(self._run, seq, frame, kwargs)
+            else:
+                if self._pending is not None:
+                    self.dropped += 1
+                self._pending = (seq, frame, kwargs)
@@ -0,0 +1,336 @@
+import os
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+try:
+    from multiprocessing import resource_tracker
+except ImportError:  # Windows
+    resource_tracker = None
+
+MAGIC = 0x5345455452494E47
+HEADER_FIELDS = 11
+# label, confidence, xmin, ymin, xmax, ymax, x, y, z of a detection
+DETECTION_FIELDS = 9
+
+
+def _align(offset, alignment=64):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+def _untrack(shm):
+    """Keeps a block attached by another process from being unlinked when
+    this one exits"""
+    if resource_tracker is not None:
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Owned by another user
+        return True
+    return True
+
+
+class FrameRingLayout:
+    """Byte layout of a frame ring shared memory block.
+
+    The block starts with a header of ``int64`` values,
+
+    >>> [magic, slots, height, width, channels, depth_h, depth_w,
+    ...  max_detections, latest_seq, latest_slot, writer_pid]
+
+    followed by ``slots`` fixed size slots holding the slot sequence number,
+    timestamp and detection count (``int64``), the detections (``float32``),
+    the depth frame (``uint16``) and the colour frame (``uint8``).
+
+    Parameters
+    ----------
+    slots : int
+        Number of frames kept in the ring
+    shape : tuple
+        Shape of the colour frames
+    depth_shape : tuple
+        Shape of the depth frames, ``(0, 0)`` when depth is not published
+    max_detections : int
+        Maximum number of detections stored per frame
+    """
+
+    def __init__(self, slots, shape, depth_shape, max_detections):
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.depth_shape = tuple(depth_shape)
+        self.max_detections = max_detections
+        self.header_size = _align(HEADER_FIELDS * 8)
+        self.meta_offset = 0
+        self.det_offset = 3 * 8
+        self.depth_offset = _align(
+            self.det_offset + max_detections * DETECTION_FIELDS * 4
+        )
+        self.frame_offset = _align(
+            self.depth_offset + int(np.prod(self.depth_shape)) * 2
+        )
+        self.slot_size = _align(self.frame_offset + int(np.prod(self.shape)))
+        self.size = self.header_size + slots * self.slot_size
+
+    @classmethod
+    def from_header(cls, buf):
+        """Reads the layout from the header of an existing block"""
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buf)
+        if header[0] != MAGIC:
+            raise ValueError("Shared memory block is not a frame ring")
+        return cls(
+            slots=int(header[1]),
+            shape=tuple(int(v) for v in header[2:5]),
+            depth_shape=(int(header[5]), int(header[6])),
+            max_detections=int(header[7]),
+        )
+
+    def views(self, buf):
+        """Maps the header and the slots of ``buf`` to numpy arrays
+
+        Returns
+        -------
+        np array
+            Header values
+        list
+            ``(meta, detections, depth, frame)`` arrays of each slot
+        """
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buf)
+        slots = []
+        for i in range(self.slots):
+            base = self.header_size + i * self.slot_size
+            slots.append(
+                (
+                    np.ndarray((3,), np.int64, buf, base + self.meta_offset),
+                    np.ndarray(
+                        (self.max_detections, DETECTION_FIELDS),
+                        np.float32,
+                        buf,
+                        base + self.det_offset,
+                    ),
+                    np.ndarray(
+                        self.depth_shape, np.uint16, buf, base + self.depth_offset
+                    ),
+                    np.ndarray(self.shape, np.uint8, buf, base + self.frame_offset),
+                )
+            )
+        return header, slots
+
+
+class FrameRingWriter:
+    """Publishes the frames of the capture loop into a shared memory ring
+    buffer, so other processes (recording, analytics, a second UI) can read
+    them without extra copies and without extra XLink bandwidth.
+
+    Each slot is guarded by its sequence number: it is set to ``-1`` while
+    the slot is written and to the frame sequence number once complete.
+    Readers check it before and after reading, see :class:`FrameRingReader`.
+
+    .. note::
+        Requires python 3.8+ for :mod:`multiprocessing.shared_memory`.
+
+    Parameters
+    ----------
+    name : str
+        Name of the shared memory block
+    shape : tuple
+        Shape of the colour frames, eg. ``(300, 300, 3)``
+    slots : int, optional
+        Number of frames kept in the ring, by default 8
+    depth_shape : tuple, optional
+        Shape of the depth frames, by default (0, 0) ie. no depth
+    max_detections : int, optional
+        Maximum number of detections stored per frame, by default 16
+
+    Raises
+    ------
+    FileExistsError
+        If the block is published by another running writer
+    """
+
+    def __init__(self, name, shape, slots=8, depth_shape=(0, 0), max_detections=16):
+        self.layout = FrameRingLayout(slots, shape, depth_shape, max_detections)
+        try:
+            self.shm = shared_memory.SharedMemory(
+                name=name, create=True, size=self.layout.size
+            )
+        except FileExistsError:
+            self._reclaim(name)
+            self.shm = shared_memory.SharedMemory(
+                name=name, create=True, size=self.layout.size
+            )
+        self.header, self.slots = self.layout.views(self.shm.buf)
+        self.header[:] = [
+            MAGIC,
+            slots,
+            *self.layout.shape,
+            *self.layout.depth_shape,
+            max_detections,
+            -1,
+            -1,
+            os.getpid(),
+        ]
+        for meta, _, _, _ in self.slots:
+            meta[0] = -1
+        self._next_slot = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def _reclaim(name):
+        """Removes the block ``name`` if it was left over by a crashed
+        writer, ie. its recorded writer process is gone"""
+        stale = shared_memory.SharedMemory(name=name)
+        header = None
+        if stale.size >= HEADER_FIELDS * 8:
+            header = np.frombuffer(stale.buf, np.int64, HEADER_FIELDS).copy()
+        if header is None or header[0] != MAGIC or _alive(int(header[10])):
+            _untrack(stale)
+            stale.close()
+            raise FileExistsError(f"Shared memory block {name} is in use")
+        stale.close()
+        stale.unlink()
+
+    def close(self):
+        """Releases and removes the shared memory block"""
+        self.header = self.slots = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def write(self, seq, frame, detections=(), depth=None, timestamp=None):
+        """Writes a frame and its metadata into the next slot.
+
+        Parameters
+        ----------
+        seq : int
+            Sequence number of the frame
+        frame : np array
+            Colour frame, of the shape given on creation
+        detections : list, optional
+            Detections from the ``nn`` node, by default ()
+        depth : np array, optional
+            Depth frame, of the depth shape given on creation, by default None
+        timestamp : float, optional
+            Capture time in seconds, by default the current monotonic time
+        """
+        slot = self._next_slot
+        meta, det_view, depth_view, frame_view = self.slots[slot]
+        meta[0] = -1
+        meta[1] = int((timestamp if timestamp is not None else time.monotonic()) * 1e9)
+        n = min(len(detections), self.layout.max_detections)
+        for i, d in enumerate(detections[:n]):
+            c = d.spatialCoordinates
+            det_view[i] = (
+                d.label,
+                d.confidence,
+                d.xmin,
+                d.ymin,
+                d.xmax,
+                d.ymax,
+                c.x,
+                c.y,
+                c.z,
+            )
+        meta[2] = n
+        if depth is not None and depth_view.size:
+            np.copyto(depth_view, depth, casting="unsafe")
+        np.copyto(frame_view, frame)
+        meta[0] = seq
+        self.header[8] = seq
+        self.header[9] = slot
+        self._next_slot = (slot + 1) % self.layout.slots
+
+
+class FrameRingReader:
+    """Attaches to a ring published by :class:`FrameRingWriter` from another
+    process.
+
+    .. note::
+        Frames returned with ``copy=False`` are views of the shared memory
+        and are overwritten once the writer wraps around the ring. Check
+        :func:`valid` after using them.
+
+    Parameters
+    ----------
+    name : str
+        Name of the shared memory block
+    """
+
+    def __init__(self, name):
+        self.shm = shared_memory.SharedMemory(name=name)
+        # The writer owns the block
+        _untrack(self.shm)
+        self.layout = FrameRingLayout.from_header(self.shm.buf)
+        self.header, self.slots = self.layout.views(self.shm.buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.header = self.slots = None
+        self.shm.close()
+
+    def latest_seq(self):
+        """Returns the sequence number of the latest published frame, ``-1``
+        if none"""
+        return int(self.header[8])
+
+    def read(self, copy=False):
+        """Reads the latest published frame.
+
+        Parameters
+        ----------
+        copy : bool, optional
+            If ``True`` the returned arrays are copied out of the ring,
+            by default False
+
+        Returns
+        -------
+        dict
+            ``seq``, ``timestamp``, ``frame``, ``depth`` and ``detections``
+            (``(n, 9)`` array) of the frame, ``None`` if nothing was published
+            or the slot was overwritten while reading
+        """
+        slot = int(self.header[9])
+        if slot < 0:
+            return None
+        meta, det_view, depth_view, frame_view = self.slots[slot]
+        seq = int(meta[0])
+        if seq < 0:
+            return None
+        timestamp = meta[1] / 1e9
+        detections = det_view[: int(meta[2])].copy()
+        frame, depth = frame_view, depth_view if depth_view.size else None
+        if copy:
+            frame = frame.copy()
+            depth = depth.copy() if depth is not None else None
+        if int(meta[0]) != seq:
+            return None
+        return {
+            "seq": seq,
+            "slot": slot,
+            "timestamp": timestamp,
+            "frame": frame,
+            "depth": depth,
+            "detections": detections,
+        }
+
+    def valid(self, item):
+        """Returns ``True`` if the slot of a frame returned by :func:`read`
+        has not been overwritten since"""
+        return int(self.slots[item["slot"]][0][0]) == item["seq"]
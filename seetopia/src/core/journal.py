@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import collections
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateJournal:
+    """Durable write-behind queue for the updates sent to WMS, ie. QA
+    confirmations, overrides and flags.
+
+    :func:`append` writes the update to an append-only journal file and
+    returns straight away, so the UI does not wait on WMS. A sender thread
+    drains the pending updates in batches of ``batch_size``, retrying
+    failed batches with exponential backoff, and journals an
+    acknowledgement for each update accepted by WMS. A batch only partly
+    accepted is retried with the same backoff. Updates not
+    acknowledged before a restart or an outage are sent again once the
+    journal is reopened.
+
+    A batch failing with one of the ``rejected`` exceptions, eg. a ``4xx``
+    response of WMS, is not retried. Its updates are sent one by one to find
+    the rejected ones, which are moved to the dead letters of the journal
+    and logged, so the updates queued after them are still sent.
+
+    Each update carries a unique ``key``, used by WMS as an idempotency key
+    so that an update sent again after a lost acknowledgement is applied
+    only once.
+
+    The journal is a ``json`` lines file,
+
+    >>> {"op": "put", "key": "...", "kind": "override", "transfer_id": 334456, ...}
+    >>> {"op": "ack", "key": "..."}
+    >>> {"op": "dead", "key": "...", "kind": "flag", ..., "error": "..."}
+
+    compacted to the pending updates and the dead letters when it is opened
+    and whenever all the updates are acknowledged.
+
+    Parameters
+    ----------
+    path : str
+        Journal file, created if it does not exist
+    send : callable
+        Called from the sender thread with a list of updates, returns the
+        keys of the accepted ones. Raising an exception retries the batch.
+    rejected : tuple, optional
+        Exceptions raised by ``send`` when the batch is rejected and must
+        not be retried, by default ``()``
+    batch_size : int, optional
+        Maximum number of updates sent at once, by default 20
+    backoff : float, optional
+        Seconds waited before retrying a failed batch, doubled on every
+        failure, by default 0.5
+    max_backoff : float, optional
+        Maximum seconds waited between retries, by default 30.0
+    pending: :class:`collections.OrderedDict`
+        Updates not acknowledged yet, keyed by ``key``
+    dead: :class:`collections.OrderedDict`
+        Updates rejected, keyed by ``key``, with the ``error`` raised by
+        ``send``
+    failures: int
+        Number of consecutive failed batches
+    """
+
+    def __init__(
+        self, path, send, rejected=(), batch_size=20, backoff=0.5, max_backoff=30.0
+    ):
+        self.path = path
+        self.send = send
+        self.rejected = rejected
+        self.batch_size = batch_size
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pending = collections.OrderedDict()
+        self.dead = collections.OrderedDict()
+        self.failures = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._load()
+        self._compact()
+        self._thread = threading.Thread(
+            target=self._run, name="update-journal", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def _compact(self):
+        """Rewrites the journal with the pending updates and the dead
+        letters only"""
+        tmp_fpath = self.path + ".tmp"
+        with open(tmp_fpath, "w") as f:
+            for update in self.dead.values():
+                f.write(json.dumps(dict(update, op="dead")) + "\n")
+            for update in self.pending.values():
+                f.write(json.dumps(dict(update, op="put")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_fpath, self.path)
+        self._file = open(self.path, "a")
+
+    def _load(self):
+        """Reads the updates not acknowledged from an existing journal"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn last line of a crashed station app
+                    continue
+                op = record.pop("op", None)
+                if op == "put":
+                    self.pending[record["key"]] = record
+                elif op == "ack":
+                    self.pending.pop(record["key"], None)
+                elif op == "dead":
+                    self.pending.pop(record["key"], None)
+                    self.dead[record["key"]] = record
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self.pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                batch = list(self.pending.values())[: self.batch_size]
+            try:
+                accepted, rejected = self._send(batch)
+            except Exception:
+                self._back_off()
+                continue
+            with self._cond:
+                self._write(
+                    [
+                        {"op": "ack", "key": key}
+                        for key in accepted
+                        if key in self.pending
+                    ]
+                    + [dict(update, op="dead") for update in rejected]
+                )
+                for key in accepted:
+                    self.pending.pop(key, None)
+                for update in rejected:
+                    self.pending.pop(update["key"], None)
+                    self.dead[update["key"]] = update
+                if not self.pending:
+                    self._file.close()
+                    self._compact()
+                self._cond.notify_all()
+                unresolved = any(update["key"] in self.pending for update in batch)
+            if unresolved:
+                # Updates neither accepted nor rejected are sent again, not
+                # straight away
+                self._back_off()
+            else:
+                self.failures = 0
+
+    def _back_off(self):
+        """Waits before the next attempt, twice as long as the last time"""
+        self.failures += 1
+        delay = min(self.backoff * 2 ** (self.failures - 1), self.max_backoff)
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed, timeout=delay)
+
+    def _send(self, batch):
+        """Sends a batch, and its updates one by one if it is rejected.
+
+        Returns
+        -------
+        set
+            Keys of the accepted updates
+        list
+            Rejected updates, with the ``error`` raised by ``send``
+        """
+        try:
+            return set(self.send(batch)), []
+        except self.rejected as e:
+            if len(batch) == 1:
+                logger.error(
+                    "Update %s of transfer %s rejected: %s",
+                    batch[0]["key"],
+                    batch[0]["transfer_id"],
+                    e,
+                )
+                return set(), [dict(batch[0], error=str(e))]
+        accepted, rejected = set(), []
+        for update in batch:
+            keys, dead = self._send([update])
+            accepted |= keys
+            rejected += dead
+        return accepted, rejected
+
+    def _write(self, records):
+        for record in records:
+            self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def append(self, kind, transfer_id, payload=None):
+        """Journals an update and queues it for sending.
+
+        Parameters
+        ----------
+        kind : str
+            Type of the update, eg. ``confirm``, ``override`` or ``flag``
+        transfer_id :
+            Transfer the update applies to
+        payload : dict, optional
+            Content of the update, eg. the overridden dimensions,
+            by default None
+
+        Returns
+        -------
+        str
+            Idempotency key of the update
+        """
+        update = {
+            "key": uuid.uuid4().hex,
+            "kind": kind,
+            "transfer_id": transfer_id,
+            "payload": payload or {},
+            "created": time.time(),
+        }
+        with self._cond:
+            self._write([dict(update, op="put")])
+            self.pending[update["key"]] = update
+            self._cond.notify_all()
+        return update["key"]
+
+    def close(self):
+        """Stops the sender thread. Pending updates stay in the journal and
+        are sent once it is reopened."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._file.close()
+
+    def flush(self, timeout=None):
+        """Waits until all the pending updates are acknowledged
+
+        Returns
+        -------
+        bool
+            ``False`` if updates are still pending after ``timeout`` seconds
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self.pending, timeout=timeout)
@@ -1,12 +1,54 @@
 import cv2
 import sys
+import functools
+import threading
 import numpy as np
-import depthai as dai
-from pyzbar import pyzbar
+from . import barcode
+from . import frame_ring
+from . import replay
 from ..utils import utils  # ..
+from ..utils import buffers  # ..
+from ..utils import background  # ..
+from ..utils import motion  # ..
+from ..utils import latency  # ..
 from ..conf import config  # ..
 
 cfg = config.cfg
+# Loaded on first use, see utils.lazy_import
+dai = utils.lazy_import("depthai")
+pyzbar = utils.lazy_import("pyzbar.pyzbar")
+BARCODE_SYMBOLS = ("QRCODE", "EAN13")
+# Size of the colour sensor at THE_1080_P, the resolution set in the pipelines
+RGB_SENSOR_SIZE = (1920, 1080)
+
+
+def load_catalogue():
+    """Builds the ORB index of the product images in ``cfg.db.img_class_fpath``,
+    which can be shared by the pipelines of several devices
+
+    Returns
+    -------
+    :class:`src.utils.utils.FeatureExtraction`
+        Catalogue of the products
+    """
+    catalogue = utils.FeatureExtraction(
+        utils.relative_to_abs_path(cfg.db.img_class_fpath),
+        cache=cfg.db.descriptor_cache,
+        matcher=cfg.cv.matcher,
+        ratio=cfg.cv.match_ratio,
+    )
+    catalogue.update_prod_list()
+    if cfg.cv.debug:
+        print(catalogue.class_names)
+        print(catalogue.product_list)
+    return catalogue
+
+
+@functools.lru_cache(maxsize=None)
+def barcode_symbols():
+    """Returns the ``pyzbar`` symbologies of ``BARCODE_SYMBOLS``, resolved on
+    the first decoding so that ``pyzbar`` is not loaded at import time"""
+    return [getattr(pyzbar.ZBarSymbol, name) for name in BARCODE_SYMBOLS]
 
 
 class OakPipeline:
@@ -39,7 +81,8 @@ class OakPipeline:
         An instance of :class:`src.utils.utils.FeatureExtraction`  performs feature
         matching using ORB feature detection which consists of three steps, feature
         point extraction, generating feature point descriptors and feature point
-        matching.
+        matching. Built by :func:`load_catalogue` unless a shared ``catalogue``
+        is passed, see :class:`src.core.station.StationManager`.
     label_map: list
         List of output labels for the model
     nn_blob_path:
@@ -53,32 +96,163 @@ class OakPipeline:
     base_depth: int
         Distance between the camera module and flat surface on which the objects
         are placed.
+    replay_fpath: str
+        Recording replayed by :class:`src.core.replay.ReplayDevice` instead of
+        streaming from the OAK cam. Empty when a device is attached.
+    device_id: str
+        MX id of the device or directory of the recording of the ``source``
+        the pipeline runs on, ``None`` for the first available device
+    device_info: ``depthai.DeviceInfo``
+        Device opened by :func:`open_device`, ``None`` for the first
+        available device
+    barcode_worker: :class:`src.core.barcode.BarcodeWorker`
+        Decodes barcodes off the capture loop when ``cfg.cv.barcode_async`` is
+        enabled, ``None`` otherwise.
+    settings: :class:`src.conf.config.FrozenConfig`
+        Snapshot of the configuration read on the per frame paths, replaced
+        on :func:`src.conf.config.reload`
+    workspace: :class:`src.utils.buffers.FrameWorkspace`
+        Preallocated buffers for the intermediate images of
+        :func:`draw_measurements`
+    device_edges: bool
+        If ``True``, edge detection runs on the device, see
+        :func:`create_edge_detector`.
+    height_source: str
+        ``spatial`` takes the height of the object from the spatial
+        co-ordinates of its detection, ``depth`` measures every object in
+        view from the ``depth`` stream, see :func:`src.utils.utils.measure_heights`.
+    frame_ring: :class:`src.core.frame_ring.FrameRingWriter`
+        Shared memory ring the processed frames are published to when
+        ``cfg.calib.frame_ring_name`` is set, see :func:`publish_frame`.
+    barcode_roi: bool
+        If ``True``, barcodes are decoded only in the regions of the detected
+        objects, see :func:`scan_barcode_rois`.
+    depth_fov: tuple
+        Region of the ``depth`` frames covered by the colour frames,
+        normalised, see :func:`src.utils.utils.preview_fov`. The whole frame
+        when ``cfg.calib.depth_full_fov`` is disabled, ie. for depth frames
+        already cropped to the preview.
+    background: :class:`src.utils.background.BackgroundModel`
+        Reference of the empty mat the objects are segmented against when
+        ``cfg.cv.segmentation`` is ``background``, see
+        :func:`draw_measurements`
+    motion: :class:`src.utils.motion.ChangeDetector`
+        Tells :func:`process_frame` whether the scene changed since the last
+        processed frame when ``cfg.cv.change_gate`` is enabled
+    gated_frames: int
+        Number of frames whose results were reused by :func:`process_frame`
+        as the scene was static
+    gated: bool
+        ``True`` if the results last returned by :func:`process_frame` were
+        reused from an earlier frame. They must not be counted as a new
+        measurement, eg. by :class:`src.utils.estimator.RollingMeasurement`.
+    render: bool
+        If ``False``, :func:`process_frame` measures the objects without
+        drawing the overlays, eg. while nobody looks at the preview
+    latency: :class:`src.utils.latency.LatencyTracer`
+        Latency of the ``barcode_decode`` and ``draw_measurements`` stages of
+        :func:`process_frame`, and of the stages recorded by the capture loop.
+        Shared with the app when passed as ``tracer``.
     """
 
-    def __init__(self):
+    def __init__(self, tracer=None, catalogue=None, source=None):
         super(OakPipeline, self).__init__()
         self.nn_family = "mobilenet"
         self.vid_capture = True
         self.img_frame = np.zeros((300, 300, 3), dtype=np.uint8)
-        self.ORB = utils.FeatureExtraction(
-            utils.relative_to_abs_path(cfg.db.img_class_fpath)
-        )
-        self.ORB.update_prod_list()
-        if cfg.cv.debug:
-            print(self.ORB.class_names)
-            print(self.ORB.product_list)
+        self.ORB = catalogue or load_catalogue()
 
         self.label_map = cfg.model.label_map
         self.sync_nn = cfg.calib.syncnn
         self.nn_blob_path = utils.relative_to_abs_path(cfg.model.blob_fpath)
         if len(sys.argv) > 1:
             self.nn_blob_path = sys.argv[1]
-        self.threshold1 = cfg.cv.thres_min
-        self.threshold2 = cfg.cv.thres_max
-        self.area_min = cfg.cv.area_min
-        self.base_depth = cfg.calib.base_depth
-        self.color = (cfg.cv.r_color, cfg.cv.g_color, cfg.cv.b_color)
-        self.scale_factor = [cfg.cv.scale_factor_x, cfg.cv.scale_factor_y]
+        self.settings = None
+        self.depth_fov = (
+            utils.preview_fov(
+                RGB_SENSOR_SIZE, (cfg.model.input_size_x, cfg.model.input_size_y)
+            )
+            if cfg.calib.depth_full_fov
+            else (0.0, 0.0, 1.0, 1.0)
+        )
+        self.background = background.BackgroundModel()
+        self.motion = motion.ChangeDetector()
+        self._apply_config(config.runtime())
+        config.on_reload(self._apply_config)
+        self.latency = tracer or latency.LatencyTracer(window=cfg.cv.latency_window)
+        if source is not None:
+            self.device_id = source.device_id
+            self.device_info = source.info
+            self.replay_fpath = source.replay_fpath
+        else:
+            self.device_id = None
+            self.device_info = None
+            self.replay_fpath = (
+                utils.relative_to_abs_path(cfg.calib.replay_fpath)
+                if cfg.calib.replay_fpath
+                else None
+            )
+        self.barcode_worker = (
+            barcode.BarcodeWorker(
+                self.latency.timed("barcode_decode", self.decode_barcode),
+                workers=cfg.cv.barcode_workers,
+            )
+            if cfg.cv.barcode_async
+            else None
+        )
+        self.workspace = buffers.FrameWorkspace()
+        self.render = True
+        self.device_edges = cfg.cv.device_edges
+        self.frame_ring_name = cfg.calib.frame_ring_name
+        self.frame_ring = None
+        self._frame_count = 0
+        self._roi_scans = 0
+        self._roi_lock = threading.Lock()
+        self.gated_frames = 0
+        self.gated = False
+        self._object_mask = None
+        self._last_result = None
+        self._last_detections = 0
+
+    def _apply_config(self, settings):
+        """Takes the per frame parameters from a configuration snapshot, on
+        creation and on every :func:`src.conf.config.reload`.
+
+        .. note::
+            Parameters of the device pipeline, eg. ``device_edges``, only take
+            effect when the pipeline is started again.
+
+        Parameters
+        ----------
+        settings : :class:`src.conf.config.FrozenConfig`
+            Snapshot returned by :func:`src.conf.config.runtime`
+        """
+        cv = settings.cv
+        self.threshold1 = cv.thres_min
+        self.threshold2 = cv.thres_max
+        self.area_min = cv.area_min
+        self.base_depth = settings.calib.base_depth
+        self.color = (cv.r_color, cv.g_color, cv.b_color)
+        self.scale_factor = [cv.scale_factor_x, cv.scale_factor_y]
+        self.kernel_dilate = np.ones(
+            (cv.kernel_dilate, cv.kernel_dilate), dtype=np.uint8
+        )
+        self.barcode_roi = cv.barcode_roi
+        self.height_source = cv.height_source
+        self.background.learn_frames = cv.background_learn_frames
+        self.background.alpha = cv.background_alpha
+        self.background.threshold = cv.background_thres
+        self.background.depth_threshold = cv.background_depth_thres
+        self.motion.size = cv.change_thumb
+        self.motion.threshold = cv.change_thres
+        self.motion.ratio = cv.change_ratio
+        self.motion.refresh = cv.change_refresh
+        # The frames following a change are measured until the estimate has
+        # measure_min_samples samples of the new scene, see process_frame
+        self.motion.settle = max(0, cv.measure_min_samples - 1)
+        # The next frame is processed with the new settings
+        self.motion.reset()
+        self.settings = settings
 
     def calc_fps(self, counter, start_time, current_time):
         """Calculates the frames per second by dividing the total number of
@@ -100,6 +274,40 @@ class OakPipeline:
         """
         return counter / (current_time - start_time)
 
+    def open_device(self, pipeline):
+        """Opens the device which runs the given ``pipeline``, ie. the device
+        of ``device_info`` or else the first available one. When
+        ``replay_fpath`` is configured, a :class:`src.core.replay.ReplayDevice`
+        is returned instead, which exposes the same output queues.
+
+        Parameters
+        ----------
+        pipeline :
+            Set of all the nodes and the links between them, ``None`` when
+            replaying
+
+        Returns
+        -------
+        device
+            ``depthai.Device`` or :class:`src.core.replay.ReplayDevice`, to be
+            used as a context manager
+        """
+        if self.replay_fpath:
+            return replay.ReplayDevice(self.replay_fpath, fps=cfg.calib.replay_fps)
+        if self.device_info is not None:
+            return dai.Device(pipeline, self.device_info)
+        return dai.Device(pipeline)
+
+    def close(self):
+        """Stops the capture loop and the barcode decoding workers"""
+        self.vid_capture = False
+        config.remove_listener(self._apply_config)
+        if self.barcode_worker:
+            self.barcode_worker.close()
+        if self.frame_ring:
+            self.frame_ring.close()
+            self.frame_ring = None
+
     def create_color_cam(self, nodes, pipeline):
         """Creates a ``color_cam`` node, configures the newly created node
         and populates it with existing nodes in  ``depthai pipeline`` after
@@ -139,6 +347,46 @@ class OakPipeline:
             nodes.cam_rgb.preview.link(nodes.xout_rgb.input)
         return nodes, pipeline
 
+    def create_edge_detector(self, preview, pipeline):
+        """Creates an ``ImageManip`` node converting the colour preview to gray
+        scale and an ``EdgeDetector`` node computing its Sobel edge map on the
+        device. The edge map is streamed through the ``edges`` ``XLinkOut``
+        channel, next to the colour preview.
+
+        .. note::
+            With the edge map computed on the device, the host only
+            thresholds and dilates it before finding contours in
+            :func:`draw_measurements`, which frees host CPU per camera.
+
+        Parameters
+        ----------
+        preview :
+            ``preview`` output of the ``color_cam`` node
+        pipeline :
+            Set of all the nodes and the links between them
+
+        Returns
+        -------
+        edge_detector
+            The created ``EdgeDetector`` node
+        pipeline
+            Updated depthai nodes and links in the form of a pipeline
+        """
+        size = cfg.model.input_size_x * cfg.model.input_size_y
+        manip = pipeline.createImageManip()
+        manip.initialConfig.setFrameType(dai.RawImgFrame.Type.GRAY8)
+        manip.setMaxOutputFrameSize(size)
+        preview.link(manip.inputImage)
+
+        edge_detector = pipeline.createEdgeDetector()
+        edge_detector.setMaxOutputFrameSize(size)
+        manip.out.link(edge_detector.inputImage)
+
+        xout_edges = pipeline.createXLinkOut()
+        xout_edges.setStreamName("edges")
+        edge_detector.outputImage.link(xout_edges.input)
+        return edge_detector, pipeline
+
     def create_left_cam(self, nodes, pipeline):
         """Creates a ``mono_left`` node, configures the newly created node
         and populate it with existing nodes in  ``depthai pipeline`` after
@@ -232,6 +480,91 @@ class OakPipeline:
             nodes.stereo.depth.link(nodes.nn.inputDepth)
             return nodes, pipeline
 
+    def create_pipeline(self):
+        """Creates the pipeline run by the app, ie. the ``color_Cam``, ``nn``,
+        ``stereo``, ``mono_left`` and ``mono_right`` nodes, and the
+        ``edges`` and ``depth`` streams when ``device_edges`` is enabled and
+        ``height_source`` is ``depth``.
+
+        Returns
+        -------
+        pipeline
+            Set of all the nodes and the links between them
+        list
+            Names of the output streams of the pipeline
+        """
+        pipeline = dai.Pipeline()
+        # Create cam nodes
+        color_cam = pipeline.createColorCamera()
+        nn = pipeline.createMobileNetSpatialDetectionNetwork()
+        mono_left = pipeline.createMonoCamera()
+        mono_right = pipeline.createMonoCamera()
+        stereo = pipeline.createStereoDepth()
+        # Create output stream links from oak
+        xout_rgb = pipeline.createXLinkOut()
+        xout_nn = pipeline.createXLinkOut()
+        # Rename the streams
+        xout_rgb.setStreamName("rgb")
+        xout_nn.setStreamName("detections")
+        # Configure color_Cam node
+        color_cam.setPreviewSize(
+            cfg.model.input_size_x, cfg.model.input_size_y)
+        color_cam.setResolution(
+            dai.ColorCameraProperties.SensorResolution.THE_1080_P)
+        color_cam.setInterleaved(cfg.calib.interleaved_color_cam)
+        color_cam.setColorOrder(dai.ColorCameraProperties.ColorOrder.BGR)
+        # Configure mono cams
+        mono_left.setResolution(
+            dai.MonoCameraProperties.SensorResolution.THE_400_P)
+        mono_left.setBoardSocket(dai.CameraBoardSocket.LEFT)
+        mono_right.setResolution(
+            dai.MonoCameraProperties.SensorResolution.THE_400_P)
+        mono_right.setBoardSocket(dai.CameraBoardSocket.RIGHT)
+        # setting node configs
+        stereo.setOutputDepth(cfg.calib.output_depth_stereo)
+        stereo.setConfidenceThreshold(cfg.calib.thres_conf_stereo)
+        # Configure neural network node
+        nn.setBlobPath(utils.relative_to_abs_path(cfg.model.blob_fpath))
+        nn.setConfidenceThreshold(cfg.calib.thres_conf_spatial)
+        nn.input.setBlocking(cfg.calib.blocking_spatial)
+        nn.setBoundingBoxScaleFactor(cfg.calib.bb_scale_factor_spatial)
+        nn.setDepthLowerThreshold(cfg.calib.depth_low_thres_spatial)
+        nn.setDepthUpperThreshold(cfg.calib.depth_high_thres_spatial)
+        # Create outputs stream links for mono cams
+        mono_left.out.link(stereo.left)
+        mono_right.out.link(stereo.right)
+
+        color_cam.preview.link(nn.input)
+        if self.sync_nn:
+            nn.passthrough.link(xout_rgb.input)
+        else:
+            color_cam.preview.link(xout_rgb.input)
+
+        nn.out.link(xout_nn.input)
+        stereo.depth.link(nn.inputDepth)
+        if self.device_edges:
+            self.create_edge_detector(color_cam.preview, pipeline)
+        if self.height_source == "depth":
+            # Depth aligned with the colour sensor. It covers the full field of
+            # view of the sensor, of which the preview is the centre crop, see
+            # depth_fov
+            stereo.setDepthAlign(dai.CameraBoardSocket.RGB)
+            xout_depth = pipeline.createXLinkOut()
+            xout_depth.setStreamName("depth")
+            nn.passthroughDepth.link(xout_depth.input)
+        return pipeline, self.stream_names()
+
+    def stream_names(self):
+        """Returns the names of the output streams of :func:`create_pipeline`,
+        ie. ``rgb`` and ``detections``, ``edges`` when ``device_edges`` is
+        enabled and ``depth`` when ``height_source`` is ``depth``"""
+        names = ["rgb", "detections"]
+        if self.device_edges:
+            names.append("edges")
+        if self.height_source == "depth":
+            names.append("depth")
+        return names
+
     def create_right_cam(self, nodes, pipeline):
         """Creates a ``mono_right`` node, configures the newly created node
         and populate it with existing nodes in  ``depthai pipeline`` after
@@ -267,11 +600,14 @@ class OakPipeline:
         nodes.mono_right.out.link(nodes.stereo.right)
         return nodes, pipeline
 
-    def decode_barcode(self, frame, draw=False):
+    def decode_barcode(self, frame, draw=False, detections=None):
         """Detects barcode from the given frame and decodes it using
         :pyzbar:`pyzbar`. It also possible to detect and decode more than
         one barcode in the given frame.
 
+        When ``detections`` are provided and ``cfg.cv.barcode_roi`` is enabled,
+        only the detected objects are scanned, see :func:`scan_barcode_rois`.
+
         .. note::
             Currently ``QRcode`` and ``EAN13`` are supported. More barcode
             types can be added if required.
@@ -291,6 +627,9 @@ class OakPipeline:
         draw : bool, optional
             If ``True``, it writes the decoded barcode info on the
             given frame, by default False
+        detections : list, optional
+            Detections from the ``nn`` node for the current frame,
+            by default None
 
         Returns
         -------
@@ -300,19 +639,16 @@ class OakPipeline:
             Decoded barcode type
         """
         barcodeData, barcodeType = None, None
-        barcodes = pyzbar.decode(
-            frame,
-            symbols=[
-                pyzbar.ZBarSymbol.QRCODE,
-                pyzbar.ZBarSymbol.EAN13,
-            ],
-        )
-        img_bar = frame.copy()
+        if detections is not None and self.barcode_roi:
+            barcodes = self.scan_barcode_rois(frame, detections)
+        else:
+            barcodes = pyzbar.decode(frame, symbols=barcode_symbols())
+        img_bar = frame.copy() if draw and barcodes else None
 
-        for barcode in barcodes:
-            (x, y, w, h) = barcode.rect
-            barcodeData = barcode.data.decode("utf-8")
-            barcodeType = barcode.type
+        for decoded in barcodes:
+            (x, y, w, h) = decoded.rect
+            barcodeData = decoded.data.decode("utf-8")
+            barcodeType = decoded.type
             if draw:
                 cv2.rectangle(img_bar, (x, y), (x + w, y + h), (0, 0, 255), 2)
                 text = "{} ({})".format(barcodeData, barcodeType)
@@ -328,11 +664,150 @@ class OakPipeline:
 
         return barcodeData, barcodeType
 
-    def draw_measurements(self, frame, detections, object_depth=0, draw=True):
+    def publish_frame(self, seq, frame, detections, depth=None, timestamp=None):
+        """Writes a frame into the shared memory ring named
+        ``cfg.calib.frame_ring_name``, which out-of-process consumers attach to
+        with :class:`src.core.frame_ring.FrameRingReader`. The ring is created
+        on the first call, from the shape of the frame. Does nothing when no
+        ring name is configured.
+
+        Parameters
+        ----------
+        seq : int
+            Sequence number of the frame
+        frame :
+            Current frame transmitted from the oak cam module
+        detections : list
+            Detections from the ``nn`` node for the current frame
+        depth : np array, optional
+            Depth frame aligned with the current frame, by default None
+        timestamp : float, optional
+            Device timestamp of the frame in seconds, by default None
+        """
+        if not self.frame_ring_name:
+            return
+        if self.frame_ring is None:
+            self.frame_ring = frame_ring.FrameRingWriter(
+                self.frame_ring_name,
+                frame.shape,
+                slots=cfg.calib.frame_ring_slots,
+                depth_shape=depth.shape if depth is not None else (0, 0),
+            )
+        self.frame_ring.write(seq, frame, detections, depth=depth, timestamp=timestamp)
+
+    def scan_barcode_rois(self, frame, detections):
+        """Scans only the regions of the frame covered by the ``object``
+        detections of the ``nn`` node, padded by ``cfg.cv.barcode_roi_pad``.
+
+        The frame is converted to gray scale once. Each region is scanned as
+        is first and only when that fails, it is retried at the scales listed
+        in ``cfg.cv.barcode_scales`` with and without Otsu binarisation, which
+        helps reading small labels on large boxes.
+
+        .. note::
+            The full frame is scanned only once every
+            ``cfg.cv.barcode_full_frame_interval`` calls, when none of the
+            regions yield a barcode.
+
+        Parameters
+        ----------
+        frame :
+            Current frame transmitted from oak cam module
+        detections : list
+            Detections from the ``nn`` node for the current frame
+
+        Returns
+        -------
+        list
+            Decoded :pyzbar:`pyzbar` barcodes with ``rect`` in frame
+            co-ordinates
+        """
+        height, width = frame.shape[:2]
+        img_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        # Called from the barcode workers, several at once with
+        # cfg.cv.barcode_workers > 1
+        with self._roi_lock:
+            self._roi_scans += 1
+            full_frame = (
+                self._roi_scans % self.settings.cv.barcode_full_frame_interval == 0
+            )
+        pad = self.settings.cv.barcode_roi_pad
+        for detection in detections:
+            try:
+                label = self.label_map[detection.label]
+            except (IndexError, TypeError):
+                label = detection.label
+            if label != "object":
+                continue
+            pad_x = (detection.xmax - detection.xmin) * pad
+            pad_y = (detection.ymax - detection.ymin) * pad
+            x1 = max(0, int((detection.xmin - pad_x) * width))
+            x2 = min(width, int((detection.xmax + pad_x) * width))
+            y1 = max(0, int((detection.ymin - pad_y) * height))
+            y2 = min(height, int((detection.ymax + pad_y) * height))
+            if x2 - x1 < 16 or y2 - y1 < 16:
+                continue
+            barcodes, scale = self._scan_pyramid(img_gray[y1:y2, x1:x2])
+            if barcodes:
+                return [
+                    b._replace(
+                        rect=pyzbar.Rect(
+                            x1 + int(b.rect.left / scale),
+                            y1 + int(b.rect.top / scale),
+                            int(b.rect.width / scale),
+                            int(b.rect.height / scale),
+                        )
+                    )
+                    for b in barcodes
+                ]
+        if full_frame:
+            return pyzbar.decode(img_gray, symbols=barcode_symbols())
+        return []
+
+    def _scan_pyramid(self, img_roi):
+        """Scans a gray scale region, retrying with upscaled and binarised
+        copies of it until a barcode is found.
+
+        Returns
+        -------
+        list
+            Decoded barcodes
+        float
+            Scale of the image the barcodes were decoded from
+        """
+        barcodes = pyzbar.decode(img_roi, symbols=barcode_symbols())
+        if barcodes:
+            return barcodes, 1.0
+        for scale in self.settings.cv.barcode_scales:
+            img_scaled = img_roi
+            if scale != 1:
+                img_scaled = cv2.resize(
+                    img_roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC
+                )
+                barcodes = pyzbar.decode(img_scaled, symbols=barcode_symbols())
+                if barcodes:
+                    return barcodes, scale
+            _, img_bin = cv2.threshold(
+                img_scaled, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
+            )
+            barcodes = pyzbar.decode(img_bin, symbols=barcode_symbols())
+            if barcodes:
+                return barcodes, scale
+        return [], 1.0
+
+    def draw_measurements(
+        self, frame, detections, object_depth=0, draw=True, edges=None, depth=None
+    ):
         """Preprocess a given frame  Input image is converted to gray
         scale, gaussian blur, canny edge detection. dilation and erosion are performed
         in the given order before finding contours using :find_contours:`cv2.findContours() <>`
 
+        When ``cfg.cv.segmentation`` is ``background``, the objects are
+        segmented against :attr:`background`, the reference of the empty mat,
+        in place of the edge detection. The reference is learned from the
+        frames in which the ``nn`` node detects no object, edges are used
+        until it is ready.
+
         Rotated bounding box on all the objects that matches the ``min_area`` are fetched
         from  :func:`src.utils.utils.get_bounding_rect`.
 
@@ -354,8 +829,18 @@ class OakPipeline:
             Measured depth of the object from :func:`create_nn_pipeline`,
             by default 0
         draw : bool, optional
-            If ``True`` writes the depth value of an object on the current
-            frame, by default True
+            If ``True`` draws the bounding boxes and writes the measured values
+            on a copy of the current frame, by default True. Otherwise the
+            frame is returned untouched and no copy is made.
+        edges : np array, optional
+            Edge map computed on the device by :func:`create_edge_detector`.
+            When given, it is thresholded with ``cfg.cv.device_edge_thres``
+            in place of the blur, gray scale and canny steps, by default None
+        depth : np array, optional
+            Aligned depth frame from the ``depth`` stream, cropped to
+            ``depth_fov``. When given and ``height_source`` is ``depth``, the
+            height of every measured object is computed from it instead of
+            the spatial co-ordinates, by default None
 
         Returns
         -------
@@ -367,20 +852,67 @@ class OakPipeline:
         obj_l, obj_w, obj_h = 0, 0, 0
         height = frame.shape[0]
         width = frame.shape[1]
-        img_wrap = frame.copy()
-        img_blur = cv2.GaussianBlur(
-            img_wrap,
-            (cfg.cv.kernel_gauss, cfg.cv.kernel_gauss),
-            cfg.cv.iter_gauss,
-        )
+        ws = self.workspace
+        cv = self.settings.cv
+        if depth is not None:
+            depth = utils.crop_fov(depth, self.depth_fov)
+        segment = cv.segmentation == "background" and self.background.ready
+        if segment:
+            img_canny = self.background.segment(
+                frame, depth, out=ws.get("canny", frame.shape[:2])
+            )
+        elif edges is None:
+            img_blur = cv2.GaussianBlur(
+                frame,
+                (cv.kernel_gauss, cv.kernel_gauss),
+                cv.iter_gauss,
+                dst=ws.get("blur", frame.shape),
+            )
 
-        img_gray = cv2.cvtColor(img_blur, cv2.COLOR_BGR2GRAY)
-        img_canny = cv2.Canny(img_gray, self.threshold1, self.threshold2)
+            img_gray = cv2.cvtColor(
+                img_blur, cv2.COLOR_BGR2GRAY, dst=ws.get("gray", frame.shape[:2])
+            )
+            img_canny = cv2.Canny(
+                img_gray,
+                self.threshold1,
+                self.threshold2,
+                edges=ws.get("canny", frame.shape[:2]),
+            )
+        else:
+            _, img_canny = cv2.threshold(
+                edges,
+                cv.device_edge_thres,
+                255,
+                cv2.THRESH_BINARY,
+                dst=ws.get("canny", edges.shape[:2]),
+            )
 
         # cv2.imshow("cropped imgCanny", img_canny)
 
-        kernel = np.ones((cfg.cv.kernel_dilate, cfg.cv.kernel_dilate))
-        img_dil = cv2.dilate(img_canny, kernel, iterations=cfg.cv.iter_dilate)
+        img_dil = cv2.dilate(
+            img_canny,
+            self.kernel_dilate,
+            dst=ws.get("dilate", img_canny.shape),
+            iterations=cv.iter_dilate,
+        )
+        self._object_mask = img_dil if segment else None
+        self._track_background(frame, detections, depth, self._object_mask)
+        if draw:
+            # Overlays are drawn on a copy, the frame may still be read by
+            # the barcode worker. It is handed over to the display thread,
+            # hence taken from the rotating buffers.
+            img_wrap = ws.next("overlay", frame.shape)
+            np.copyto(img_wrap, frame)
+        else:
+            img_wrap = frame
+        contours = None
+        use_depth = depth is not None and self.height_source == "depth"
+        if use_depth:
+            contours, _ = cv2.findContours(
+                img_dil, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE
+            )
+            keep = utils.contour_areas(contours) > self.area_min
+            contours = [cnt for cnt, kept in zip(contours, keep) if kept]
         (img_contour, obj_l, obj_w) = utils.get_bounding_rect(
             img_wrap_shadow=img_wrap,
             img=img_dil,
@@ -390,7 +922,13 @@ class OakPipeline:
             draw=False,
             regular_box=False,
             color=(0, 255, 255),
+            render=draw,
+            contours=contours,
         )
+        if use_depth:
+            obj_h = self._measure_depth_heights(
+                img_contour, depth, contours, detections, draw
+            )
         for detection in detections:
             # denormalize bounding box
             x1 = int(detection.xmin * width)
@@ -404,7 +942,7 @@ class OakPipeline:
                 label = detection.label
             if label == "greenmat":
                 pass
-            elif label == "object":
+            elif label == "object" and not use_depth:
                 if object_depth == 0:
                     object_depth = int(detection.spatialCoordinates.z) / 10
 
@@ -418,12 +956,184 @@ class OakPipeline:
                             0.5,
                             self.color,
                         )
-        height, width, layers = img_contour.shape
-        new_h = height
-        new_w = width
-        img_contour = cv2.resize(img_contour, (new_w, new_h))
         return img_contour, {"length": obj_l, "width": obj_w, "depth": obj_h}
 
+    def _measure_depth_heights(self, img_contour, depth, contours, detections, draw):
+        """Measures the objects found by :func:`draw_measurements` from the
+        depth frame and writes their height next to them.
+
+        Returns
+        -------
+        float
+            Height of the object whose length and width are reported, ie. the
+            last measured contour, 0 if none
+        """
+        if not contours:
+            return 0
+        height, width = img_contour.shape[:2]
+        mat_box = None
+        for detection in detections:
+            try:
+                label = self.label_map[detection.label]
+            except (IndexError, TypeError):
+                label = detection.label
+            if label == "greenmat":
+                mat_box = [
+                    detection.xmin * width,
+                    detection.ymin * height,
+                    detection.xmax * width,
+                    detection.ymax * height,
+                ]
+                break
+        heights, _ = utils.measure_heights(
+            depth,
+            contours,
+            img_contour.shape,
+            self.base_depth,
+            mat_box=mat_box,
+            percentile=self.settings.cv.height_percentile,
+        )
+        if draw:
+            for cnt, obj_h in zip(contours, heights):
+                if np.isnan(obj_h):
+                    continue
+                x, y, _, _ = cv2.boundingRect(cnt)
+                cv2.putText(
+                    img_contour,
+                    "Z: {:.2f} cm".format(obj_h),
+                    (x + 10, y + 80),
+                    cv2.FONT_HERSHEY_TRIPLEX,
+                    0.5,
+                    self.color,
+                )
+        obj_h = heights[-1]
+        return 0 if np.isnan(obj_h) else round(float(obj_h), 1)
+
+    def _bench_clear(self, detections):
+        """Returns ``True`` if no ``object`` is among ``detections``"""
+        for detection in detections:
+            try:
+                label = self.label_map[detection.label]
+            except (IndexError, TypeError):
+                label = detection.label
+            if label == "object":
+                return False
+        return True
+
+    def _track_background(self, frame, detections, depth=None, mask=None):
+        """Learns the empty mat from a clear frame until :attr:`background`
+        is ready, then follows the lighting drift with the mat around
+        ``mask``, the objects segmented in the frame. Also run on the frames
+        gated by :func:`process_frame`, with the mask of the last processed
+        frame, so that a static scene does not stall the model."""
+        if self.settings.cv.segmentation != "background":
+            return
+        if self.background.ready:
+            if mask is not None:
+                self.background.update(frame, mask, depth)
+        elif self._bench_clear(detections):
+            self.background.learn(frame, depth)
+
+    def process_frame(self, frame, detections, seq=None, edges=None, depth=None):
+        """Runs the host side processing of a single frame received from the
+        ``rgb`` queue, ie. barcode decoding followed by
+        :func:`draw_measurements`.
+
+        .. note::
+            When ``barcode_worker`` is enabled the frame is only submitted for
+            decoding, and the latest decoded barcode is returned. It may come
+            from an earlier frame, see ``barcode_worker.latest().seq``.
+
+        When ``cfg.cv.change_gate`` is enabled and neither the frame, as told
+        by :attr:`motion`, nor the number of detections changed since the last
+        processed frame, the frame is neither decoded nor measured and the
+        last results are returned again, ``gated`` being set. The frames
+        settling after a change are still measured but not decoded, so the
+        measurements of a new item lock in without delay.
+
+        Parameters
+        ----------
+        frame :
+            Current frame transmitted from the oak cam module
+        detections : list
+            Detections from the ``nn`` node for the current frame
+        seq : int, optional
+            Sequence number of the frame, by default the number of frames
+            processed so far
+        edges : np array, optional
+            Edge map from the ``edges`` stream, see :func:`draw_measurements`,
+            by default None
+        depth : np array, optional
+            Depth frame from the ``depth`` stream, see :func:`draw_measurements`,
+            by default None
+
+        Returns
+        -------
+        string
+            Decoded barcode value
+        string
+            Decoded barcode type
+        img
+            Processed frame to be displayed, the frame itself when ``render``
+            is disabled
+        dict
+            Dimensions of the object (length,width,depth)
+        """
+        if seq is None:
+            seq = self._frame_count
+        self._frame_count += 1
+        changed = True
+        settling = False
+        if self.settings.cv.change_gate:
+            with self.latency.stage("change_detect"):
+                changed = self.motion.changed(frame)
+            changed = (
+                changed
+                or self._last_result is None
+                or len(detections) != self._last_detections
+                or self._last_result[-1] != self.render
+            )
+            settling = not changed and self.motion.settling
+        self._last_detections = len(detections)
+        self.gated = not (changed or settling)
+        if self.gated:
+            self.gated_frames += 1
+            if depth is not None:
+                depth = utils.crop_fov(depth, self.depth_fov)
+            self._track_background(frame, detections, depth, self._object_mask)
+            barcodeData, barcodeType, img_contour, oak_dim, _ = self._last_result
+            if self.barcode_worker:
+                # A decoding submitted earlier may have completed since
+                _, barcodeData, barcodeType = self.barcode_worker.latest()
+            if not self.render:
+                img_contour = frame
+            return barcodeData, barcodeType, img_contour, oak_dim
+        if settling:
+            # The barcode of the scene was decoded when it changed
+            barcodeData, barcodeType = self._last_result[:2]
+            if self.barcode_worker:
+                _, barcodeData, barcodeType = self.barcode_worker.latest()
+        elif self.barcode_worker:
+            self.barcode_worker.submit(seq, frame, detections=detections)
+            _, barcodeData, barcodeType = self.barcode_worker.latest()
+        else:
+            with self.latency.stage("barcode_decode"):
+                barcodeData, barcodeType = self.decode_barcode(
+                    frame, detections=detections
+                )
+        with self.latency.stage("draw_measurements"):
+            img_contour, oak_dim = self.draw_measurements(
+                frame, detections, draw=self.render, edges=edges, depth=depth
+            )
+        self._last_result = (
+            barcodeData,
+            barcodeType,
+            img_contour,
+            oak_dim,
+            self.render,
+        )
+        return barcodeData, barcodeType, img_contour, oak_dim
+
 
 if __name__ == "__main__":
     OakPipeline().run()
@@ -0,0 +1,394 @@
+import os
+import json
+import time
+import datetime
+import cv2
+import numpy as np
+
+
+class ReplayPoint:
+    """Stand-in for ``depthai.Point3f`` carrying the spatial coordinates
+    (in mm) of a recorded detection.
+
+    Parameters
+    ----------
+    x : float
+        X co-ordinate of the detected object
+    y : float
+        Y co-ordinate of the detected object
+    z : float
+        Distance of the detected object from the camera
+    """
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = x
+        self.y = y
+        self.z = z
+
+
+class ReplayDetection:
+    """Stand-in for ``depthai.SpatialImgDetection``. Bounding box values are
+    normalised to the ``0..1`` range, same as the ``nn`` node output.
+
+    Parameters
+    ----------
+    label : int
+        Index of the detected label in ``cfg.model.label_map``
+    confidence : float
+        Confidence score of the detection
+    xmin, ymin, xmax, ymax : float
+        Normalised bounding box corners
+    spatialCoordinates : :class:`ReplayPoint`
+        Spatial co-ordinates of the detection
+    """
+
+    def __init__(
+        self, label, confidence, xmin, ymin, xmax, ymax, spatial=(0.0, 0.0, 0.0)
+    ):
+        self.label = label
+        self.confidence = confidence
+        self.xmin = xmin
+        self.ymin = ymin
+        self.xmax = xmax
+        self.ymax = ymax
+        self.spatialCoordinates = ReplayPoint(*spatial)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds a detection from its recorded ``json`` representation"""
+        return cls(
+            label=data["label"],
+            confidence=data.get("confidence", 1.0),
+            xmin=data["xmin"],
+            ymin=data["ymin"],
+            xmax=data["xmax"],
+            ymax=data["ymax"],
+            spatial=data.get("spatial", (0.0, 0.0, 0.0)),
+        )
+
+    def to_dict(self):
+        """Returns the ``json`` representation of the detection"""
+        return {
+            "label": int(self.label),
+            "confidence": float(self.confidence),
+            "xmin": float(self.xmin),
+            "ymin": float(self.ymin),
+            "xmax": float(self.xmax),
+            "ymax": float(self.ymax),
+            "spatial": [
+                float(self.spatialCoordinates.x),
+                float(self.spatialCoordinates.y),
+                float(self.spatialCoordinates.z),
+            ],
+        }
+
+
+class ReplayMessage:
+    """Stand-in for the ``depthai.ImgFrame`` and ``depthai.ImgDetections``
+    messages returned by the output queues.
+
+    Parameters
+    ----------
+    seq : int
+        Sequence number of the recorded frame
+    timestamp : :class:`datetime.timedelta`
+        Time at which the message was released by the replay device
+    frame : np array, optional
+        Recorded RGB or depth frame
+    detections : list, optional
+        List of :class:`ReplayDetection`
+    """
+
+    def __init__(self, seq, timestamp, frame=None, detections=None):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.frame = frame
+        self.detections = detections if detections is not None else []
+
+    def getCvFrame(self):
+        return self.frame
+
+    def getFrame(self):
+        return self.frame
+
+    def getSequenceNum(self):
+        return self.seq
+
+    def getTimestamp(self):
+        return self.timestamp
+
+
+class ReplayQueue:
+    """Stand-in for ``depthai.DataOutputQueue``. Every queue walks over the
+    same recording independently, so ``rgb``, ``detections`` and ``depth``
+    stay in lockstep as long as they are read at the same rate.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stream, ``rgb``, ``detections`` or ``depth``
+    device : :class:`ReplayDevice`
+        Device which owns the recording
+    """
+
+    def __init__(self, name, device):
+        self.name = name
+        self.device = device
+        self._index = 0
+
+    def getName(self):
+        return self.name
+
+    def has(self):
+        return self.device.loop or self._index < len(self.device)
+
+    def get(self):
+        """Returns the next recorded message, waiting for the configured
+        replay ``fps`` if any.
+
+        Raises
+        ------
+        RuntimeError
+            When the recording is exhausted and ``loop`` is disabled, same as
+            a closed ``depthai`` device.
+        """
+        if not self.has():
+            raise RuntimeError(f"Replay of stream '{self.name}' is exhausted")
+        self.device.wait(self._index)
+        message = self.device.message(self.name, self._index)
+        self._index += 1
+        return message
+
+    def tryGet(self):
+        if not self.has():
+            return None
+        return self.get()
+
+    def tryGetAll(self):
+        """Returns the next recorded message, so that the streams replayed
+        through :class:`src.core.stream_sync.StreamSync` stay at the replay
+        rate"""
+        if not self.has():
+            return []
+        return [self.get()]
+
+
+class ReplayDevice:
+    """Drop-in replacement for ``depthai.Device`` which replays a recording
+    made with :class:`Recorder`. It exposes the ``rgb``, ``detections`` and
+    ``depth`` output queues created by :class:`src.core.oak_pipeline.OakPipeline`
+    so the capture loop can run on hosts without an OAK cam attached.
+
+    A recording is a directory with the following layout,
+
+    >>> rgb/000000.png
+    >>> depth/000000.npy  # optional, uint16 depth in mm
+    >>> detections.json   # {"0": [{"label": 2, "xmin": 0.1, ...}], ...}
+    >>> ground_truth.json # optional, known dimensions, see src.core.sweep
+
+    The ``edges`` stream of :func:`src.core.oak_pipeline.OakPipeline.create_edge_detector`
+    is emulated with :func:`sobel_edges`, computed once when the queue is
+    requested.
+
+    .. note::
+        All the frames are loaded into memory on creation, so that reading
+        from the queues does not add disk latency to benchmarks.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the recording
+    fps : float, optional
+        Rate at which the frames are released. ``None`` releases the frames
+        as fast as they are read, by default None
+    loop : bool, optional
+        If ``True`` the recording restarts from the first frame once it is
+        exhausted, by default True
+    """
+
+    def __init__(self, path, fps=None, loop=True):
+        self.path = path
+        self.fps = fps
+        self.loop = loop
+        self.frames = []
+        self.depths = []
+        self.edges = []
+        self.detections = []
+        self._queues = {}
+        self._start_time = None
+        self._load()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def _load(self):
+        """Loads the recorded frames, depth maps and detections"""
+        rgb_path = os.path.join(self.path, "rgb")
+        depth_path = os.path.join(self.path, "depth")
+        names = sorted(os.path.splitext(f)[0] for f in os.listdir(rgb_path))
+        if not names:
+            raise FileNotFoundError(f"No frames recorded in {rgb_path}")
+
+        detections = {}
+        detections_fpath = os.path.join(self.path, "detections.json")
+        if os.path.exists(detections_fpath):
+            with open(detections_fpath) as f:
+                detections = json.load(f)
+
+        for name in names:
+            self.frames.append(cv2.imread(os.path.join(rgb_path, f"{name}.png")))
+            depth_fpath = os.path.join(depth_path, f"{name}.npy")
+            self.depths.append(
+                np.load(depth_fpath) if os.path.exists(depth_fpath) else None
+            )
+            self.detections.append(
+                [
+                    ReplayDetection.from_dict(d)
+                    for d in detections.get(str(int(name)), [])
+                ]
+            )
+
+    def close(self):
+        self._start_time = None
+
+    def getOutputQueue(self, name, maxSize=4, blocking=False):
+        """Returns a :class:`ReplayQueue` for the given stream name. ``maxSize``
+        and ``blocking`` are accepted for compatibility with ``depthai``."""
+        if name not in ("rgb", "detections", "depth", "edges"):
+            raise RuntimeError(f"Stream '{name}' is not available in a replay")
+        if name == "edges" and not self.edges:
+            self.edges = [sobel_edges(frame) for frame in self.frames]
+        queue = self._queues[name] = ReplayQueue(name, self)
+        return queue
+
+    def getQueueEvent(self, queueNames, timeout=None):
+        """Returns the name of the first of ``queueNames`` with a message
+        left to replay, an empty string once the recording is exhausted"""
+        for name in queueNames:
+            queue = self._queues.get(name)
+            if queue is not None and queue.has():
+                return name
+        return ""
+
+    def message(self, name, index):
+        """Builds the message of the given stream for the ``index``-th read"""
+        i = index % len(self)
+        timestamp = datetime.timedelta(seconds=time.monotonic())
+        if name == "detections":
+            return ReplayMessage(index, timestamp, detections=self.detections[i])
+        if name == "depth":
+            return ReplayMessage(index, timestamp, frame=self.depths[i])
+        if name == "edges":
+            return ReplayMessage(index, timestamp, frame=self.edges[i])
+        return ReplayMessage(index, timestamp, frame=self.frames[i])
+
+    def startPipeline(self):
+        self._start_time = time.monotonic()
+
+    def wait(self, index):
+        """Sleeps until the ``index``-th frame is due when ``fps`` is set"""
+        if not self.fps:
+            return
+        if self._start_time is None:
+            self._start_time = time.monotonic()
+        delay = self._start_time + index / self.fps - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def sobel_edges(frame):
+    """Emulates the ``EdgeDetector`` node, ie. the 3x3 Sobel gradient
+    magnitude of the gray scale frame, saturated to 8 bits.
+
+    Parameters
+    ----------
+    frame : np array
+        BGR frame
+
+    Returns
+    -------
+    np array
+        Edge map of the frame
+    """
+    img_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    grad_x = cv2.Sobel(img_gray, cv2.CV_16S, 1, 0)
+    grad_y = cv2.Sobel(img_gray, cv2.CV_16S, 0, 1)
+    return cv2.convertScaleAbs(
+        np.sqrt(grad_x.astype(np.float32) ** 2 + grad_y.astype(np.float32) ** 2)
+    )
+
+
+class Recorder:
+    """Writes frames, depth maps and detections streamed from the OAK cam
+    in the layout read by :class:`ReplayDevice`.
+
+    The station records the streams of each device to
+    ``cfg.calib.record_fpath`` when it is set, see
+    :class:`src.core.station.Lane`. The recording is then replayed by setting
+    ``cfg.calib.replay_fpath`` to the same directory instead,
+
+    >>> config.reload(["calib.record_fpath=recordings/mat"])
+    >>> config.reload(["calib.replay_fpath=recordings/mat"])
+
+    Parameters
+    ----------
+    path : str
+        Directory of the recording, created if it does not exist
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.detections = {}
+        os.makedirs(os.path.join(path, "rgb"), exist_ok=True)
+        os.makedirs(os.path.join(path, "depth"), exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Flushes the recorded detections to ``detections.json``"""
+        with open(os.path.join(self.path, "detections.json"), "w") as f:
+            json.dump(self.detections, f)
+
+    def write(self, seq, frame, detections, depth=None):
+        """Records a single frame
+
+        Parameters
+        ----------
+        seq : int
+            Sequence number of the frame
+        frame : np array
+            RGB frame from the ``rgb`` stream
+        detections : list
+            Detections from the ``detections`` stream
+        depth : np array, optional
+            Depth frame from the ``depth`` stream, by default None
+        """
+        cv2.imwrite(os.path.join(self.path, "rgb", f"{seq:06d}.png"), frame)
+        if depth is not None:
+            np.save(os.path.join(self.path, "depth", f"{seq:06d}.npy"), depth)
+        self.detections[str(seq)] = [
+            ReplayDetection(
+                d.label,
+                d.confidence,
+                d.xmin,
+                d.ymin,
+                d.xmax,
+                d.ymax,
+                (
+                    d.spatialCoordinates.x,
+                    d.spatialCoordinates.y,
+                    d.spatialCoordinates.z,
+                ),
+            ).to_dict()
+            for d in detections
+        ]
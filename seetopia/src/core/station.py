@@ -0,0 +1,270 @@
+import os
+import threading
+import contextlib
+import collections
+from . import oak_pipeline as op
+from . import replay
+from . import stream_sync
+from ..utils import utils  # ..
+from ..conf import config  # ..
+
+cfg = config.cfg
+# Loaded on first use, see utils.lazy_import
+dai = utils.lazy_import("depthai")
+
+# Connected OAK device, ``info`` being its ``depthai.DeviceInfo``, or
+# recording replayed by src.core.replay.ReplayDevice
+DeviceSource = collections.namedtuple(
+    "DeviceSource", ["device_id", "info", "replay_fpath"]
+)
+
+# Result of OakPipeline.process_frame for a frame of the device ``device_id``,
+# ``gated`` when the results were reused from an earlier frame of a static
+# scene, see OakPipeline.gated
+FrameResult = collections.namedtuple(
+    "FrameResult",
+    [
+        "device_id",
+        "seq",
+        "timestamp",
+        "barcode",
+        "barcode_type",
+        "img_contour",
+        "dimension",
+        "gated",
+    ],
+)
+
+
+def discover_devices(devices=(), replay_fpath=""):
+    """Returns the sources the station runs on.
+
+    Parameters
+    ----------
+    devices : list, optional
+        MX ids of OAK devices or directories of recordings. By default every
+        connected OAK device is used.
+    replay_fpath : str, optional
+        Recording replayed when ``devices`` is empty, by default no
+        recording
+
+    Returns
+    -------
+    list
+        :class:`DeviceSource` of each device
+
+    Raises
+    ------
+    RuntimeError
+        When one of ``devices`` is not connected
+    """
+    if not devices and replay_fpath:
+        devices = [replay_fpath]
+    if not devices:
+        return [
+            DeviceSource(info.getMxId(), info, None)
+            for info in dai.Device.getAllAvailableDevices()
+        ]
+    sources = []
+    available = None
+    for device in devices:
+        path = utils.relative_to_abs_path(device)
+        if path and os.path.isdir(path):
+            sources.append(DeviceSource(device, None, path))
+            continue
+        if available is None:
+            available = {
+                info.getMxId(): info for info in dai.Device.getAllAvailableDevices()
+            }
+        if device not in available:
+            raise RuntimeError(f"OAK device {device} is not connected")
+        sources.append(DeviceSource(device, available[device], None))
+    return sources
+
+
+class Lane:
+    """Runs the capture loop of a single device in its own thread, with its
+    own queues and :class:`src.core.stream_sync.StreamSync`, and hands the
+    processed frames over to ``on_frame``.
+
+    Parameters
+    ----------
+    oak : :class:`src.core.oak_pipeline.OakPipeline`
+        Pipeline of the device
+    on_frame : callable
+        Called from the lane thread with the :class:`FrameResult` of every
+        processed frame
+    device_id: str
+        ``device_id`` of ``oak``, tagging its results
+    sync: :class:`src.core.stream_sync.StreamSync`
+        Pairs the messages of the output queues, created once the device is
+        open
+    record_fpath: str
+        Directory the streams are recorded to with
+        :class:`src.core.replay.Recorder`, by default
+        ``cfg.calib.record_fpath``. Nothing is recorded if empty.
+    """
+
+    def __init__(self, oak, on_frame):
+        self.oak = oak
+        self.on_frame = on_frame
+        self.device_id = oak.device_id
+        self.sync = None
+        self.record_fpath = cfg.calib.record_fpath
+        self._thread = None
+
+    def close(self, timeout=2.0):
+        """Stops the capture loop, waiting up to ``timeout`` seconds for the
+        current frame, and closes the pipeline, see
+        :func:`src.core.oak_pipeline.OakPipeline.close`"""
+        self.oak.vid_capture = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self.oak.close()
+
+    def run(self):
+        """Opens the device and runs the capture loop until :func:`close`"""
+        oak = self.oak
+        if oak.replay_fpath:
+            # A replay device runs no pipeline, so neither depthai nor the
+            # model blob are needed
+            pipeline, names = None, oak.stream_names()
+        else:
+            pipeline, names = oak.create_pipeline()
+        with contextlib.ExitStack() as stack:
+            device = stack.enter_context(oak.open_device(pipeline))
+            recorder = None
+            if self.record_fpath:
+                recorder = stack.enter_context(
+                    replay.Recorder(utils.relative_to_abs_path(self.record_fpath))
+                )
+            device.startPipeline()
+            queues = {
+                name: device.getOutputQueue(
+                    name=name,
+                    maxSize=cfg.calib.out_queue_max_size,
+                    blocking=cfg.calib.out_queue_blocking,
+                )
+                for name in names
+            }
+            # Depth frames are numbered by the mono cams, so they are paired
+            # with the colour frames by timestamp
+            self.sync = stream_sync.StreamSync(
+                names,
+                by_timestamp=["depth"] if "depth" in names else [],
+                max_pending=cfg.calib.sync_max_pending,
+                max_skew=cfg.calib.sync_max_skew,
+            )
+            tracer = oak.latency
+            while oak.vid_capture:
+                with tracer.stage("queue_wait"):
+                    messages = self.sync.get(device, queues)
+                if messages is None:
+                    continue
+                in_preview = messages["rgb"]
+                edges = messages["edges"].getFrame() if "edges" in messages else None
+                depth = messages["depth"].getFrame() if "depth" in messages else None
+                with tracer.stage("get_cv_frame"):
+                    frame = in_preview.getCvFrame()
+                detections = messages["detections"].detections
+                seq = in_preview.getSequenceNum()
+                timestamp = in_preview.getTimestamp().total_seconds()
+                tracer.frame()
+                # Decode captured barcode and measure objects in the CV frame
+                barcode, barcode_type, img_contour, dimension = oak.process_frame(
+                    frame, detections, seq=seq, edges=edges, depth=depth
+                )
+                oak.publish_frame(
+                    seq, frame, detections, depth=depth, timestamp=timestamp
+                )
+                if recorder is not None:
+                    recorder.write(seq, frame, detections, depth=depth)
+                self.on_frame(
+                    FrameResult(
+                        self.device_id,
+                        seq,
+                        timestamp,
+                        barcode,
+                        barcode_type,
+                        img_contour,
+                        dimension,
+                        oak.gated,
+                    )
+                )
+
+    def start(self):
+        """Runs :func:`run` in a daemon thread"""
+        self._thread = threading.Thread(
+            target=self.run, name=f"lane-{self.device_id}", daemon=True
+        )
+        self._thread.start()
+
+
+class StationManager:
+    """Runs a :class:`Lane` per device of a QA station, eg. a top down and a
+    side view camera or one camera per lane.
+
+    The product catalogue is built once, with
+    :func:`src.core.oak_pipeline.load_catalogue`, and shared by the
+    pipelines of all the devices. Frame rings and recordings are suffixed
+    with the lane index when more than one device is run.
+
+    Parameters
+    ----------
+    on_frame : callable
+        Called from the lane threads with the :class:`FrameResult` of every
+        processed frame
+    tracer : :class:`src.utils.latency.LatencyTracer`, optional
+        Shared by the pipelines of all the devices, by default one per
+        pipeline
+    sources : list, optional
+        :class:`DeviceSource` of each device, by default the ones returned by
+        :func:`discover_devices` for ``cfg.calib.devices`` and
+        ``cfg.calib.replay_fpath``
+    catalogue: :class:`src.utils.utils.FeatureExtraction`
+        Catalogue shared by the pipelines
+    lanes: list
+        :class:`Lane` of each device
+    """
+
+    def __init__(self, on_frame, tracer=None, sources=None):
+        if sources is None:
+            sources = discover_devices(cfg.calib.devices, cfg.calib.replay_fpath)
+        if not sources:
+            # Let depthai report that no device is connected
+            sources = [DeviceSource(None, None, None)]
+        self.catalogue = op.load_catalogue()
+        self.lanes = []
+        for index, source in enumerate(sources):
+            oak = op.OakPipeline(tracer=tracer, catalogue=self.catalogue, source=source)
+            if len(sources) > 1 and oak.frame_ring_name:
+                oak.frame_ring_name = f"{oak.frame_ring_name}-{index}"
+            lane = Lane(oak, on_frame)
+            if len(sources) > 1 and lane.record_fpath:
+                lane.record_fpath = f"{lane.record_fpath}-{index}"
+            self.lanes.append(lane)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Stops all the lanes"""
+        for lane in self.lanes:
+            lane.close()
+
+    def counters(self):
+        """Returns the :func:`src.core.stream_sync.StreamSync.counters` of each
+        lane, keyed by device id"""
+        return {
+            str(lane.device_id): lane.sync.counters()
+            for lane in self.lanes
+            if lane.sync is not None
+        }
+
+    def start(self):
+        """Starts all the lanes"""
+        for lane in self.lanes:
+            lane.start()
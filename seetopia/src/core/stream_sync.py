@@ -0,0 +1,170 @@
+import datetime
+import collections
+
+
+class StreamSync:
+    """Pairs the messages of the output queues of a device, eg. the ``rgb``
+    frames with their ``detections``, so that every frame is processed
+    with the messages produced from it.
+
+    Messages are paired by sequence number, except for the streams listed
+    in ``by_timestamp`` which are paired with the frame of the ``primary``
+    stream closest in device timestamp, eg. the ``depth`` stream whose
+    sequence numbers come from the mono cams. The newest complete set is
+    returned and the older messages are dropped, so a slow or stalled
+    stream never holds the loop back and every stream buffers at most
+    ``max_pending`` messages.
+
+    >>> sync = StreamSync(["rgb", "detections", "depth"], by_timestamp=["depth"])
+    >>> messages = sync.get(device, queues)
+    >>> messages["rgb"].getSequenceNum() == messages["detections"].getSequenceNum()
+    True
+
+    Parameters
+    ----------
+    streams : list
+        Names of the paired streams, the first one being the ``primary``
+        stream
+    by_timestamp : list, optional
+        Streams paired by device timestamp instead of sequence number,
+        by default none
+    max_pending : int, optional
+        Maximum number of unpaired messages buffered per stream, the oldest
+        one is dropped beyond it, by default 8
+    max_skew : float, optional
+        Maximum difference in seconds between the timestamps of the messages
+        paired by timestamp, by default 0.02
+    pending: dict
+        Buffered messages of each stream, oldest first
+    matched: int
+        Number of sets returned
+    mismatched: int
+        Number of sets whose oldest buffered messages did not belong
+        together, ie. sets which would have been mismatched by reading the
+        queues in lockstep
+    dropped: dict
+        Number of messages of each stream dropped without being paired
+    """
+
+    def __init__(self, streams, by_timestamp=(), max_pending=8, max_skew=0.02):
+        self.streams = tuple(streams)
+        self.primary = self.streams[0]
+        self.by_timestamp = tuple(by_timestamp)
+        self.by_seq = tuple(s for s in self.streams if s not in self.by_timestamp)
+        self.max_pending = max_pending
+        self.max_skew = max_skew
+        self.pending = {name: collections.deque() for name in self.streams}
+        self.matched = 0
+        self.mismatched = 0
+        self.dropped = {name: 0 for name in self.streams}
+
+    def _closest(self, name, timestamp):
+        """Returns the index of the buffered message of stream ``name``
+        closest to ``timestamp`` and within ``max_skew``, ``None`` if none"""
+        best, best_skew = None, self.max_skew
+        for i, message in enumerate(self.pending[name]):
+            skew = abs(message.getTimestamp().total_seconds() - timestamp)
+            if skew <= best_skew:
+                best, best_skew = i, skew
+        return best
+
+    def _heads_match(self):
+        """Returns ``True`` if the oldest buffered messages of all the
+        streams belong together"""
+        head = self.pending[self.primary][0]
+        if any(
+            self.pending[name][0].getSequenceNum() != head.getSequenceNum()
+            for name in self.by_seq
+        ):
+            return False
+        timestamp = head.getTimestamp().total_seconds()
+        return all(
+            abs(self.pending[name][0].getTimestamp().total_seconds() - timestamp)
+            <= self.max_skew
+            for name in self.by_timestamp
+        )
+
+    def add(self, name, message):
+        """Buffers a message of stream ``name``"""
+        buffer = self.pending[name]
+        buffer.append(message)
+        if len(buffer) > self.max_pending:
+            buffer.popleft()
+            self.dropped[name] += 1
+
+    def counters(self):
+        """Returns the ``matched``, ``mismatched`` and ``dropped`` counters"""
+        return {
+            "matched": self.matched,
+            "mismatched": self.mismatched,
+            "dropped": dict(self.dropped),
+        }
+
+    def get(self, device, queues, timeout=1.0):
+        """Drains ``queues`` without blocking and returns the newest complete
+        set. When no set is complete it waits for a message on any of the
+        queues, so the loop is never blocked on a single stream.
+
+        Parameters
+        ----------
+        device :
+            ``depthai.Device`` or :class:`src.core.replay.ReplayDevice` which
+            owns the queues
+        queues : dict
+            Output queues keyed by stream name
+        timeout : float, optional
+            Seconds waited for a message, by default 1.0
+
+        Returns
+        -------
+        dict
+            Paired messages keyed by stream name, ``None`` if no message
+            arrived within ``timeout``
+        """
+        names = list(queues)
+        while True:
+            for name, queue in queues.items():
+                for message in queue.tryGetAll():
+                    self.add(name, message)
+            messages = self.pop()
+            if messages is not None:
+                return messages
+            if not device.getQueueEvent(names, datetime.timedelta(seconds=timeout)):
+                return None
+
+    def pop(self):
+        """Returns the newest complete set of buffered messages and drops the
+        messages older than it
+
+        Returns
+        -------
+        dict
+            Paired messages keyed by stream name, ``None`` if no set is
+            complete yet
+        """
+        seqs = {
+            name: {m.getSequenceNum(): i for i, m in enumerate(self.pending[name])}
+            for name in self.by_seq
+        }
+        for message in reversed(self.pending[self.primary]):
+            seq = message.getSequenceNum()
+            if not all(seq in seqs[name] for name in self.by_seq):
+                continue
+            indices = {name: seqs[name][seq] for name in self.by_seq}
+            timestamp = message.getTimestamp().total_seconds()
+            for name in self.by_timestamp:
+                indices[name] = self._closest(name, timestamp)
+            if None in indices.values():
+                continue
+            if not self._heads_match():
+                self.mismatched += 1
+            messages = {}
+            for name, index in indices.items():
+                buffer = self.pending[name]
+                for _ in range(index):
+                    buffer.popleft()
+                self.dropped[name] += index
+                messages[name] = buffer.popleft()
+            self.matched += 1
+            return messages
+        return None
@@ -0,0 +1,330 @@
+"""Parameter sweep of the ``cv`` configuration against recordings of items
+of known dimensions.
+
+Every setting of the search space is applied with
+:func:`src.conf.config.reload` and evaluated by measuring the frames of the
+recordings with :func:`src.core.oak_pipeline.OakPipeline.draw_measurements`,
+one setting per worker process. The measurement error and the runtime per
+frame of each setting are reported along with the Pareto front of accuracy
+versus speed, and the most accurate setting is written out as Hydra
+overrides.
+
+The known dimensions are read from ``ground_truth.json`` in the directory of
+each recording made with :class:`src.core.replay.Recorder`, either for the
+whole recording or per frame, keyed by sequence number like
+``detections.json``,
+
+>>> {"length": 21.0, "width": 14.8}
+>>> {"0": {"length": 21.0, "width": 14.8}, "120": {"length": 9.5, "width": 6.0}}
+
+Frames without known dimensions are skipped. ``depth`` is compared as well
+when it is given.
+
+From the ``seetopia`` directory,
+
+>>> python -m src.core.sweep path/to/recording --random 200
+>>> python -m src.core.sweep rec1 rec2 --param cv.thres_min=range(40,80,5) --random 0
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import itertools
+import collections
+import concurrent.futures
+import cv2
+import numpy as np
+from . import replay
+from ..conf import config  # ..
+
+# Values of the default search space, keyed by Hydra override key
+DEFAULT_SPACE = {
+    "cv.thres_min": (39, 59, 79),
+    "cv.thres_max": (30, 50, 70),
+    "cv.area_min": (2500, 3727, 5000),
+    "cv.kernel_gauss": (5, 7, 9),
+    "cv.kernel_dilate": (3, 5, 7),
+    "cv.scale_factor_x": (0.88, 0.92, 0.96),
+    "cv.scale_factor_y": (0.88, 0.92, 0.96),
+}
+
+# Evaluation of a setting, ``overrides`` being its Hydra overrides. ``error``
+# is the mean absolute error in cm over the frames of known dimensions, a
+# frame without any measured object counting as measured 0.
+SweepResult = collections.namedtuple(
+    "SweepResult", ["overrides", "error", "miss_rate", "ms_per_frame", "frames"]
+)
+
+# Set by _init_worker in each worker process
+_pipeline = None
+_samples = []
+
+
+def _parse_value(value):
+    """Returns ``value`` as an int or a float when it is a number"""
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_space(params):
+    """Parses the values of the swept parameters, given in the Hydra sweep
+    syntax ie. ``key=a,b,c`` or ``key=range(start,stop[,step])``.
+
+    Parameters
+    ----------
+    params : list
+        Swept parameters, eg. ``["cv.thres_min=range(40,80,10)"]``
+
+    Returns
+    -------
+    dict
+        Values of each parameter, keyed by override key
+
+    Raises
+    ------
+    ValueError
+        When a parameter is not given as ``key=values``
+    """
+    space = {}
+    for param in params:
+        key, sep, values = param.partition("=")
+        if not sep or not values:
+            raise ValueError(f"Expected key=values, got '{param}'")
+        values = values.strip()
+        if values.startswith("range(") and values.endswith(")"):
+            bounds = [_parse_value(v) for v in values[6:-1].split(",")]
+            values = np.arange(*bounds).tolist()
+            space[key.strip()] = tuple(round(v, 6) for v in values)
+        else:
+            space[key.strip()] = tuple(_parse_value(v) for v in values.split(","))
+    return space
+
+
+def settings(space, samples=0, seed=0):
+    """Returns the settings of the grid of ``space``, or ``samples`` of them
+    drawn at random.
+
+    Parameters
+    ----------
+    space : dict
+        Values of each parameter, see :func:`parse_space`
+    samples : int, optional
+        Number of settings drawn without replacement, by default 0 ie. the
+        whole grid
+    seed : int, optional
+        Seed of the random search, by default 0
+
+    Returns
+    -------
+    list
+        Hydra overrides of each setting, eg. ``["cv.thres_min=40", ...]``
+    """
+    keys = list(space)
+    grid = list(itertools.product(*(space[key] for key in keys)))
+    if 0 < samples < len(grid):
+        grid = random.Random(seed).sample(grid, samples)
+    return [[f"{key}={value}" for key, value in zip(keys, values)] for values in grid]
+
+
+def load_ground_truth(path):
+    """Reads ``ground_truth.json`` of the recording in ``path``
+
+    Returns
+    -------
+    dict
+        Known dimensions keyed by the sequence number of the frames, a single
+        entry keyed by ``None`` when they hold for the whole recording
+
+    Raises
+    ------
+    FileNotFoundError
+        When the recording has no ``ground_truth.json``
+    """
+    with open(os.path.join(path, "ground_truth.json")) as f:
+        truth = json.load(f)
+    if "length" in truth:
+        return {None: truth}
+    return {int(seq): dims for seq, dims in truth.items()}
+
+
+def load_samples(recordings):
+    """Returns ``(frame, detections, depth, truth)`` of every frame of
+    ``recordings`` with known dimensions, see :func:`load_ground_truth`"""
+    samples = []
+    for path in recordings:
+        truth = load_ground_truth(path)
+        device = replay.ReplayDevice(path, fps=None, loop=False)
+        names = sorted(
+            os.path.splitext(f)[0] for f in os.listdir(os.path.join(path, "rgb"))
+        )
+        for i, name in enumerate(names):
+            dims = truth.get(None, truth.get(int(name)))
+            if dims is not None:
+                samples.append(
+                    (device.frames[i], device.detections[i], device.depths[i], dims)
+                )
+    return samples
+
+
+def frame_error(measured, truth):
+    """Returns the mean absolute error in cm of the measured dimensions of a
+    frame. Length and width are compared regardless of the orientation of
+    the item, ie. the longest side with the longest side."""
+    sides = sorted((measured["length"], measured["width"]), reverse=True)
+    known = sorted((truth["length"], truth["width"]), reverse=True)
+    errors = [abs(s - k) for s, k in zip(sides, known)]
+    if "depth" in truth:
+        errors.append(abs(measured["depth"] - truth["depth"]))
+    return float(np.mean(errors))
+
+
+def _init_worker(recordings):
+    """Loads the recordings and builds the pipeline of a worker process"""
+    from . import oak_pipeline as op
+
+    global _pipeline, _samples
+    # One setting per process, the processes are run in parallel already
+    cv2.setNumThreads(1)
+    _samples = load_samples(recordings)
+    _pipeline = op.OakPipeline()
+
+
+def evaluate(overrides):
+    """Applies ``overrides`` and measures every frame with known dimensions.
+    Runs in the worker processes, see :func:`sweep`.
+
+    Returns
+    -------
+    :class:`SweepResult`
+        Evaluation of the setting
+    """
+    # The pipeline follows the new snapshot, see OakPipeline._apply_config
+    config.reload(overrides)
+    # Every setting learns the empty mat again, see cfg.cv.segmentation
+    _pipeline.background.reset()
+    errors, misses, elapsed = [], 0, 0.0
+    for frame, detections, depth, truth in _samples:
+        start = time.perf_counter()
+        _, measured = _pipeline.draw_measurements(
+            frame, detections, draw=False, depth=depth
+        )
+        elapsed += time.perf_counter() - start
+        misses += not measured["length"]
+        errors.append(frame_error(measured, truth))
+    n = len(_samples)
+    return SweepResult(
+        list(overrides),
+        float(np.mean(errors)) if n else float("inf"),
+        misses / n if n else 1.0,
+        elapsed / n * 1000 if n else 0.0,
+        n,
+    )
+
+
+def sweep(recordings, overrides, workers=None):
+    """Evaluates every setting of ``overrides`` with :func:`evaluate` in a
+    pool of ``workers`` processes.
+
+    Parameters
+    ----------
+    recordings : list
+        Directories of the recordings, see :func:`load_ground_truth`
+    overrides : list
+        Hydra overrides of each setting, see :func:`settings`
+    workers : int, optional
+        Number of worker processes, by default the number of CPUs
+
+    Returns
+    -------
+    list
+        :class:`SweepResult` of each setting, in the order of ``overrides``
+    """
+    from . import oak_pipeline as op
+
+    # Builds the descriptor cache of the catalogue once, the workers only
+    # read it
+    op.load_catalogue()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(recordings,)
+    ) as pool:
+        return list(pool.map(evaluate, overrides))
+
+
+def pareto_front(results):
+    """Returns the results not dominated in both ``error`` and
+    ``ms_per_frame`` by any other result, most accurate first"""
+    front = []
+    for result in sorted(results, key=lambda r: (r.error, r.ms_per_frame)):
+        if not front or result.ms_per_frame < front[-1].ms_per_frame:
+            front.append(result)
+    return front
+
+
+def write(results, out_dir):
+    """Writes the results and the Pareto front to ``sweep.json``, and the
+    overrides of the most accurate setting to ``overrides.txt``, one per
+    line, in ``out_dir/<date>/<time>`` like the Hydra run directories
+
+    Returns
+    -------
+    str
+        Directory the files are written to
+    """
+    run_dir = os.path.join(
+        out_dir, time.strftime("%Y-%m-%d"), time.strftime("%H-%M-%S")
+    )
+    os.makedirs(run_dir, exist_ok=True)
+    front = pareto_front(results)
+    with open(os.path.join(run_dir, "sweep.json"), "w") as f:
+        json.dump(
+            {
+                "results": [r._asdict() for r in results],
+                "pareto_front": [r._asdict() for r in front],
+            },
+            f,
+            indent=2,
+        )
+    with open(os.path.join(run_dir, "overrides.txt"), "w") as f:
+        f.write("\n".join(front[0].overrides) + "\n")
+    return run_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recordings", nargs="+", help="directories of recordings")
+    parser.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        help="swept parameter, eg. cv.thres_min=40,50,60, replaces the default space",
+    )
+    parser.add_argument(
+        "--random", type=int, default=200, help="settings drawn, 0 for the grid"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default="outputs")
+    args = parser.parse_args()
+
+    space = parse_space(args.param) if args.param else DEFAULT_SPACE
+    overrides = settings(space, args.random, args.seed)
+    print(f"{len(overrides)} settings on {len(args.recordings)} recordings")
+    results = sweep(args.recordings, overrides, args.workers)
+    front = pareto_front(results)
+    print(f"{'error cm':>10}{'miss':>8}{'ms/frame':>10}  overrides (Pareto front)")
+    for result in front:
+        print(
+            f"{result.error:>10.2f}{result.miss_rate:>8.2f}"
+            f"{result.ms_per_frame:>10.2f}  {' '.join(result.overrides)}"
+        )
+    print(f"written to {write(results, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
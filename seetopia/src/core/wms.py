@@ -0,0 +1,429 @@
+import json
+import asyncio
+import threading
+from urllib.parse import quote, unquote, urlsplit
+
+
+class WmsError(Exception):
+    """Raised through the futures of :class:`WmsClient` when WMS could not be
+    reached or answered with an error once all the retries are spent"""
+
+
+class WmsRejected(WmsError):
+    """Raised when WMS rejects a request with a ``4xx`` response, which would
+    be rejected again if it were retried"""
+
+
+class _Connection:
+    """Keep-alive HTTP/1.1 connection held by the pool of :class:`WmsClient`"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+    async def _read_chunked(self):
+        """Reads a body sent with ``Transfer-Encoding: chunked``"""
+        chunks = []
+        while True:
+            size_line = await self.reader.readuntil(b"\r\n")
+            # Chunk extensions after ';' are ignored
+            size = int(size_line.split(b";", 1)[0], 16)
+            if size == 0:
+                break
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+        # Trailer fields, up to the empty line
+        while await self.reader.readuntil(b"\r\n") != b"\r\n":
+            pass
+        return b"".join(chunks)
+
+    async def request(self, method, host, path, body=None):
+        """Sends a request and reads its response.
+
+        Returns
+        -------
+        int
+            HTTP status code
+        bytes
+            Response body
+        bool
+            ``True`` if the server keeps the connection open
+        """
+        payload = json.dumps(body).encode() if body is not None else b""
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {host}\r\n"
+            "Connection: keep-alive\r\n"
+            "Accept: application/json\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n"
+        )
+        self.writer.write(head.encode() + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            data = await self._read_chunked()
+        elif "content-length" in headers:
+            data = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self.reader.read()
+            keep_alive = False
+        return status, data, keep_alive
+
+
+class WmsClient:
+    """Asynchronous WMS client running on its own event loop thread.
+
+    Requests are made over a pool of keep-alive connections, with a timeout
+    per attempt and retries with exponential backoff on connection errors,
+    timeouts and ``5xx`` responses. The public methods can be called from
+    any thread, eg. the capture loop or the kivy thread, and return a
+    :class:`concurrent.futures.Future` straight away.
+
+    .. note::
+        ``callback`` is called on the event loop thread of the client. Kivy
+        widgets must only be updated from a callback scheduled on the kivy
+        :clock:`Clock <>`.
+
+    Parameters
+    ----------
+    base_url : str
+        URL of the WMS API, eg. ``http://wms.local:8080/api``
+    timeout : float, optional
+        Seconds allowed for each attempt, by default 2.0
+    retries : int, optional
+        Number of attempts made after the first one failed, by default 2
+    backoff : float, optional
+        Seconds waited before the first retry, doubled on every retry,
+        by default 0.2
+    pool_size : int, optional
+        Maximum number of connections open to WMS, by default 4
+    loop: :class:`asyncio.AbstractEventLoop`
+        Event loop of the client, run on a daemon thread
+    """
+
+    def __init__(self, base_url, timeout=2.0, retries=2, backoff=0.2, pool_size=4):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.loop = asyncio.new_event_loop()
+        self._idle = []
+        self._slots = None
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run_loop, name="wms-client", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _acquire(self, scheme, host, port):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        await self._slots.acquire()
+        try:
+            if self._idle:
+                return self._idle.pop()
+            reader, writer = await asyncio.open_connection(
+                host, port, ssl=scheme == "https"
+            )
+            return _Connection(reader, writer)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, connection, reusable):
+        if reusable:
+            self._idle.append(connection)
+        else:
+            connection.close()
+        self._slots.release()
+
+    async def _close_pool(self):
+        while self._idle:
+            self._idle.pop().close()
+
+    async def _request(self, method, path, body=None):
+        """Makes a request with retries and returns the decoded response,
+        ``None`` on a ``404``"""
+        url = urlsplit(self.base_url)
+        port = url.port or (443 if url.scheme == "https" else 80)
+        path = url.path.rstrip("/") + path
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            connection = None
+            reusable = False
+            try:
+                connection = await asyncio.wait_for(
+                    self._acquire(url.scheme, url.hostname, port), self.timeout
+                )
+                status, data, reusable = await asyncio.wait_for(
+                    connection.request(method, url.netloc, path, body), self.timeout
+                )
+            except (OSError, EOFError, asyncio.TimeoutError, ValueError) as e:
+                # A pooled connection may have been closed by the server
+                error = WmsError(f"WMS request {method} {path} failed: {e!r}")
+                continue
+            finally:
+                if connection is not None:
+                    self._release(connection, reusable)
+            if status == 404:
+                return None
+            if status >= 500:
+                error = WmsError(f"WMS request {method} {path} failed: {status}")
+                continue
+            if status >= 400:
+                raise WmsRejected(f"WMS request {method} {path} rejected: {status}")
+            try:
+                return json.loads(data) if data else None
+            except ValueError as e:
+                # eg. the error page of a proxy in front of WMS
+                raise WmsError(
+                    f"WMS request {method} {path} returned invalid JSON: {e}"
+                ) from e
+        raise error
+
+    def close(self):
+        """Closes the pooled connections and stops the event loop thread"""
+        if self._closed:
+            return
+        self._closed = True
+        asyncio.run_coroutine_threadsafe(self._close_pool(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+    def get_transfer(self, transfer_id, callback=None):
+        """Fetches the details of a stock transfer, searched by its transfer
+        ID or its barcode.
+
+        Parameters
+        ----------
+        transfer_id : str
+            Transfer ID or decoded barcode
+        callback : callable, optional
+            Called with the future once it is done, by default None
+
+        Returns
+        -------
+        :class:`concurrent.futures.Future`
+            Resolves to the transfer details, ``None`` if WMS does not know
+            the transfer, or raises :class:`WmsError`
+        """
+        return self.submit(
+            self._request("GET", "/transfers/" + quote(str(transfer_id), safe="")),
+            callback,
+        )
+
+    def post_updates(self, updates, callback=None):
+        """Sends a batch of updates journaled by
+        :class:`src.core.journal.UpdateJournal` to WMS.
+
+        Parameters
+        ----------
+        updates : list
+            Updates, each with its idempotency ``key``
+        callback : callable, optional
+            Called with the future once it is done, by default None
+
+        Returns
+        -------
+        :class:`concurrent.futures.Future`
+            Resolves to the keys of the updates accepted by WMS, or raises
+            :class:`WmsError`, :class:`WmsRejected` if WMS rejects the batch
+        """
+        return self.submit(self._post_updates(updates), callback)
+
+    async def _post_updates(self, updates):
+        response = await self._request("POST", "/updates", updates)
+        if response is None:
+            raise WmsError("WMS does not accept updates")
+        return response["accepted"]
+
+    def submit(self, coro, callback=None):
+        """Runs a coroutine on the event loop of the client
+
+        Returns
+        -------
+        :class:`concurrent.futures.Future`
+            Future of the coroutine result
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+
+class StandInServer:
+    """Local stand-in for the WMS API serving ``GET /transfers/<id>`` from a
+    dict and accepting ``POST /updates``, used by the tests and when no WMS
+    is configured.
+
+    Parameters
+    ----------
+    transfers : dict
+        Transfer details keyed by transfer ID or barcode, see
+        ``src.ui.config.wms_response``
+    host : str, optional
+        Interface to listen on, by default "127.0.0.1"
+    port : int, optional
+        Port to listen on, by default 0 ie. any free port
+    delay : float, optional
+        Seconds waited before each response, to emulate a slow network,
+        by default 0.0
+    failures : int, optional
+        Number of requests answered with a ``503`` first, by default 0
+    chunked : bool, optional
+        If ``True`` the responses are sent with ``Transfer-Encoding: chunked``
+        instead of a ``Content-Length``, by default False
+    requests: int
+        Number of requests served
+    connections: int
+        Number of connections accepted
+    updates: dict
+        Updates received, keyed by their idempotency key
+    """
+
+    def __init__(
+        self,
+        transfers,
+        host="127.0.0.1",
+        port=0,
+        delay=0.0,
+        failures=0,
+        chunked=False,
+    ):
+        self.transfers = transfers
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.failures = failures
+        self.chunked = chunked
+        self.requests = 0
+        self.connections = 0
+        self.updates = {}
+        self._server = None
+        self._handlers = set()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                length = 0
+                body = b""
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                if length:
+                    body = await reader.readexactly(length)
+                self.requests += 1
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                status, body = self._respond(method, unquote(path), body)
+                if self.chunked:
+                    # Split in two chunks, followed by the last empty chunk
+                    half = len(body) // 2
+                    framing = "Transfer-Encoding: chunked"
+                    body = (
+                        b"".join(
+                            b"%x\r\n%s\r\n" % (len(chunk), chunk)
+                            for chunk in (body[:half], body[half:])
+                            if chunk
+                        )
+                        + b"0\r\n\r\n"
+                    )
+                else:
+                    framing = f"Content-Length: {len(body)}"
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status}\r\n"
+                        "Content-Type: application/json\r\n"
+                        f"{framing}\r\n\r\n"
+                    ).encode()
+                    + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Client gone or server closed
+            pass
+        finally:
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    def _respond(self, method, path, body):
+        if self.failures > 0:
+            self.failures -= 1
+            return "503 Service Unavailable", b""
+        if method == "POST" and path == "/updates":
+            updates = json.loads(body)
+            for update in updates:
+                # Updates sent again are only applied once
+                self.updates.setdefault(update["key"], update)
+            accepted = [update["key"] for update in updates]
+            return "200 OK", json.dumps({"accepted": accepted}).encode()
+        prefix = "/transfers/"
+        if method != "GET" or not path.startswith(prefix):
+            return "404 Not Found", b""
+        transfer = self.transfers.get(path[len(prefix) :])
+        if transfer is None:
+            return "404 Not Found", b""
+        return "200 OK", json.dumps(transfer).encode()
+
+    async def close(self):
+        """Stops listening and closes the open connections"""
+        self._server.close()
+        handlers = list(self._handlers)
+        for handler in handlers:
+            handler.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def start(self):
+        """Starts listening on the running event loop
+
+        Returns
+        -------
+        :class:`StandInServer`
+            The started server, with ``port`` set
+        """
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
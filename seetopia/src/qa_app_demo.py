@@ -4,20 +4,21 @@ from .ui.widgets.barcode_popup import BarcodePopup
 from .ui.screens import dashboard as dashb
 from .ui.screens import search_page as sp
 from .ui.screens import main_window as mw
-from .core import oak_pipeline as op
+from .core import wms
+from .core import journal
+from .core import station
+from .ui import config as kivy_config
 from .utils import utils
+from .utils import cache
+from .utils import estimator
+from .utils import latency
 from .conf import config
 from functools import partial
-import depthai as dai
 import threading
+import time
 import sys
-from kivy.uix.screenmanager import Screen, ScreenManager
-from kivymd.uix.snackbar import BaseSnackbar
-from kivymd.uix.snackbar import Snackbar
-from kivymd.uix.textfield import MDTextField
-from kivymd.uix.label import MDLabel
-from kivymd.uix.button import MDFlatButton
-from kivymd.uix.dialog import MDDialog
+import numpy as np
+from kivy.uix.screenmanager import ScreenManager
 from kivymd.app import MDApp
 from kivy.resources import resource_add_path
 from kivy.graphics.texture import Texture
@@ -46,7 +47,7 @@ Config.set("graphics", "minimum_height", "600")
 
 # Kivy custom screen,widgets imports
 
-# Hydra configuration file initialisation
+# Hydra configuration, composed on first use
 cfg = config.cfg
 username = ""
 search_field = ""
@@ -87,7 +88,10 @@ class QAApp(MDApp):
     master_data: dict
         Json WMS response speicfic to a ``transfer id``.
     dimension: dict
-        Measured dimensions (length, width, height) from OAk.
+        Measured dimensions (length, width, height) from OAk, locked in by
+        ``measurements`` once the per frame measurements have converged.
+    measurement: :class:`src.utils.estimator.Estimate`
+        Latest fused measurement of the item, with its confidence
     override_master_data: dict
         Updated master data (length, width, height,weight, quantity)
     window_size: tuple
@@ -98,8 +102,35 @@ class QAApp(MDApp):
         Height of current kivy window
     _keyboard_press: int
         Private variable to capture the key press ids
-    oak: :class:`src.core.oak_pipeline.OakPipeline`
-        instance of :class:`src.core.oak_pipeline.OakPipeline`
+    station: :class:`src.core.station.StationManager`
+        Runs a :class:`src.core.oak_pipeline.OakPipeline` per OAK cam of the
+        station, created by the pipeline thread on start
+    display_device: str
+        Id of the device whose frames are displayed and measured
+    preview_visible: bool
+        ``True`` while the ``vid`` widget is on screen, ie. ``cfg.cv.display``
+        is enabled, the window is not minimised or hidden and the current
+        screen is one of ``cfg.cv.preview_screens``. Otherwise the overlays
+        are not drawn and the frames are not uploaded, the measurements and
+        decoding keep running.
+    barcode_cache: :class:`src.utils.cache.BarcodeLookupCache`
+        Debounces the barcode lookups made from the capture loop
+    measurements: :class:`src.utils.estimator.MeasurementAggregator`
+        Fuses the per frame measurements of each item
+    master_data_cache: :class:`src.utils.cache.MasterDataCache`
+        Caches and coalesces the transfer lookups made to ``wms``
+    wms: :class:`src.core.wms.WmsClient`
+        Fetches the transfer details from WMS without blocking the capture
+        loop or the kivy thread
+    journal: :class:`src.core.journal.UpdateJournal`
+        Queues the confirmations, overrides and flags sent to ``wms``
+    wms_server: :class:`src.core.wms.StandInServer`
+        Serves ``src.ui.config.wms_response`` when ``cfg.db.wms_url`` is empty,
+        ``None`` otherwise
+    latency: :class:`src.utils.latency.LatencyTracer`
+        Latency of each stage of the capture and display loops, and of the
+        frames from the device to the display (``glass_to_glass``). Written to
+        ``cfg.cv.latency_dir`` when the app closes.
     """
 
     def __init__(self, **kwargs):
@@ -115,39 +146,235 @@ class QAApp(MDApp):
         self.session_state = None
         self.update_dimension = True
         self.dimension = {}
+        self.measurement = None
+        self._shown_dimension = None
         self.master_data = {}
+        self.transfer_ID = None
         self.override_master_data = {}
         self._keyboard_press = None
         self.window_size = Window.size
         self.window_w = Window.width
         self.window_h = Window.height
-        self.oak = op.OakPipeline()
+        self._texture = None
+        self._vid_widgets = {}
+        self._display_pending = None
+        self._display_scheduled = False
+        self._display_scheduled_at = 0.0
+        self.latency = latency.LatencyTracer(window=cfg.cv.latency_window)
+        # Created by the pipeline thread, so that building the product
+        # index does not delay the first window
+        self.station = None
+        self.display_device = None
+        self.preview_visible = cfg.cv.display
+        self._window_hidden = False
+        self._frame_lock = threading.Lock()
+        self._lane_barcodes = {}
+        self.barcode_cache = cache.BarcodeLookupCache(
+            miss_ttl=cfg.db.barcode_miss_ttl,
+            appear_timeout=cfg.db.barcode_appear_timeout,
+        )
+        self.measurements = estimator.MeasurementAggregator(
+            window=cfg.cv.measure_window,
+            min_samples=cfg.cv.measure_min_samples,
+            lock_std=cfg.cv.measure_lock_std,
+            unlock_tol=cfg.cv.measure_unlock_tol,
+            unlock_frames=cfg.cv.measure_unlock_frames,
+            max_missing=cfg.cv.measure_max_missing,
+        )
+        self.wms = wms.WmsClient(
+            cfg.db.wms_url,
+            timeout=cfg.db.wms_timeout,
+            retries=cfg.db.wms_retries,
+            backoff=cfg.db.wms_backoff,
+            pool_size=cfg.db.wms_pool_size,
+        )
+        self.master_data_cache = cache.MasterDataCache(
+            max_size=cfg.db.master_data_max_size,
+            ttl=cfg.db.master_data_ttl,
+            miss_ttl=cfg.db.barcode_miss_ttl,
+        )
+        self.wms_server = None
+        if not cfg.db.wms_url:
+            self.wms_server = self.wms.submit(
+                wms.StandInServer(kivy_config.wms_response).start()
+            ).result()
+            self.wms.base_url = self.wms_server.url
+        self.journal = journal.UpdateJournal(
+            utils.relative_to_abs_path(cfg.db.journal_fpath),
+            send=lambda updates: self.wms.post_updates(updates).result(),
+            rejected=wms.WmsRejected,
+            batch_size=cfg.db.journal_batch_size,
+            backoff=cfg.db.journal_backoff,
+            max_backoff=cfg.db.journal_max_backoff,
+        )
+        self._pending_lookups = set()
 
         Window.bind(on_key_down=self._keydown)
         Window.bind(on_resize=self._update_window_size)
+        Window.bind(
+            on_minimize=partial(self._set_window_hidden, True),
+            on_hide=partial(self._set_window_hidden, True),
+            on_restore=partial(self._set_window_hidden, False),
+            on_show=partial(self._set_window_hidden, False),
+            on_maximize=partial(self._set_window_hidden, False),
+        )
 
-    def _display_frame(self, frame, dt):
+    def _barcode_searched(self, barcode, future, dt):
         """
-        Creates a new texture in the current page corresponding to
-        the size of the processed CV frame and convert it to a byte stream.
-        Replace the texture of the `vid` widget of the curernt screen.
+        Handles the WMS response of a barcode looked up by
+        :func:`_search_barcode`, on the kivy thread.
+
+        Parameters
+        ----------
+        barcode : str
+            Decoded barcode value
+        future : :class:`concurrent.futures.Future`
+            Completed lookup from :func:`src.core.wms.WmsClient.get_transfer`
+        dt : float
+            Refers to delta-time for scheduled call back.
+        """
+        self._pending_lookups.discard(barcode)
+        if not self.session_state:
+            return
+        search_page = self.root.get_screen("menu")
+        try:
+            transfer_details = future.result()
+        except wms.WmsError:
+            # Not cached, the barcode is looked up again when it reappears
+            search_page.show_popup(dt, content="WMS is unreachable.")
+            return
+        self.start_qa, self.master_data = search_page.search_transfer_barcode(
+            user_name=self.user_name,
+            barcode_data=barcode,
+            master_data=self.master_data,
+            transfer_details=transfer_details,
+        )
+        self.barcode_cache.put(barcode, self.master_data if self.start_qa else None)
+
+    def _display_frame(self, dt):
+        """
+        Uploads the latest processed CV frame to the texture of the ``vid``
+        widget of the current screen.
+
+        .. note::
+            The texture is created only when the frame size changes and is
+            flipped once, through its texture co-ordinates. Frames are blitted
+            straight from the array buffer and frames which arrived while the
+            UI thread was busy are dropped, only the latest one is displayed.
 
         Parameters
         ----------
-        frame : np array
-            processed cv frame to be streamed
         dt : float
             Refers to delta-time, which is the elapsed time between the
             scheduling and the callback
         """
-        texture = Texture.create(
-            size=(frame.shape[1], frame.shape[0]), colorfmt="bgr")
-        texture.blit_buffer(
-            frame.tobytes(order=None), colorfmt="bgr", bufferfmt="ubyte"
+        self.latency.record(
+            "clock_schedule", time.perf_counter() - self._display_scheduled_at
+        )
+        self._display_scheduled = False
+        pending = self._display_pending
+        self._display_pending = None
+        if pending is None:
+            return
+        frame, timestamp = pending
+        upload_start = time.perf_counter()
+        size = (frame.shape[1], frame.shape[0])
+        if self._texture is None or self._texture.size != size:
+            self._texture = Texture.create(size=size, colorfmt="bgr")
+            self._texture.flip_vertical()
+        self._texture.blit_buffer(
+            np.ascontiguousarray(frame).reshape(-1),
+            colorfmt="bgr",
+            bufferfmt="ubyte",
         )
-        texture.flip_vertical()
         current = self.root.current
-        self.root.get_screen(current).ids.vid.texture = texture
+        vid = self._vid_widgets.get(current)
+        if vid is None:
+            vid = self._vid_widgets[current] = self.root.get_screen(current).ids.vid
+        if vid.texture is not self._texture:
+            vid.texture = self._texture
+        vid.canvas.ask_update()
+        self.latency.record("texture_upload", time.perf_counter() - upload_start)
+        if timestamp is not None:
+            # Device timestamps are synced to the host monotonic clock
+            self.latency.record("glass_to_glass", time.monotonic() - timestamp)
+
+    def _frame_processed(self, result):
+        """
+        Handles a frame processed by a lane of ``station``, on the lane
+        thread. The frames of ``display_device`` are streamed to the ``vid``
+        widget and update the ``barcodeData`` and ``dimension`` attributes.
+        The lane which decodes a new barcode, ie. not the one it returned for
+        its previous frame, becomes the ``display_device``, so the app follows
+        the item between the cameras of a station.
+
+        If the ``session_state`` is ``True`` and when the decoded ``barcodeData`` is
+        available, it triggers the :func:`_search_barcode`
+        method to initiate the QA.
+
+        Parameters
+        ----------
+        result : :class:`src.core.station.FrameResult`
+            Processed frame, tagged with the id of its device
+        """
+        with self._frame_lock:
+            # The last decoded barcode is returned until the next decoding,
+            # so only a change of barcode in a lane moves the display to it
+            last = self._lane_barcodes.get(result.device_id)
+            self._lane_barcodes[result.device_id] = result.barcode
+            if (
+                result.barcode
+                and result.barcode != last
+                and result.device_id != self.display_device
+            ):
+                self.display_device = result.device_id
+                self._update_render()
+            if result.device_id != self.display_device:
+                return
+            self.barcodeData = result.barcode
+            if self.preview_visible:
+                self._schedule_display(result.img_contour, result.timestamp)
+            # Reused results of a static scene are not new measurements
+            if self.update_dimension and not result.gated:
+                # Views of different cameras are not fused. Items without a
+                # decoded barcode, eg. searched by transfer ID, are measured
+                # under the transfer of the session.
+                item = self.barcodeData or self.transfer_ID
+                self.measurement = self.measurements.update(
+                    (result.device_id, item), result.dimension
+                )
+                if self.measurement and self.measurement.locked:
+                    self.dimension = self.measurement.dimension
+            if self.session_state:
+                if self.barcodeData and self.barcode_cache.appeared(
+                    self.barcodeData
+                ):
+                    self._search_barcode(self.barcodeData)
+                if (
+                    self.dimension
+                    and self.start_qa
+                    and self.root.current == "dashboard"
+                ):
+
+                    # Only a newly locked in measurement is shown
+                    if (
+                        self.update_dimension
+                        and self.dimension is not self._shown_dimension
+                    ):
+                        self._shown_dimension = self.dimension
+                        Clock.schedule_once(partial(self._show_dashboard))
+
+    def _invalidate_transfer(self):
+        """
+        Drops the cached lookups of the current transfer once it is confirmed
+        or flagged, so that its next lookup returns the updated master data
+        """
+        if not self.master_data:
+            return
+        self.master_data_cache.invalidate(
+            self.transfer_ID, transfer_id=self.master_data.get("transfer_id")
+        )
+        self.barcode_cache.discard(self.master_data.get("barcode_id"))
 
     def _keydown(self, *args):
         """
@@ -156,6 +383,67 @@ class QAApp(MDApp):
         """
         self._keyboard_press = args[1]
 
+    def _schedule_display(self, frame, timestamp=None):
+        """
+        Hands a processed frame over to the UI thread. Only one
+        :func:`_display_frame` call is scheduled at a time and it displays the
+        latest frame handed over, so the UI never falls behind the capture loop.
+
+        Parameters
+        ----------
+        frame : np array
+            processed cv frame to be streamed
+        timestamp : float, optional
+            Device timestamp of the frame in seconds, used to measure the
+            ``glass_to_glass`` latency, by default None
+        """
+        self._display_pending = (frame, timestamp)
+        if not self._display_scheduled:
+            self._display_scheduled = True
+            self._display_scheduled_at = time.perf_counter()
+            Clock.schedule_once(self._display_frame)
+
+    def _search_barcode(self, barcode):
+        """
+        Looks up a barcode which just appeared in the CV frame. Lookups are
+        served from ``barcode_cache`` when possible, so that WMS is queried and
+        the "not recognised" popup is shown only once per barcode. Otherwise
+        the barcode is looked up asynchronously and the response is handled
+        by :func:`_barcode_searched`.
+
+        Parameters
+        ----------
+        barcode : str
+            Decoded barcode value
+        """
+        search_page = self.root.get_screen("menu")
+        cached, master_data = self.barcode_cache.get(barcode)
+        if cached:
+            if master_data:
+                self.start_qa, self.master_data = True, master_data
+                Clock.schedule_once(
+                    partial(
+                        search_page.update_scan_widget,
+                        user_name=self.user_name,
+                        master_data=master_data,
+                    )
+                )
+            return
+        if barcode in self._pending_lookups:
+            return
+        self._pending_lookups.add(barcode)
+        self.master_data_cache.get(
+            barcode,
+            self.wms.get_transfer,
+            callback=self._wms_callback(self._barcode_searched, barcode),
+        )
+
+    def _set_window_hidden(self, hidden, *args):
+        """Tracks whether the window is minimised or hidden, see
+        ``preview_visible``"""
+        self._window_hidden = hidden
+        self._update_preview()
+
     def _show_dashboard(self, dt):
         """
         Updates the ``measure`` widget (labels and text fields) in the
@@ -179,115 +467,52 @@ class QAApp(MDApp):
 
     def _start_pipeline(self):
         """
-        Configure the ``color_Cam``, ``nn``, ``stereo``, ``mono_left`` and ``mono_right`` nodes.
-        Starts the depthai pipeline and process the streaming data from OAK cam.
-        Receives the ``preview``, ``detection`` queue and streams the processed frame.
-        Decodes the barcode captured in the ``CvFrame`` and updates the ``barcodeData``
-        and ``dimension`` attributes.
-
-        If the ``session_state`` is ``True`` and when the decoded ``barcodeData`` is
-        available, it triggers the aaaa
-        method to initiate the QA.
+        Starts a :class:`src.core.station.StationManager` running a capture
+        pipeline per connected OAK cam, or per replayed recording, which
+        configures the ``color_Cam``, ``nn``, ``stereo``, ``mono_left`` and
+        ``mono_right`` nodes and streams the processed frames to
+        :func:`_frame_processed`.
 
+        The product catalogue is loaded before the lanes start, so this runs
+        in a thread of its own to keep the first window responsive.
         """
         self.vid_capture = True
-        sync_nn = cfg.calib.syncnn
-        pipeline = dai.Pipeline()
-        # Create cam nodes
-        color_cam = pipeline.createColorCamera()
-        nn = pipeline.createMobileNetSpatialDetectionNetwork()
-        mono_left = pipeline.createMonoCamera()
-        mono_right = pipeline.createMonoCamera()
-        stereo = pipeline.createStereoDepth()
-        # Create output stream links from oak
-        xout_rgb = pipeline.createXLinkOut()
-        xout_nn = pipeline.createXLinkOut()
-        # Rename the streams
-        xout_rgb.setStreamName("rgb")
-        xout_nn.setStreamName("detections")
-        # Configure color_Cam node
-        color_cam.setPreviewSize(
-            cfg.model.input_size_x, cfg.model.input_size_y)
-        color_cam.setResolution(
-            dai.ColorCameraProperties.SensorResolution.THE_1080_P)
-        color_cam.setInterleaved(cfg.calib.interleaved_color_cam)
-        color_cam.setColorOrder(dai.ColorCameraProperties.ColorOrder.BGR)
-        # Configure mono cams
-        mono_left.setResolution(
-            dai.MonoCameraProperties.SensorResolution.THE_400_P)
-        mono_left.setBoardSocket(dai.CameraBoardSocket.LEFT)
-        mono_right.setResolution(
-            dai.MonoCameraProperties.SensorResolution.THE_400_P)
-        mono_right.setBoardSocket(dai.CameraBoardSocket.RIGHT)
-        # setting node configs
-        stereo.setOutputDepth(cfg.calib.output_depth_stereo)
-        stereo.setConfidenceThreshold(cfg.calib.thres_conf_stereo)
-        # Configure neural network node
-        nn.setBlobPath(utils.relative_to_abs_path(cfg.model.blob_fpath))
-        nn.setConfidenceThreshold(cfg.calib.thres_conf_spatial)
-        nn.input.setBlocking(cfg.calib.blocking_spatial)
-        nn.setBoundingBoxScaleFactor(cfg.calib.bb_scale_factor_spatial)
-        nn.setDepthLowerThreshold(cfg.calib.depth_low_thres_spatial)
-        nn.setDepthUpperThreshold(cfg.calib.depth_high_thres_spatial)
-        # Create outputs stream links for mono cams
-        mono_left.out.link(stereo.left)
-        mono_right.out.link(stereo.right)
-
-        color_cam.preview.link(nn.input)
-        if sync_nn:
-            nn.passthrough.link(xout_rgb.input)
-        else:
-            color_cam.preview.link(xout_rgb.input)
-
-        nn.out.link(xout_nn.input)
-        stereo.depth.link(nn.inputDepth)
-
-        # start processing loop
-        with dai.Device(pipeline) as device:
-            # Start pipeline
-            device.startPipeline()
-            # Output queues will be used to get the rgb frames and nn data from the outputs defined above
-            preview_queue = device.getOutputQueue(
-                name="rgb",
-                maxSize=cfg.calib.out_queue_max_size,
-                blocking=cfg.calib.out_queue_blocking,
-            )
-            detection_nn_queue = device.getOutputQueue(
-                name="detections",
-                maxSize=cfg.calib.out_queue_max_size,
-                blocking=cfg.calib.out_queue_blocking,
-            )
-            frame = None
-            detections = []
-            while self.oak.vid_capture:
-                in_preview = preview_queue.get()
-                in_nn = detection_nn_queue.get()
-                frame = in_preview.getCvFrame()
-                detections = in_nn.detections
-                # Decode captured barcode from CV frame
-                self.barcodeData, barcodeType = self.oak.decode_barcode(frame)
-                img_contour, oak_dim = self.oak.draw_measurements(
-                    frame, detections)
-                Clock.schedule_once(partial(self._display_frame, img_contour))
-                if self.update_dimension:
-                    self.dimension = oak_dim
-                if self.session_state:
-                    if self.barcodeData:
-                        self.start_qa, self.master_data = self.root.get_screen(
-                            "menu"
-                        ).search_transfer_barcode(
-                            user_name=self.user_name,
-                            barcode_data=self.barcodeData,
-                            master_data=self.master_data,
-                        )
-                    if (
-                        self.dimension
-                        and self.start_qa
-                        and self.root.current == "dashboard"
-                    ):
+        self.station = station.StationManager(
+            self._frame_processed, tracer=self.latency
+        )
+        self.display_device = self.station.lanes[0].device_id
+        self._update_render()
+        self.station.start()
 
-                        if self.update_dimension:
-                            Clock.schedule_once(partial(self._show_dashboard))
+    def _transfer_searched(self, screen_name, search_text, future, dt):
+        """
+        Handles the WMS response of a transfer ID searched with
+        :func:`search_transfer`, on the kivy thread.
+
+        Parameters
+        ----------
+        screen_name : str
+            Name of the screen the search was made from
+        search_text : str
+            Searched transfer ID
+        future : :class:`concurrent.futures.Future`
+            Completed lookup from :func:`src.core.wms.WmsClient.get_transfer`
+        dt : float
+            Refers to delta-time for scheduled call back.
+        """
+        screen = self.root.get_screen(screen_name)
+        try:
+            transfer_details = future.result()
+        except wms.WmsError:
+            screen.show_popup(dt, content="WMS is unreachable.")
+            return
+        self.start_qa, self.transfer_ID, self.master_data = screen.search_transfer_id(
+            cur_screen=screen.ids.search_field,
+            user_name=self.user_name,
+            master_data=self.master_data,
+            search_text=search_text,
+            transfer_details=transfer_details,
+        )
 
     def _update_dashboard_ids(self, dt):
         """
@@ -321,6 +546,26 @@ class QAApp(MDApp):
             )
         )
 
+    def _update_preview(self, *args):
+        """Updates ``preview_visible`` when the window is minimised, hidden
+        or restored and when the current screen changes"""
+        self.preview_visible = (
+            cfg.cv.display
+            and not self._window_hidden
+            and self.root.current in cfg.cv.preview_screens
+        )
+        self._update_render()
+
+    def _update_render(self):
+        """Draws the overlays only in the lane of ``display_device``, and only
+        while ``preview_visible``"""
+        if self.station is None:
+            return
+        for lane in self.station.lanes:
+            lane.oak.render = (
+                self.preview_visible and lane.device_id == self.display_device
+            )
+
     def _update_search_page_ids(self, dt):
         """
         Updates the widget ids in the :class:`src.ui.screens.dashboard.DashBoard`.
@@ -355,6 +600,20 @@ class QAApp(MDApp):
         self.window_w = Window.width
         self.window_h = Window.height
 
+    def _wms_callback(self, handler, *args):
+        """
+        Returns a callback for the futures of :attr:`wms`, which calls
+        ``handler(*args, future, dt)`` on the kivy thread. The time taken by
+        the lookup is recorded as the ``wms_lookup`` stage of ``latency``.
+        """
+        start = time.perf_counter()
+
+        def callback(future):
+            self.latency.record("wms_lookup", time.perf_counter() - start)
+            Clock.schedule_once(partial(handler, *args, future))
+
+        return callback
+
     def build(self):
         """
         Builds a `parser` for parsing the main `kv` file by using the global kivy
@@ -417,6 +676,9 @@ class QAApp(MDApp):
         self.start_qa = False
         self.barcodeData = None
         self.dimension = {}
+        self.measurement = None
+        self._shown_dimension = None
+        self.measurements.clear()
         self.update_dimension = True
 
     def clear_weight_widget(self):
@@ -430,7 +692,8 @@ class QAApp(MDApp):
     def confirm_override(self):
         """
         Submits the updated values to WMS internally by
-        triggering :func:`src.ui.screens.dashboard.DashBoard.confirm_override` method
+        triggering :func:`src.ui.screens.dashboard.DashBoard.confirm_override` method.
+        The override is queued in ``journal`` and sent in the background.
         """
 
         current = self.root.current
@@ -443,15 +706,44 @@ class QAApp(MDApp):
                 status="success",
             )
             self.update_dimension = False
+            self.journal.append(
+                "override",
+                self.master_data.get("transfer_id"),
+                self.override_master_data,
+            )
+            self._invalidate_transfer()
+
+    def confirm_qa(self):
+        """
+        Queues the confirmation of the current transfer, with the measured
+        dimensions, in ``journal`` once the QA is done. Nothing is queued
+        until the measured dimensions are locked in.
+        """
+        if not (self.start_qa and self.master_data):
+            return
+        if not (self.dimension and self.measurement and self.measurement.locked):
+            return
+        self.journal.append(
+            "confirm",
+            self.master_data.get("transfer_id"),
+            {"dimension": dict(self.dimension)},
+        )
+        self._invalidate_transfer()
 
     def flag_transfer(self):
-        """Updates the state of the ``flag`` attribute """
+        """Updates the state of the ``flag`` attribute and queues the flag in
+        ``journal``"""
         current = self.root.current
+        if self.master_data:
+            self.journal.append(
+                "flag" if self.flag else "unflag", self.master_data.get("transfer_id")
+            )
         self.root.get_screen(current).flag_transfer(
             flag=self.flag,
             widget=self.root.get_screen(current).ids.flag_transfer,
         )
         self.flag = not self.flag
+        self._invalidate_transfer()
 
     def login_keydown(self):
         """
@@ -460,6 +752,27 @@ class QAApp(MDApp):
         if self._keyboard_press == 13:
             self.user_authenticate()
 
+    def on_start(self):
+        """Follows the current screen to update ``preview_visible``"""
+        self.root.bind(current=self._update_preview)
+        self._update_preview()
+
+    def on_stop(self):
+        """Stops the OAK pipeline thread and its workers when the app closes,
+        and writes the latency summary of the session"""
+        if self.station is not None:
+            self.station.close()
+            self.latency.counters["sync"] = self.station.counters()
+            if cfg.cv.latency_dir:
+                self.latency.write(
+                    utils.relative_to_abs_path(cfg.cv.latency_dir),
+                    fps=self.station.lanes[0].oak.calc_fps,
+                )
+        self.journal.close()
+        if self.wms_server:
+            self.wms.submit(self.wms_server.close()).result()
+        self.wms.close()
+
     def popup_dismiss(self):
         """Dismiss popup in :class:`src.ui.screens.search_page.SearchPage` and
         :class:`src.ui.screens.dashboard.DashBoard` screens"""
@@ -477,18 +790,19 @@ class QAApp(MDApp):
 
     def search_transfer(self):
         """
-        Redirects the search request to :class:`src.ui.screens.search_page.SearchPage`
-        screen. On successful search, ``start_qa``, ``transfer_ID`` and ``master_data``
-        attributes are updated. Otherwise left with the defualt values.
+        Looks up the transfer ID entered in the search field in WMS and
+        redirects the response to :class:`src.ui.screens.search_page.SearchPage`
+        screen, see :func:`_transfer_searched`. On successful search, ``start_qa``,
+        ``transfer_ID`` and ``master_data`` attributes are updated. Otherwise left
+        with the defualt values.
         """
         current = self.root.current
         self.master_data = {}
-        self.start_qa, self.transfer_ID, self.master_data = self.root.get_screen(
-            current
-        ).search_transfer_id(
-            cur_screen=self.root.get_screen(current).ids.search_field,
-            user_name=self.user_name,
-            master_data=self.master_data,
+        search_text = self.root.get_screen(current).ids.search_field.text
+        self.master_data_cache.get(
+            search_text,
+            self.wms.get_transfer,
+            callback=self._wms_callback(self._transfer_searched, current, search_text),
         )
 
     def show_override_popup(self):
@@ -515,6 +829,7 @@ class QAApp(MDApp):
         method for authentication
         """
         self.user_name = self.root.get_screen("login").ids.username.text
+        self.barcode_cache.clear()
         self.session_state = self.root.get_screen("login").user_authenticate(
             cur_screen=self.root.get_screen("login").ids.username,
             nxt_Screen=self.root.get_screen("menu").ids.userWelcomeName,
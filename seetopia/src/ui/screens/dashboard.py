@@ -404,9 +404,10 @@ class DashBoard(Screen):
             when ``override`` is enabled, :func:`flag_transfer` is invoked with a ``success``
             message
 
-        .. todo::
-            Send ``update`` request to ``WMS`` when ``override`` is enabled.
-            Display ``flag`` messages based on the response from WMS (success,fail)
+        .. note::
+            The override itself is queued for WMS by
+            :class:`src.core.journal.UpdateJournal`, the message is displayed
+            without waiting for WMS.
 
         Parameters
         ----------
@@ -424,8 +425,6 @@ class DashBoard(Screen):
             by default [ "measure", "weight", "item_cnt", "buttons", "putaway", "finish_qa_btn", ]
         """
         if override:
-            # Send update notification to WMS <API CALL>
-            # Flag msg based on the update resonse from WMS (succes,fail)
             Clock.schedule_once(
                 partial(
                     self.show_flag,
@@ -59,16 +59,15 @@ class SearchPage(Screen):
         """Dismisses the current popup on the screen"""
         self.popup.dismiss()
 
-    def search_transfer_barcode(self, user_name, barcode_data, master_data):
+    def search_transfer_barcode(
+        self, user_name, barcode_data, master_data, transfer_details=None
+    ):
         """Updates ``scan`` widget by invoking call to :func:`update_scan_widget`
         When the scanned ``barcode`` is present in WMS.
 
         .. note::
             Kivy :clock:`Clock <>` object us used to schedule this function call once.
 
-        ..todo::
-            ``GET`` request to WMS
-
         Parameters
         ----------
         user_name : str
@@ -77,6 +76,10 @@ class SearchPage(Screen):
             Decoded barcode information
         master_data : dict
             Expected values from wms
+        transfer_details : dict, optional
+            WMS response for the barcode fetched with
+            :func:`src.core.wms.WmsClient.get_transfer`, by default None ie.
+            the barcode is unknown
 
         Returns
         -------
@@ -84,14 +87,7 @@ class SearchPage(Screen):
             Status of the ``QA`` session , ``True`` or ``False``
         """
         start_qa = False
-        search_text = barcode_data
-        # Api call to wms to fetch details of a stock trasnfer
-        wms_response = kivy_config.wms_response
-        # Details of a specific transfer
-        transfer_details = (
-            wms_response[search_text] if search_text in wms_response else None
-        )
-        if transfer_details:  # WMS <API CALL>
+        if transfer_details:
             # need wms response
             master_data = transfer_details
             start_qa = True
@@ -107,7 +103,9 @@ class SearchPage(Screen):
             Clock.schedule_once(partial(self.show_popup, content=content))
         return start_qa, master_data
 
-    def search_transfer_id(self, cur_screen, user_name, master_data):
+    def search_transfer_id(
+        self, cur_screen, user_name, master_data, search_text, transfer_details=None
+    ):
         """Invokes call to the :func:`update_scan_widget` when the search
         ID matches the ``WMS`` data and the ``trasfer state`` is ``awaiting QA``
         else invokes :func:`show_popup` to display the ``transfer state`` which is
@@ -116,10 +114,6 @@ class SearchPage(Screen):
         .. note::
             Kivy :clock:`Clock <>` object us used to schedule this function call once.
 
-        .. todo::
-            ``GET`` request to WMS
-
-
         Parameters
         ----------
         cur_screen :
@@ -128,6 +122,12 @@ class SearchPage(Screen):
             ``name`` provided by the user
         master_data : dict
             Expected values from WMS
+        search_text : string
+            Transfer ID searched in WMS
+        transfer_details : dict, optional
+            WMS response for ``search_text`` fetched with
+            :func:`src.core.wms.WmsClient.get_transfer`, by default None ie.
+            the transfer is unknown
 
         Returns
         -------
@@ -140,13 +140,6 @@ class SearchPage(Screen):
         """
         start_qa = False
         master_data = None
-        search_text = cur_screen.text
-        # Api call to wms to fetch details of a stock trasnfer
-        wms_response = kivy_config.wms_response
-        # Details of a specific transfer
-        transfer_details = (
-            wms_response[search_text] if search_text in wms_response else None
-        )
         if transfer_details:
             transfer_state = transfer_details["state"]
             if transfer_state == "awaiting qa":
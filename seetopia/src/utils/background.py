@@ -0,0 +1,155 @@
+import cv2
+import numpy as np
+
+
+class BackgroundModel:
+    """Reference model of the empty mat, used to segment the objects placed
+    on it by a per pixel difference instead of edge detection.
+
+    The reference is the running average of the colour, and optionally the
+    depth, of the frames the bench is clear in, learned over ``learn_frames``
+    frames. Once learned, the pixels of every segmented frame which are not
+    part of an object keep updating it at the rate ``alpha`` with
+    :accumulate_weighted:`cv2.accumulateWeighted <>`, so the reference
+    follows the lighting drift.
+
+    >>> model = BackgroundModel()
+    >>> model.learn(empty_frame)  # until model.ready
+    >>> mask = model.segment(frame)
+    >>> model.update(frame, mask)
+
+    Parameters
+    ----------
+    learn_frames : int, optional
+        Clear frames averaged before the model is used, by default 30
+    alpha : float, optional
+        Rate at which the reference follows the background pixels of the
+        segmented frames, by default 0.02
+    threshold : int, optional
+        Difference of colour from the reference, in any channel, above which
+        a pixel is part of an object, by default 30
+    depth_threshold : float, optional
+        Height in mm above the reference depth from which a pixel is part of
+        an object, by default 15. Depth is not used if 0.
+    colour: np array
+        Reference colour, ``float32``, ``None`` until the first frame is
+        learned
+    depth: np array
+        Reference depth in mm, ``float32``, ``None`` without depth frames
+    learned: int
+        Number of clear frames learned since the last :func:`reset`
+    """
+
+    def __init__(self, learn_frames=30, alpha=0.02, threshold=30, depth_threshold=15):
+        self.learn_frames = learn_frames
+        self.alpha = alpha
+        self.threshold = threshold
+        self.depth_threshold = depth_threshold
+        self.colour = None
+        self.depth = None
+        self.learned = 0
+        self._reference = None
+        self._diff = None
+
+    @property
+    def ready(self):
+        """``True`` once ``learn_frames`` clear frames are learned"""
+        return self.learned >= self.learn_frames
+
+    def _accumulate(self, frame, depth, alpha, mask=None):
+        """Blends ``frame`` and ``depth`` into the reference at the rate
+        ``alpha``, only the non zero pixels of ``mask`` if given"""
+        cv2.accumulateWeighted(frame, self.colour, alpha, mask=mask)
+        cv2.convertScaleAbs(self.colour, dst=self._reference)
+        if depth is not None and self.depth is not None:
+            depth = depth.astype(np.float32)
+            # Pixels without a depth value keep their reference depth
+            valid = (depth > 0).view(np.uint8)
+            if mask is not None:
+                valid &= _resize_mask(mask, depth.shape)
+            cv2.accumulateWeighted(depth, self.depth, alpha, mask=valid)
+
+    def learn(self, frame, depth=None):
+        """Averages a frame of the empty mat into the reference
+
+        Parameters
+        ----------
+        frame : np array
+            BGR frame, the bench being clear
+        depth : np array, optional
+            Aligned depth frame in mm, by default None
+        """
+        if self.colour is None or self.colour.shape != frame.shape:
+            self.reset()
+            self.colour = frame.astype(np.float32)
+            self._reference = frame.copy()
+            self._diff = np.empty_like(frame)
+            if depth is not None and self.depth_threshold:
+                self.depth = depth.astype(np.float32)
+            self.learned = 1
+            return
+        self.learned += 1
+        # Plain average of the clear frames learned so far
+        self._accumulate(frame, depth, 1.0 / self.learned)
+
+    def reset(self):
+        """Drops the reference, which is learned again from the next clear
+        frames"""
+        self.colour = None
+        self.depth = None
+        self.learned = 0
+
+    def segment(self, frame, depth=None, out=None):
+        """Returns the mask of the pixels which differ from the reference
+
+        Parameters
+        ----------
+        frame : np array
+            BGR frame
+        depth : np array, optional
+            Aligned depth frame in mm, of any resolution. Pixels higher than
+            the reference by more than ``depth_threshold`` are part of the
+            objects as well, by default None
+        out : np array, optional
+            ``uint8`` buffer the mask is written to, by default a new array
+
+        Returns
+        -------
+        np array
+            ``uint8`` mask, 255 on the objects and 0 on the mat
+        """
+        cv2.absdiff(frame, self._reference, dst=self._diff)
+        # Largest difference of the channels, much faster than np.max
+        blue, green, red = cv2.split(self._diff)
+        out = cv2.max(blue, green, dst=out)
+        cv2.max(out, red, dst=out)
+        cv2.threshold(out, self.threshold, 255, cv2.THRESH_BINARY, dst=out)
+        if depth is not None and self.depth is not None:
+            raised = (self.depth - depth > self.depth_threshold) & (depth > 0)
+            cv2.bitwise_or(
+                out, _resize_mask(raised.view(np.uint8) * 255, out.shape), dst=out
+            )
+        return out
+
+    def update(self, frame, mask, depth=None):
+        """Follows the lighting drift with the pixels of ``frame`` outside
+        ``mask``, ie. the mat around the segmented objects
+
+        Parameters
+        ----------
+        frame : np array
+            BGR frame segmented by :func:`segment`
+        mask : np array
+            ``uint8`` mask of the objects, eg. the dilated mask of
+            :func:`segment`
+        depth : np array, optional
+            Aligned depth frame in mm, by default None
+        """
+        self._accumulate(frame, depth, self.alpha, mask=cv2.bitwise_not(mask))
+
+
+def _resize_mask(mask, shape):
+    """Returns ``mask`` resized to ``shape`` without interpolating it"""
+    if mask.shape[:2] == shape[:2]:
+        return mask
+    return cv2.resize(mask, shape[1::-1], interpolation=cv2.INTER_NEAREST)
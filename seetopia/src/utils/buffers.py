@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class FrameWorkspace:
+    """Pool of preallocated frame buffers, keyed by name, shape and dtype.
+
+    The per frame stages of :class:`src.core.oak_pipeline.OakPipeline` write
+    their intermediate images into these buffers through the ``dst``
+    parameters of OpenCV, so that no full frame temporaries are allocated
+    once the first frame of a given size has been processed.
+
+    .. note::
+        Buffers are reused across frames. A buffer returned by :func:`get`
+        is only valid until the next frame, use :func:`next` for images that
+        are handed over to another thread, eg. the display.
+
+    Parameters
+    ----------
+    reuse : bool, optional
+        If ``False``, a new buffer is allocated on every call, which is only
+        useful to compare allocations with and without the pool,
+        by default True
+    slots : int, optional
+        Number of rotating buffers returned by :func:`next`, by default 3
+    """
+
+    def __init__(self, reuse=True, slots=3):
+        self.reuse = reuse
+        self.slots = slots
+        self._buffers = {}
+        self._slot = {}
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def clear(self):
+        """Releases all the buffers"""
+        self._buffers.clear()
+        self._slot.clear()
+
+    def get(self, name, shape, dtype=np.uint8):
+        """Returns the buffer registered under ``name`` for the given shape
+        and dtype, allocating it on first use.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage using the buffer
+        shape : tuple
+            Shape of the buffer
+        dtype : optional
+            Data type of the buffer, by default np.uint8
+
+        Returns
+        -------
+        np array
+            Uninitialised buffer
+        """
+        key = (name, tuple(shape), np.dtype(dtype))
+        buf = self._buffers.get(key) if self.reuse else None
+        if buf is None:
+            buf = self._buffers[key] = np.empty(shape, dtype=dtype)
+        return buf
+
+    def next(self, name, shape, dtype=np.uint8):
+        """Returns the next of ``slots`` rotating buffers registered under
+        ``name``. A returned buffer is not handed out again before ``slots - 1``
+        other buffers of the same name.
+        """
+        slot = (self._slot.get(name, -1) + 1) % self.slots
+        self._slot[name] = slot
+        return self.get(f"{name}:{slot}", shape, dtype)
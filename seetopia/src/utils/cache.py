@@ -0,0 +1,246 @@
+import time
+import threading
+import collections
+from concurrent import futures
+
+
+class BarcodeLookupCache:
+    """Debounces the barcode lookups made from the capture loop.
+
+    A barcode visible in consecutive frames is looked up only once, when it
+    first appears. Successful lookups (hits) are kept until :func:`clear` is
+    called on a session change, while unknown barcodes (misses) are
+    remembered for ``miss_ttl`` seconds so that neither the lookup nor the
+    "not recognised" popup is repeated.
+
+    Parameters
+    ----------
+    miss_ttl : float, optional
+        Seconds for which an unknown barcode is not looked up again,
+        by default 10.0
+    appear_timeout : float, optional
+        A barcode not seen for this many seconds is treated as a new
+        appearance when it is seen again, by default 1.0
+    clock : callable, optional
+        Monotonic time source, by default :func:`time.monotonic`
+    hits: dict
+        Master data of the barcodes found in WMS
+    misses: dict
+        Time at which an unknown barcode was looked up
+    """
+
+    def __init__(self, miss_ttl=10.0, appear_timeout=1.0, clock=time.monotonic):
+        self.miss_ttl = miss_ttl
+        self.appear_timeout = appear_timeout
+        self.clock = clock
+        self.hits = {}
+        self.misses = {}
+        self._last_seen = {}
+
+    def appeared(self, barcode):
+        """Marks ``barcode`` as seen in the current frame.
+
+        Parameters
+        ----------
+        barcode : str
+            Decoded barcode value
+
+        Returns
+        -------
+        bool
+            ``True`` if the barcode was not seen in the last
+            ``appear_timeout`` seconds
+        """
+        now = self.clock()
+        last = self._last_seen.get(barcode)
+        self._last_seen[barcode] = now
+        if len(self._last_seen) > 64:
+            self._last_seen = {
+                k: t
+                for k, t in self._last_seen.items()
+                if now - t <= self.appear_timeout
+            }
+        return last is None or now - last > self.appear_timeout
+
+    def clear(self):
+        """Forgets all the cached lookups, typically when the session changes"""
+        self.hits.clear()
+        self.misses.clear()
+        self._last_seen.clear()
+
+    def discard(self, barcode):
+        """Forgets the cached lookup of ``barcode``"""
+        self.hits.pop(barcode, None)
+        self.misses.pop(barcode, None)
+
+    def get(self, barcode):
+        """Returns the cached lookup of ``barcode``
+
+        Parameters
+        ----------
+        barcode : str
+            Decoded barcode value
+
+        Returns
+        -------
+        bool
+            ``True`` if the lookup is cached, either as a hit or as a miss
+            which has not expired yet
+        dict
+            Cached master data, ``None`` for a miss
+        """
+        if barcode in self.hits:
+            return True, self.hits[barcode]
+        looked_up = self.misses.get(barcode)
+        if looked_up is not None:
+            if self.clock() - looked_up <= self.miss_ttl:
+                return True, None
+            del self.misses[barcode]
+        return False, None
+
+    def put(self, barcode, master_data=None):
+        """Caches the lookup of ``barcode``, as a miss if ``master_data`` is
+        empty"""
+        if master_data:
+            self.hits[barcode] = master_data
+            self.misses.pop(barcode, None)
+        else:
+            self.misses[barcode] = self.clock()
+
+
+class MasterDataCache:
+    """Caches the transfer master data fetched from WMS, in front of
+    :func:`src.core.wms.WmsClient.get_transfer`.
+
+    At most ``max_size`` lookups are kept, least recently used first out,
+    each for ``ttl`` seconds, or ``miss_ttl`` seconds when WMS does not know
+    the key. Concurrent lookups of a key which is not cached share a single
+    request to WMS. Failed requests are not cached.
+
+    .. note::
+        Safe to use from several threads, eg. the capture loop, the kivy
+        thread and the event loop thread of the WMS client.
+
+    Parameters
+    ----------
+    max_size : int, optional
+        Maximum number of cached lookups, by default 256
+    ttl : float, optional
+        Seconds for which master data is served from the cache,
+        by default 300.0
+    miss_ttl : float, optional
+        Seconds for which an unknown key is served from the cache,
+        by default 10.0
+    clock : callable, optional
+        Monotonic time source, by default :func:`time.monotonic`
+    requests: int
+        Number of requests made to WMS
+    """
+
+    def __init__(self, max_size=256, ttl=300.0, miss_ttl=10.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.clock = clock
+        self.requests = 0
+        self._entries = collections.OrderedDict()
+        self._inflight = {}
+        # Number of invalidations so far, and the count at the last
+        # invalidation of each transfer
+        self._generation = 0
+        self._invalidated = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _store(self, key, future, generation):
+        with self._lock:
+            # Dropped by an invalidation while in flight
+            if self._inflight.get(key) is not future:
+                return
+            del self._inflight[key]
+            if future.cancelled() or future.exception() is not None:
+                return
+            master_data = future.result()
+            # Fetched under another key, eg. the barcode, before its transfer
+            # was invalidated
+            if master_data and (
+                self._invalidated.get(str(master_data.get("transfer_id")), -1)
+                >= generation
+            ):
+                return
+            ttl = self.ttl if master_data else self.miss_ttl
+            self._entries[key] = (self.clock() + ttl, master_data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Forgets all the cached lookups"""
+        with self._lock:
+            self._entries.clear()
+            self._inflight.clear()
+
+    def get(self, key, fetch, callback=None):
+        """Returns the master data of ``key``, from the cache when possible.
+
+        Parameters
+        ----------
+        key : str
+            Transfer ID or barcode
+        fetch : callable
+            Called with ``key`` to request WMS on a miss, returns a
+            :class:`concurrent.futures.Future`
+        callback : callable, optional
+            Called with the future once it is done, by default None
+
+        Returns
+        -------
+        :class:`concurrent.futures.Future`
+            Future of the master data, already done when it was cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                future = futures.Future()
+                future.set_result(entry[1])
+            else:
+                future = self._inflight.get(key)
+                generation = self._generation
+                if future is None:
+                    future = self._inflight[key] = fetch(key)
+                    self.requests += 1
+                    fetched = True
+                else:
+                    fetched = False
+        if entry is None and fetched:
+            future.add_done_callback(lambda f: self._store(key, f, generation))
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    def invalidate(self, key=None, transfer_id=None):
+        """Drops the cached lookups of ``key``, and of every key whose master
+        data belongs to ``transfer_id``, eg. once the transfer is confirmed or
+        flagged. Lookups in flight are not cached when they complete.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._inflight.pop(key, None)
+            if transfer_id is None:
+                return
+            self._invalidated[str(transfer_id)] = self._generation
+            self._generation += 1
+            stale = [
+                k
+                for k, (_, master_data) in self._entries.items()
+                if master_data
+                and str(master_data.get("transfer_id")) == str(transfer_id)
+            ]
+            for k in stale:
+                del self._entries[k]
@@ -0,0 +1,180 @@
+import collections
+import numpy as np
+
+FEATURES = ("length", "width", "depth")
+
+Estimate = collections.namedtuple(
+    "Estimate", ["dimension", "spread", "confidence", "locked", "samples"]
+)
+
+
+class RollingMeasurement:
+    """Fuses the per frame measurements of a single object with a windowed
+    median.
+
+    The spread of each feature is the median absolute deviation of the
+    window, scaled by 1.4826 to be on the scale of a standard deviation of
+    normally distributed measurements. Unlike the standard deviation, a few
+    frames with a broken contour do not prevent it from settling. The
+    estimate is locked in once ``min_samples`` measurements are in the
+    window and the spread of every feature is below ``lock_std``.
+
+    A locked estimate stays unchanged until :func:`reset` is called, or
+    until the object is gone or replaced, ie. ``max_missing`` frames in a
+    row without a measurement, or ``unlock_frames`` measurements in a row
+    off the locked dimension by more than ``unlock_tol``. The estimate is
+    then measured again.
+
+    Parameters
+    ----------
+    window : int, optional
+        Number of latest measurements kept, by default 15
+    min_samples : int, optional
+        Measurements required before locking in, by default 5
+    lock_std : float, optional
+        Spread in cm below which the estimate is locked in, by default 0.3
+    unlock_tol : float, optional
+        Difference in cm from the locked dimension above which a measurement
+        is off, by default 1.0
+    unlock_frames : int, optional
+        Measurements in a row off the locked dimension which unlock it, by
+        default 5
+    max_missing : int, optional
+        Frames in a row without a measurement after which the object is
+        gone and the estimate is reset, by default 15
+    samples: np array
+        Latest measurements, one row per frame
+    locked: dict
+        Locked in dimension, ``None`` until the estimate has converged
+    """
+
+    def __init__(
+        self,
+        window=15,
+        min_samples=5,
+        lock_std=0.3,
+        unlock_tol=1.0,
+        unlock_frames=5,
+        max_missing=15,
+    ):
+        self.window = window
+        self.min_samples = min_samples
+        self.lock_std = lock_std
+        self.unlock_tol = unlock_tol
+        self.unlock_frames = unlock_frames
+        self.max_missing = max_missing
+        self.samples = np.zeros((window, len(FEATURES)))
+        self.locked = None
+        self._count = 0
+        self._off = 0
+        self._missing = 0
+
+    def __len__(self):
+        return min(self._count, self.window)
+
+    def reset(self):
+        """Drops the measurements and unlocks the estimate"""
+        self.locked = None
+        self._count = 0
+        self._off = 0
+        self._missing = 0
+
+    def estimate(self):
+        """Returns the current :class:`Estimate`, ``None`` without
+        measurements"""
+        n = len(self)
+        if not n:
+            return None
+        if self.locked is not None:
+            return Estimate(self.locked, dict.fromkeys(FEATURES, 0.0), 1.0, True, n)
+        window = self.samples[:n]
+        median = np.median(window, axis=0)
+        spread = 1.4826 * np.median(np.abs(window - median), axis=0)
+        worst = spread.max()
+        confidence = min(1.0, n / self.min_samples) * min(
+            1.0, self.lock_std / worst if worst else 1.0
+        )
+        dimension = {f: round(float(v), 1) for f, v in zip(FEATURES, median)}
+        if n >= self.min_samples and worst <= self.lock_std:
+            self.locked = dimension
+            return Estimate(dimension, dict.fromkeys(FEATURES, 0.0), 1.0, True, n)
+        return Estimate(
+            dimension,
+            {f: float(v) for f, v in zip(FEATURES, spread)},
+            confidence,
+            False,
+            n,
+        )
+
+    def update(self, dimension):
+        """Adds the measurement of the current frame.
+
+        Parameters
+        ----------
+        dimension : dict
+            ``length``, ``width`` and ``depth`` measured in the current
+            frame. Frames where the object was not measured, ie. with a zero
+            length or width, only count towards ``max_missing``.
+
+        Returns
+        -------
+        :class:`Estimate`
+            Estimate after the update, ``None`` until a measurement is added
+        """
+        if not (dimension.get("length") and dimension.get("width")):
+            self._missing += 1
+            if self._missing >= self.max_missing:
+                self.reset()
+            return self.estimate()
+        self._missing = 0
+        sample = [float(dimension.get(f) or 0) for f in FEATURES]
+        if self.locked is not None:
+            off = any(
+                abs(value - self.locked[f]) > self.unlock_tol
+                for f, value in zip(FEATURES, sample)
+            )
+            self._off = self._off + 1 if off else 0
+            if self._off < self.unlock_frames:
+                return self.estimate()
+            # Another object, or the same one placed again differently
+            self.reset()
+        self.samples[self._count % self.window] = sample
+        self._count += 1
+        return self.estimate()
+
+
+class MeasurementAggregator:
+    """Keeps a :class:`RollingMeasurement` per object in front of the
+    station, keyed by eg. the decoded barcode.
+
+    Parameters
+    ----------
+    max_objects : int, optional
+        Number of objects tracked, the least recently updated one is
+        dropped beyond it, by default 8
+    kwargs :
+        Passed on to :class:`RollingMeasurement`
+    objects: :class:`collections.OrderedDict`
+        Estimators of the tracked objects
+    """
+
+    def __init__(self, max_objects=8, **kwargs):
+        self.max_objects = max_objects
+        self.kwargs = kwargs
+        self.objects = collections.OrderedDict()
+
+    def clear(self):
+        """Forgets all the tracked objects"""
+        self.objects.clear()
+
+    def update(self, key, dimension):
+        """Adds the measurement of the object ``key`` in the current frame,
+        see :func:`RollingMeasurement.update`"""
+        estimator = self.objects.get(key)
+        if estimator is None:
+            estimator = self.objects[key] = RollingMeasurement(**self.kwargs)
+            if len(self.objects) > self.max_objects:
+                self.objects.popitem(last=False)
+        else:
+            self.objects.move_to_end(key)
+        return estimator.update(dimension)
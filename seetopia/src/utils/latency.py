@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import threading
+import contextlib
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+class LatencyHistogram:
+    """Rolling window of the latencies of a single stage.
+
+    Parameters
+    ----------
+    window : int, optional
+        Number of latest samples kept, by default 1024
+    samples: np array
+        Latest latencies in milliseconds, used as a ring buffer
+    count: int
+        Number of samples recorded since the histogram was created
+    """
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.samples = np.zeros(window)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, ms):
+        """Records a latency in milliseconds"""
+        self.samples[self.count % self.window] = ms
+        self.count += 1
+        if ms > self.max:
+            self.max = ms
+
+    def summary(self, percentiles=PERCENTILES):
+        """Returns the statistics of the latencies in the window
+
+        Returns
+        -------
+        dict
+            ``count`` of samples recorded so far, ``mean``, the requested
+            percentiles eg. ``p50``, ``p95`` and ``p99`` of the window, and
+            the ``max`` over all samples, in milliseconds
+        """
+        window = self.samples[: min(self.count, self.window)]
+        if not len(window):
+            return {"count": 0}
+        stats = {"count": self.count, "mean": float(window.mean())}
+        for p, value in zip(percentiles, np.percentile(window, percentiles)):
+            stats[f"p{p}"] = float(value)
+        stats["max"] = self.max
+        return stats
+
+
+class LatencyTracer:
+    """Collects the latency of each stage of the capture and display loops
+    into a :class:`LatencyHistogram`. Stages are recorded from the capture
+    loop, the barcode workers and the kivy thread, so recording is thread
+    safe.
+
+    >>> tracer = LatencyTracer()
+    >>> with tracer.stage("draw_measurements"):
+    ...     oak.draw_measurements(frame, detections)
+    >>> tracer.summary()["stages"]["draw_measurements"]["p95"]
+
+    Parameters
+    ----------
+    window : int, optional
+        Number of latest samples kept per stage, by default 1024
+    stages: dict
+        :class:`LatencyHistogram` of each stage, keyed by the stage name
+    started: float
+        Wall clock time the tracer was created at
+    frames: int
+        Number of frames counted with :func:`frame`
+    counters: dict
+        Counters added to the summary, eg. the dropped messages of
+        :class:`src.core.stream_sync.StreamSync`
+    """
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.stages = {}
+        self.started = time.time()
+        self.frames = 0
+        self.counters = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def frame(self):
+        """Counts a frame processed by the capture loop"""
+        # Shared by the lanes of a station
+        with self._lock:
+            self.frames += 1
+
+    def record(self, name, seconds):
+        """Records the latency of stage ``name``
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage, eg. ``queue_wait``
+        seconds : float
+            Elapsed time of the stage
+        """
+        with self._lock:
+            histogram = self.stages.get(name)
+            if histogram is None:
+                histogram = self.stages[name] = LatencyHistogram(self.window)
+            histogram.add(seconds * 1000)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Records the elapsed time of the ``with`` block as stage ``name``"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name, func):
+        """Returns ``func`` recording the elapsed time of each call as stage
+        ``name``, eg. for the functions called from worker threads"""
+
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    def summary(self, fps=None):
+        """Returns the statistics of every stage
+
+        Parameters
+        ----------
+        fps : callable, optional
+            Called with ``(frames, start_time, current_time)``, eg.
+            :func:`src.core.oak_pipeline.OakPipeline.calc_fps`, by default
+            the frames are divided by the elapsed time
+
+        Returns
+        -------
+        dict
+            ``frames``, ``fps``, the statistics of each stage, see
+            :func:`LatencyHistogram.summary`, and the ``counters``
+        """
+        now = time.perf_counter()
+        fps = fps or (lambda counter, start, current: counter / (current - start))
+        with self._lock:
+            stages = {name: h.summary() for name, h in sorted(self.stages.items())}
+        return {
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "frames": self.frames,
+            "fps": fps(self.frames, self._start, now) if now > self._start else 0.0,
+            "stages": stages,
+            "counters": self.counters,
+        }
+
+    def write(self, out_dir, fname="latency.json", fps=None):
+        """Writes :func:`summary` to the run directory of the tracer under
+        ``out_dir``, laid out like the Hydra run directories ie.
+        ``out_dir/<date>/<time>/latency.json``
+
+        Returns
+        -------
+        str
+            Path of the written summary
+        """
+        started = time.localtime(self.started)
+        run_dir = os.path.join(
+            out_dir,
+            time.strftime("%Y-%m-%d", started),
+            time.strftime("%H-%M-%S", started),
+        )
+        os.makedirs(run_dir, exist_ok=True)
+        fpath = os.path.join(run_dir, fname)
+        with open(fpath, "w") as f:
+            json.dump(self.summary(fps=fps), f, indent=2)
+        return fpath
+
+    def report(self):
+        """Returns a table of the stage percentiles, to be printed"""
+        summary = self.summary()
+        lines = [
+            f"{summary['frames']} frames, {summary['fps']:.1f} fps",
+            f"{'stage':<20}{'count':>8}"
+            + "".join(f"{'p%d' % p:>10}" for p in PERCENTILES)
+            + f"{'max':>10}",
+        ]
+        for name, stats in summary["stages"].items():
+            if not stats["count"]:
+                continue
+            lines.append(
+                f"{name:<20}{stats['count']:>8}"
+                + "".join(f"{stats['p%d' % p]:>10.2f}" for p in PERCENTILES)
+                + f"{stats['max']:>10.2f}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+
+
+class ChangeDetector:
+    """Tells whether a frame differs from the last frame processed, so the
+    results of a static scene can be reused instead of being computed again.
+
+    Frames are compared on a ``size`` x ``size`` gray scale thumbnail. The
+    scene has changed when more than ``ratio`` of the thumbnail pixels
+    differ by more than ``threshold`` from the reference, the thumbnail of
+    the last changed frame. Comparing with the reference rather than the
+    previous frame catches slow movements as well. Every ``refresh`` frames
+    a frame is reported as changed regardless, so reused results are never
+    older than that. The ``settle`` unchanged frames following a change are
+    flagged as :attr:`settling`, so their measurements can still be taken
+    while the scene settles.
+
+    >>> detector = ChangeDetector()
+    >>> if detector.changed(frame):
+    ...     result = process(frame)
+
+    Parameters
+    ----------
+    size : int, optional
+        Width and height of the thumbnail, by default 32
+    threshold : int, optional
+        Difference of gray level above which a thumbnail pixel has changed,
+        by default 12
+    ratio : float, optional
+        Fraction of changed thumbnail pixels above which the scene has
+        changed, by default 0.01
+    refresh : int, optional
+        Maximum number of frames reported as unchanged in a row, by default
+        30. Every frame is reported as changed if 0.
+    settle : int, optional
+        Unchanged frames flagged as settling after each change, by default 0
+    reference: np array
+        Thumbnail of the last changed frame, ``None`` until the first frame
+    static: int
+        Number of frames reported as unchanged since the last change
+    settling: bool
+        ``True`` if the last frame was reported as unchanged but is one of
+        the ``settle`` frames following a change
+    """
+
+    def __init__(self, size=32, threshold=12, ratio=0.01, refresh=30, settle=0):
+        self.size = size
+        self.threshold = threshold
+        self.ratio = ratio
+        self.refresh = refresh
+        self.settle = settle
+        self.reference = None
+        self.static = 0
+        self.settling = False
+        self._settle_left = 0
+        self._thumb = None
+        self._diff = None
+
+    def changed(self, frame):
+        """Returns ``True`` if ``frame`` differs from the reference, which it
+        then replaces
+
+        Parameters
+        ----------
+        frame : np array
+            BGR frame
+
+        Returns
+        -------
+        bool
+            ``True`` if the frame has to be processed
+        """
+        # Bilinear reads a few pixels per thumbnail pixel, its cost does not
+        # depend on the resolution of the frame unlike INTER_AREA
+        small = cv2.resize(
+            frame, (self.size, self.size), interpolation=cv2.INTER_LINEAR
+        )
+        if self.reference is None or self.reference.shape != small.shape[:2]:
+            self.reference = np.empty(small.shape[:2], dtype=np.uint8)
+            self._thumb = np.empty_like(self.reference)
+            self._diff = np.empty_like(self.reference)
+            cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self.reference)
+            self.static = 0
+            self.settling = False
+            self._settle_left = self.settle
+            return True
+        cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._thumb)
+        cv2.absdiff(self._thumb, self.reference, dst=self._diff)
+        changed = (
+            cv2.countNonZero(
+                cv2.threshold(
+                    self._diff, self.threshold, 255, cv2.THRESH_BINARY, dst=self._diff
+                )[1]
+            )
+            > self.ratio * self._diff.size
+        )
+        if changed or self.static >= self.refresh:
+            self.reference, self._thumb = self._thumb, self.reference
+            self.static = 0
+            self.settling = False
+            if changed:
+                self._settle_left = self.settle
+            return True
+        self.static += 1
+        self.settling = self._settle_left > 0
+        if self.settling:
+            self._settle_left -= 1
+        return False
+
+    def reset(self):
+        """Drops the reference, the next frame is reported as changed"""
+        self.reference = None
+        self.static = 0
+        self.settling = False
+        self._settle_left = 0
@@ -1,10 +1,17 @@
 import os
+import sys
+import logging
+import importlib
+import threading
+import collections
 import hydra
 import cv2
 import numpy as np
 from pathlib import Path
 from hydra import utils as hy
 
+logger = logging.getLogger(__name__)
+
 
 class FeatureExtraction:
     """This class object performs feature matching using ORB feature detection
@@ -21,28 +28,62 @@ class FeatureExtraction:
     ----------
     path :
         File path to the list of images used in feature extraction
+    cache : bool, optional
+        If ``True``, descriptors are persisted in ``cache_fpath`` and only
+        the new or changed images are processed on the next start,
+        by default False
     images: img
         Images from the provided file path are extracted here for
-        feature extraction and feature point matching.
+        feature extraction and feature point matching. Images served from
+        the descriptor cache are not read.
     class_names: list
         Carries the list of all the unique class names to describe
         and identify an image from any given file path.
     des_list: list
         Stores the extracted feature point descriptors
+    kp_list: list
+        Stores the geometry of the extracted key points as arrays of
+        ``(x, y, size, angle, response, octave)`` rows
     product_list: list
         Points to the list of images in the given file path
+    matcher : str, optional
+        ``bf`` or ``flann``, see :class:`DescriptorIndex`, by default "bf"
+    ratio : float, optional
+        Ratio test threshold used in matching, by default 0.7
+    cache_fpath: str
+        Descriptor cache file, stored next to the image directory
+    index: :class:`DescriptorIndex`
+        Single index over the descriptors of all the products, built by
+        :func:`update_prod_list`
     orb: :orb_class:`ORB <>`
-        Class implementing the :orb:`ORB <>` (oriented BRIEF) keypoint detector and descriptor extractor
+        Class implementing the :orb:`ORB <>` (oriented BRIEF) keypoint detector and descriptor extractor.
+        Created per thread, so that the catalogue can be shared by the
+        pipelines of several devices.
 
     """
 
-    def __init__(self, path):
+    def __init__(self, path, cache=False, matcher="bf", ratio=0.7):
         self.file_path = path
         self.images = []
         self.class_names = []
         self.des_list = []
+        self.kp_list = []
         self.product_list = os.listdir(path)
-        self.orb = cv2.ORB_create(nfeatures=1000)
+        self.nfeatures = 1000
+        self._local = threading.local()
+        self.cache_fpath = (
+            os.path.normpath(path) + ".orb.npz" if cache else None
+        )
+        self.matcher = matcher
+        self.ratio = ratio
+        self.index = None
+
+    @property
+    def orb(self):
+        orb = getattr(self._local, "orb", None)
+        if orb is None:
+            orb = self._local.orb = cv2.ORB_create(nfeatures=self.nfeatures)
+        return orb
 
     def __resize_image(self, scale, img):
         """
@@ -83,23 +124,95 @@ class FeatureExtraction:
         for img in images:
             keys, des = self.orb.detectAndCompute(img, None)
             self.des_list.append(des)
+            self.kp_list.append(keypoints_to_array(keys))
 
-    def multiple_product_id(self, img, display=False, thres=15, scale=100):
-        """Computes key point descriptor for a given image and uses
-        :bf_matcher:`Brute-Force MAtcher <>` to match features from one
-        image with a list of images.
+    def load_descriptor_cache(self):
+        """Loads the descriptors persisted by :func:`save_descriptor_cache`.
 
-        .. note::
-            Brute-Force matcher is simple. It takes the descriptor of one feature
-            in first set and is matched with all other features in second set using
-            some distance calculation. And the closest one is returned.
+        Returns
+        -------
+        dict
+            ``{file name: ((size, mtime), descriptors, key points)}``. Empty if
+            the cache is missing, unreadable or written with other ORB settings.
+        """
+        if not self.cache_fpath or not os.path.exists(self.cache_fpath):
+            return {}
+        try:
+            with np.load(self.cache_fpath, allow_pickle=False) as data:
+                if int(data["nfeatures"]) != self.nfeatures:
+                    return {}
+                bounds = np.concatenate(([0], np.cumsum(data["counts"])))
+                descriptors = data["descriptors"]
+                keypoints = data["keypoints"]
+                return {
+                    str(name): (
+                        (int(size), int(mtime)),
+                        descriptors[start:end] if end > start else None,
+                        keypoints[start:end],
+                    )
+                    for name, size, mtime, start, end in zip(
+                        data["names"],
+                        data["sizes"],
+                        data["mtimes"],
+                        bounds[:-1],
+                        bounds[1:],
+                    )
+                }
+        except (OSError, KeyError, ValueError):
+            # Corrupted cache, rebuilt by update_prod_list
+            return {}
+
+    def save_descriptor_cache(self, file_keys):
+        """Persists the descriptors and key points of all the products in
+        ``cache_fpath``. The file is replaced atomically, or removed when the
+        catalogue is empty. The catalogue is used without the cache when it
+        cannot be written, eg. from a read-only installation.
+
+        Parameters
+        ----------
+        file_keys : list, [(int,int)]
+            ``(size, mtime)`` of each file in ``product_list``
+        """
+        try:
+            self._write_descriptor_cache(file_keys)
+        except OSError as e:
+            logger.warning("Descriptor cache %s not written: %s", self.cache_fpath, e)
+
+    def _write_descriptor_cache(self, file_keys):
+        """Writes the cache of :func:`save_descriptor_cache`"""
+        if not self.product_list:
+            # Nothing to store, the entries of a stale cache never match
+            if os.path.exists(self.cache_fpath):
+                os.remove(self.cache_fpath)
+            return
+        descriptors = [
+            des if des is not None else np.zeros((0, 32), dtype=np.uint8)
+            for des in self.des_list
+        ]
+        tmp_fpath = self.cache_fpath + ".tmp"
+        with open(tmp_fpath, "wb") as f:
+            np.savez(
+                f,
+                nfeatures=self.nfeatures,
+                names=np.array(self.product_list),
+                sizes=np.array([k[0] for k in file_keys], dtype=np.int64),
+                mtimes=np.array([k[1] for k in file_keys], dtype=np.int64),
+                counts=np.array([len(d) for d in descriptors], dtype=np.int64),
+                descriptors=np.concatenate(descriptors),
+                keypoints=np.concatenate(self.kp_list).astype(np.float32),
+            )
+        os.replace(tmp_fpath, self.cache_fpath)
 
-        The matcher returns only those matches with value (i,j), such that i-th descriptor
-        in set A has j-th descriptor in set B as the best match and vice versa.
-        That is, the two features in both sets should match each other.
+    def multiple_product_id(self, img, display=False, thres=15, scale=100):
+        """Computes key point descriptor for a given image and matches it
+        against the descriptors of all the products at once using
+        :class:`DescriptorIndex`.
 
-        ``BFMatcher.knnMatch()`` is used to find k best matches where k can be specified.
-        The current value of k is 2.0.
+        .. note::
+            Every descriptor of the input image votes for the product of its
+            nearest catalogue descriptor using Hamming distance, provided it
+            passes the ratio test against the nearest descriptor of another
+            product, see :class:`DescriptorIndex`.
 
         Parameters
         ----------
@@ -116,35 +229,31 @@ class FeatureExtraction:
         Returns
         -------
         list
-            Returns a filtered list of best image matches.
+            Returns a filtered list of best image matches, best match first.
+        """
+        ranked, _ = self.rank_products(img, display, thres, scale)
+        return ranked.tolist()
+
+    def rank_products(self, img, display=False, thres=15, scale=100):
+        """Same as :func:`multiple_product_id`, but also returns the number of
+        matched descriptors of each ranked product.
+
+        Returns
+        -------
+        np array
+            Indices of the products with more than ``thres`` matches, best
+            match first
+        np array
+            Number of matches of each returned product
         """
         keys, des_cur = self.orb.detectAndCompute(img, None)
         if display:
             img_des = cv2.drawKeypoints(img, keys, None)
             img_des_resized = self.__resize_image(scale, img_des)
             cv2.imshow("Detected Features", img_des_resized)
-
-        bf = cv2.BFMatcher()
-        final_val_list = []
-        match_list = []
-        try:
-            for des in self.des_list:
-                matches = bf.knnMatch(des, des_cur, k=2)
-                best = []
-                for m, n in matches:
-                    if m.distance < 0.70 * n.distance:
-                        best.append([m])
-                match_list.append(len(best))
-        except:
-            # Need to be logged
-            pass
-
-        if len(match_list) != 0:
-            for i in match_list:
-                if i > thres:
-                    final_val_list.append(match_list.index(i))
-
-        return final_val_list
+        if self.index is None:
+            self.index = DescriptorIndex(self.des_list, self.matcher, self.ratio)
+        return self.index.query(des_cur, thres)
 
     def show_features(self, img1, img2, scale=100):
         """Computes key point descriptor for a given image and uses
@@ -182,13 +291,160 @@ class FeatureExtraction:
         the class objects. Invokes the :func:`find_descriptors` after
         updating the class objects.
 
+        .. note::
+            When ``cache_fpath`` is set, images whose file name, size and
+            modification time match the descriptor cache are not read, and
+            :func:`find_descriptors` runs only on new or changed images.
+
         """
         path = self.file_path
+        cached = self.load_descriptor_cache()
+        file_keys = []
+        changed = set(cached) != set(self.product_list)
         for prod in self.product_list:
+            stat = os.stat(f"{path}/{prod}")
+            file_key = (stat.st_size, stat.st_mtime_ns)
+            file_keys.append(file_key)
+            self.class_names.append(os.path.splitext(prod)[0])
+            if prod in cached and cached[prod][0] == file_key:
+                _, des, keypoints = cached[prod]
+                self.des_list.append(des)
+                self.kp_list.append(keypoints)
+                continue
             img = cv2.imread(f"{path}/{prod}", 0)
             self.images.append(img)
-            self.class_names.append(os.path.splitext(prod)[0])
-        self.find_descriptors(self.images)
+            self.find_descriptors([img])
+            changed = True
+        if self.cache_fpath and changed:
+            self.save_descriptor_cache(file_keys)
+        self.index = DescriptorIndex(self.des_list, self.matcher, self.ratio)
+
+
+class DescriptorIndex:
+    """Single search index over the ORB descriptors of all the products.
+
+    Descriptors are stacked into one array with a parallel array of product
+    labels, so a frame is matched against the whole catalogue with a single
+    ``k=neighbours`` nearest neighbour query using Hamming distance.
+
+    The ratio test compares the nearest descriptor with the nearest one of
+    another product, not with the second nearest of the whole index. The
+    repeated patterns of a product, eg. a printed logo, give it several
+    descriptors at about the same distance, which would otherwise fail the
+    test. When all the ``neighbours`` are of the same product, the farthest
+    of them stands in for the other product, which can only reject a match
+    that would pass with the exact distance.
+
+    .. note::
+        ``bf`` computes exact distances with ``cv2.batchDistance``. ``flann``
+        uses an approximate LSH index, which is faster for catalogues with
+        thousands of products.
+
+    Parameters
+    ----------
+    des_list : list
+        Descriptors of each product, ``None`` for products without features
+    method : str, optional
+        ``bf`` or ``flann``, by default "bf"
+    ratio : float, optional
+        Ratio test threshold, by default 0.7
+    neighbours : int, optional
+        Nearest descriptors searched for one of another product, by
+        default 8
+    descriptors: np array
+        Stacked descriptors of all the products
+    labels: np array
+        Product index of each row of ``descriptors``
+    """
+
+    def __init__(self, des_list, method="bf", ratio=0.7, neighbours=8):
+        self.method = method
+        self.ratio = ratio
+        self.neighbours = neighbours
+        self.n_products = len(des_list)
+        des_list = [
+            (i, des) for i, des in enumerate(des_list) if des is not None and len(des)
+        ]
+        if des_list:
+            self.descriptors = np.concatenate([des for _, des in des_list])
+            self.labels = np.concatenate(
+                [np.full(len(des), i, dtype=np.int32) for i, des in des_list]
+            )
+        else:
+            self.descriptors = np.zeros((0, 32), dtype=np.uint8)
+            self.labels = np.zeros(0, dtype=np.int32)
+        self.flann = None
+        if method == "flann" and len(self.descriptors) >= 2:
+            self.flann = cv2.flann_Index(
+                self.descriptors,
+                dict(algorithm=6, table_number=6, key_size=12, multi_probe_level=1),
+            )
+
+    def knn(self, des, k=2):
+        """Returns the distances and indices of the ``k`` nearest catalogue
+        descriptors of each row of ``des``, nearest first"""
+        k = min(k, len(self.descriptors))
+        if self.flann is not None:
+            nidx, dist = self.flann.knnSearch(des, k, params=dict(checks=50))
+        else:
+            dist, nidx = cv2.batchDistance(
+                des, self.descriptors, -1, normType=cv2.NORM_HAMMING, K=k
+            )
+        return dist, nidx
+
+    def query(self, des, thres=0):
+        """Matches the descriptors of a frame against the catalogue.
+
+        Parameters
+        ----------
+        des : np array
+            ORB descriptors of the current frame
+        thres : int, optional
+            Minimum number of matches of a returned product, by default 0
+
+        Returns
+        -------
+        np array
+            Indices of the products with more than ``thres`` matches, best
+            match first
+        np array
+            Number of matches of each returned product
+        """
+        if des is None or len(des) == 0 or len(self.descriptors) < 2:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        dist, nidx = self.knn(des, self.neighbours)
+        valid = nidx >= 0
+        labels = np.where(valid, self.labels[np.maximum(nidx, 0)], -1)
+        other = valid & (labels != labels[:, :1])
+        # Nearest neighbour of another product, else the farthest valid one
+        col = np.where(
+            other.any(axis=1), other.argmax(axis=1), valid.sum(axis=1) - 1
+        )
+        second = dist[np.arange(len(dist)), np.maximum(col, 0)]
+        good = valid[:, 0] & (col > 0) & (dist[:, 0] < self.ratio * second)
+        votes = np.bincount(self.labels[nidx[good, 0]], minlength=self.n_products)
+        ranked = np.argsort(-votes, kind="stable")
+        ranked = ranked[votes[ranked] > thres]
+        return ranked, votes[ranked]
+
+
+def keypoints_to_array(keypoints):
+    """Converts ``cv2.KeyPoint`` objects to an array of their geometry.
+
+    Parameters
+    ----------
+    keypoints : list
+        Key points detected by :orb_class:`ORB <>`
+
+    Returns
+    -------
+    np array
+        ``(n, 6)`` array of ``(x, y, size, angle, response, octave)`` rows
+    """
+    return np.array(
+        [(*k.pt, k.size, k.angle, k.response, k.octave) for k in keypoints],
+        dtype=np.float32,
+    ).reshape(-1, 6)
 
 
 def find_distance(p1, p2):
@@ -227,6 +483,167 @@ def find_distance_abs(p1, p2):
     return abs(p1 - p2)
 
 
+# Boxes of the contours kept by measure_boxes, one row per contour
+BoxMeasurements = collections.namedtuple(
+    "BoxMeasurements", ["index", "rects", "boxes", "corners", "length", "width"]
+)
+
+
+def contour_areas(contours):
+    """Computes the area of all the contours at once with the shoelace
+    formula, same as :contour_area:`cv2.contourArea <>` applied to each of
+    them.
+
+    Parameters
+    ----------
+    contours : list
+        Contours returned by :find_contours:`cv2.findContours <>`
+
+    Returns
+    -------
+    np array
+        Area of each contour
+    """
+    if not len(contours):
+        return np.zeros(0)
+    lengths = np.fromiter((len(cnt) for cnt in contours), np.int64, len(contours))
+    points = np.concatenate(contours).reshape(-1, 2).astype(np.float64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    # Index of the next point of each point, wrapping around each contour
+    following = np.arange(1, len(points) + 1)
+    following[starts + lengths - 1] = starts
+    x, y = points[:, 0], points[:, 1]
+    cross = x * y[following] - x[following] * y
+    return np.abs(np.add.reduceat(cross, starts)) / 2
+
+
+def measure_boxes(contours, scale_factor, area_min=0):
+    """Measures the rotated bounding box of every contour larger than
+    ``area_min``, without drawing anything.
+
+    The contours are filtered by :func:`contour_areas` in one pass.
+    :min_area_rect:`cv2.minAreaRect <>` is the only call made per kept
+    contour, the box corners, their order (see :func:`re_order`) and the
+    length and width are computed for all the boxes at once.
+
+    Parameters
+    ----------
+    contours : list
+        Contours returned by :find_contours:`cv2.findContours <>`
+    scale_factor : list
+        Scale factors of the x and y axis, the measured distances are divided
+        by them
+    area_min : int, optional
+        Area threshold to filter the contours, by default 0
+
+    Returns
+    -------
+    :class:`BoxMeasurements`
+        ``index`` of the kept contours in ``contours``, their upright
+        bounding ``rects`` (x, y, w, h), rotated ``boxes`` and their
+        ``corners`` ordered as [top left, top right, bottom left, bottom
+        right], all ``np.int32``, and their ``length`` and ``width`` in cm
+    """
+    areas = contour_areas(contours)
+    index = np.flatnonzero(areas > area_min)
+    n = len(index)
+    rects = np.zeros((n, 4), dtype=np.int32)
+    params = np.zeros((n, 5), dtype=np.float32)
+    for row, i in enumerate(index):
+        (cx, cy), (w, h), angle = cv2.minAreaRect(contours[i])
+        params[row] = cx, cy, w, h, angle
+        rects[row] = cv2.boundingRect(contours[i])
+
+    # Corners of the rotated rectangles, computed in single precision as
+    # cv2.boxPoints does
+    cx, cy, w, h, _ = params.T
+    rad = np.deg2rad(params[:, 4].astype(np.float64))
+    a = np.sin(rad).astype(np.float32) * np.float32(0.5)
+    b = np.cos(rad).astype(np.float32) * np.float32(0.5)
+    center = params[:, :2]
+    boxes = np.empty((n, 4, 2), dtype=np.float32)
+    boxes[:, 0, 0] = cx - a * h - b * w
+    boxes[:, 0, 1] = cy + b * h - a * w
+    boxes[:, 1, 0] = cx + a * h - b * w
+    boxes[:, 1, 1] = cy - b * h - a * w
+    boxes[:, 2] = 2 * center - boxes[:, 0]
+    boxes[:, 3] = 2 * center - boxes[:, 1]
+    boxes = boxes.astype(np.int32)
+
+    # re_order of all the boxes at once
+    rows = np.arange(n)[:, None]
+    add = boxes.sum(2)
+    diff = boxes[:, :, 1] - boxes[:, :, 0]
+    order = np.stack(
+        [add.argmin(1), diff.argmin(1), diff.argmax(1), add.argmax(1)], axis=1
+    )
+    corners = boxes[rows, order]
+
+    # find_distance of the top left corner to the top right and bottom left
+    # corners, in cm
+    scale = np.asarray(scale_factor, dtype=np.float64)
+    top_left = corners[:, 0]
+    length = np.hypot(*(corners[:, 1] // scale[0] - top_left // scale[0]).T) / 10
+    width = np.hypot(*(corners[:, 2] // scale[1] - top_left // scale[1]).T) / 10
+    return BoxMeasurements(
+        index, rects, boxes, corners, np.round(length, 1), np.round(width, 1)
+    )
+
+
+def draw_boxes(img, measurements, color=(114, 143, 155), regular_box=False):
+    """Draws the boxes measured by :func:`measure_boxes`, with arrows along
+    their length and width and the measured values.
+
+    Parameters
+    ----------
+    img : img
+        Image on which the boxes and measurements are drawn
+    measurements : :class:`BoxMeasurements`
+        Boxes returned by :func:`measure_boxes`
+    color : tuple, optional
+        Choice of color for bounding box, by default (114, 143, 155)
+    regular_box : bool, optional
+        When enabled the upright bounding box is drawn as well,
+        by default False
+
+    Returns
+    -------
+    img
+        ``img`` with the boxes drawn
+    """
+    color_text = (255, 255, 255)
+    for (x, y, w, h), box, corners, obj_l, obj_w in zip(
+        measurements.rects.tolist(),
+        measurements.boxes,
+        measurements.corners.tolist(),
+        measurements.length.tolist(),
+        measurements.width.tolist(),
+    ):
+        if regular_box:
+            cv2.rectangle(img, (x, y), (x + w, y + h), color, 2)
+        cv2.drawContours(img, [box], 0, color, 2)
+        top_left, top_right, bottom_left, _ = (tuple(p) for p in corners)
+        cv2.arrowedLine(img, top_left, top_right, color, 3, 8, 0, 0.05)
+        cv2.arrowedLine(img, top_left, bottom_left, color, 3, 8, 0, 0.05)
+        cv2.putText(
+            img,
+            f"L: {obj_l} cm",
+            (x + 10, y + 50),
+            cv2.FONT_HERSHEY_TRIPLEX,
+            0.5,
+            color_text,
+        )
+        cv2.putText(
+            img,
+            f"W: {obj_w} cm",
+            (x + 10, y + 65),
+            cv2.FONT_HERSHEY_TRIPLEX,
+            0.5,
+            color_text,
+        )
+    return img
+
+
 def get_bounding_rect(
     img_wrap_shadow,
     img,
@@ -236,20 +653,17 @@ def get_bounding_rect(
     draw=False,
     regular_box=False,
     color=(114, 143, 155),
+    render=True,
+    contours=None,
 ):
     """This function finds the contours in a the given wrapped image using
-    :find_contours:`cv2.findContours <>` function. Finds the area of all the derived
-    contours and filters the contours with a certain ``area_min``.
+    :find_contours:`cv2.findContours <>` function and measures the ones
+    larger than ``area_min`` with :func:`measure_boxes`.
 
     .. note::
         If ``regular_box`` is enabled, it draws a regular rectangular bounding box
-        else, it draws a rotated bounding box aligned with the orientation of the
-        contour points
-
-    Finds the disatance between the corner points using :func:`src.utils.utils.find_distance`
-    and writes the measured ``length`` and ``width`` value on the input image.
-
-    Draws an arrowed line to indicate the corners.
+        next to the rotated bounding box aligned with the orientation of the
+        contour points, see :func:`draw_boxes`.
 
     Parameters
     ----------
@@ -271,104 +685,155 @@ def get_bounding_rect(
         rotated bounding box, by default False
     color : tuple, optional
         Choice of color for bounding box, by default (114, 143, 155)
+    render : bool, optional
+        If ``False``, only the measurements are computed and nothing is drawn
+        on the images, by default True
+    contours : list, optional
+        Contours already found in ``img``, by default None ie. they are found
+        here
 
     Returns
     -------
     img
         Processed output img where the bounding box and measured values are drawn
     float
-        Measured length value
+        Measured length value of the last measured contour
     float
-        Measured width value
+        Measured width value of the last measured contour
     """
-    obj_l, obj_w = 0, 0
-    color_text = (255, 255, 255)
-    contours, hierarchy = cv2.findContours(
-        img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE
+    if contours is None:
+        contours, hierarchy = cv2.findContours(
+            img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE
+        )
+    measurements = measure_boxes(contours, scale_factor, area_min)
+    if render:
+        if draw:
+            for i in measurements.index:
+                cv2.drawContours(img_contour, contours[i], -1, color, 7)
+        draw_boxes(img_wrap_shadow, measurements, color, regular_box)
+    if not len(measurements.index):
+        return img_wrap_shadow, 0, 0
+    return (
+        img_wrap_shadow,
+        float(measurements.length[-1]),
+        float(measurements.width[-1]),
     )
-    for cnt in contours:
-        area = cv2.contourArea(cnt)
-
-        if area > area_min:
-            if draw:
-                cv2.drawContours(img_contour, cnt, -1, color, 7)
-
-            peri = cv2.arcLength(cnt, True)
-            approx = cv2.approxPolyDP(cnt, 0.02 * peri, True)
-            x, y, w, h = cv2.boundingRect(approx)
-
-            # Regular Bounding Box
-            if regular_box:
-                cv2.rectangle(img_wrap_shadow, (x, y),
-                              (x + w, y + h), color, 2)
-
-            # Rotated Bounding Rectangle
-            rect = cv2.minAreaRect(cnt)
-            box = cv2.boxPoints(rect)
-            box = np.int0(box)
-            cv2.drawContours(img_wrap_shadow, [box], 0, color, 2)
-
-            ordered_points = re_order(box)
-
-            obj_l = round(
-                (
-                    find_distance(
-                        ordered_points[0] // scale_factor[0],
-                        ordered_points[1] // scale_factor[0],
-                    )
-                    / 10
-                ),
-                1,
-            )
-            obj_w = round(
-                (
-                    find_distance(
-                        ordered_points[0] // scale_factor[1],
-                        ordered_points[2] // scale_factor[1],
-                    )
-                    / 10
-                ),
-                1,
-            )
 
-            cv2.arrowedLine(
-                img_wrap_shadow,
-                (ordered_points[0][0], ordered_points[0][1]),
-                (ordered_points[1][0], ordered_points[1][1]),
-                color,
-                3,
-                8,
-                0,
-                0.05,
-            )
-            cv2.arrowedLine(
-                img_wrap_shadow,
-                (ordered_points[0][0], ordered_points[0][1]),
-                (ordered_points[2][0], ordered_points[2][1]),
-                color,
-                3,
-                8,
-                0,
-                0.05,
-            )
 
-            cv2.putText(
-                img_wrap_shadow,
-                f"L: {obj_l} cm",
-                (x + 10, y + 50),
-                cv2.FONT_HERSHEY_TRIPLEX,
-                0.5,
-                color_text,
-            )
-            cv2.putText(
-                img_wrap_shadow,
-                f"W: {obj_w} cm",
-                (x + 10, y + 65),
-                cv2.FONT_HERSHEY_TRIPLEX,
-                0.5,
-                color_text,
-            )
-    return img_wrap_shadow, obj_l, obj_w
+def preview_fov(sensor_size, preview_size):
+    """Returns the region of the field of view of the colour sensor covered
+    by its preview. The preview is the largest centred crop of the sensor
+    with the aspect ratio of ``preview_size``, ``ColorCamera`` keeping the
+    aspect ratio by default.
+
+    Parameters
+    ----------
+    sensor_size : tuple
+        ``(width, height)`` of the sensor, eg. ``(1920, 1080)`` for
+        ``THE_1080_P``
+    preview_size : tuple
+        ``(width, height)`` of the preview
+
+    Returns
+    -------
+    tuple
+        ``x, y, w, h`` of the region, normalised to the ``0..1`` range
+    """
+    sensor_aspect = sensor_size[0] / sensor_size[1]
+    preview_aspect = preview_size[0] / preview_size[1]
+    if preview_aspect <= sensor_aspect:
+        w = preview_aspect / sensor_aspect
+        return ((1 - w) / 2, 0.0, w, 1.0)
+    h = sensor_aspect / preview_aspect
+    return (0.0, (1 - h) / 2, 1.0, h)
+
+
+def crop_fov(img, fov):
+    """Returns the view of ``img`` on the normalised region ``fov``, eg. the
+    part of a depth frame aligned with the full colour sensor which the
+    preview covers, see :func:`preview_fov`"""
+    height, width = img.shape[:2]
+    x, y, w, h = fov
+    x1, y1 = int(round(x * width)), int(round(y * height))
+    x2, y2 = int(round((x + w) * width)), int(round((y + h) * height))
+    return img[y1:y2, x1:x2]
+
+
+def measure_heights(
+    depth, contours, frame_shape, base_depth, mat_box=None, percentile=10
+):
+    """Measures the height of every object in view from a single depth frame.
+
+    Each contour is filled into a label image at the depth resolution. The
+    top surface of an object is a low ``percentile`` of the valid depth
+    values under its mask, which is robust to noise and edge pixels, and
+    its height is the distance from the mat plane to that surface. The
+    percentiles of all the objects are computed at once in NumPy.
+
+    .. note::
+        The mat plane is the median depth of the pixels inside ``mat_box``
+        not covered by any object. Without a ``mat_box`` the calibrated
+        ``base_depth`` is used.
+
+    Parameters
+    ----------
+    depth : np array
+        ``uint16`` depth frame in mm, covering the field of view of the
+        colour frame, see :func:`crop_fov`
+    contours : list
+        Object contours in colour frame co-ordinates
+    frame_shape : tuple
+        Shape of the colour frame the contours were found in
+    base_depth : float
+        Distance between the camera module and the mat, in cm
+    mat_box : list, [int,int,int,int], optional
+        ``x1, y1, x2, y2`` of the mat in colour frame co-ordinates,
+        by default None
+    percentile : int, optional
+        Percentile of the depth values taken as the top surface,
+        by default 10
+
+    Returns
+    -------
+    np array
+        Height of each contour in cm, ``nan`` when no valid depth is found
+    float
+        Distance to the mat plane in cm
+    """
+    depth_h, depth_w = depth.shape[:2]
+    scale = np.array(
+        [depth_w / frame_shape[1], depth_h / frame_shape[0]], dtype=np.float32
+    )
+    labels = np.zeros((depth_h, depth_w), dtype=np.int32)
+    for i, cnt in enumerate(contours):
+        cv2.drawContours(
+            labels, [(cnt * scale).astype(np.int32)], -1, i + 1, cv2.FILLED
+        )
+    valid = depth > 0
+
+    mat_depth = base_depth * 10
+    if mat_box is not None:
+        x1, y1, x2, y2 = (
+            np.array(mat_box, dtype=np.float32) * np.tile(scale, 2)
+        ).astype(int)
+        mat = valid[y1:y2, x1:x2] & (labels[y1:y2, x1:x2] == 0)
+        if mat.any():
+            mat_depth = float(np.median(depth[y1:y2, x1:x2][mat]))
+
+    heights = np.full(len(contours), np.nan)
+    inside = valid & (labels > 0)
+    if not inside.any():
+        return heights, mat_depth / 10
+    obj_labels = labels[inside] - 1
+    obj_depth = depth[inside]
+    order = np.lexsort((obj_depth, obj_labels))
+    obj_depth = obj_depth[order]
+    counts = np.bincount(obj_labels, minlength=len(contours))
+    starts = np.cumsum(counts) - counts
+    found = counts > 0
+    top = obj_depth[starts[found] + (counts[found] - 1) * percentile // 100]
+    heights[found] = (mat_depth - top.astype(np.float64)) / 10
+    return heights, mat_depth / 10
 
 
 def get_contours(
@@ -510,6 +975,53 @@ def resize_image(scale, img):
 #     pass
 
 
+class LazyModule:
+    """Module proxy returned by :func:`lazy_import`, which imports the module
+    when one of its attributes is first read.
+
+    Parameters
+    ----------
+    name : str
+        Absolute name of the module, eg. ``pyzbar.pyzbar``
+    """
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def __getattr__(self, attr):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = self.__dict__["_module"] = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    """Defers the import of a heavy module, eg. ``depthai`` or ``pyzbar``,
+    until it is first used, to keep the start up of the app short.
+
+    >>> dai = lazy_import("depthai")
+    >>> pipeline = dai.Pipeline()  # depthai is imported here
+
+    Parameters
+    ----------
+    name : str
+        Absolute name of the module
+
+    Returns
+    -------
+    module or :class:`LazyModule`
+        The module itself when it is already imported
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
 def relative_to_abs_path(relative_path):
     """Returns the absolute path for the provided relative path.
 
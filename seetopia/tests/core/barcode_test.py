@@ -0,0 +1,63 @@
+import time
+import threading
+from src.core import barcode
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+class SlowDecoder:
+    def __init__(self):
+        self.release = {}
+        self.decoded = []
+
+    def decode(self, frame, **kwargs):
+        self.release.setdefault(frame, threading.Event()).wait(5)
+        self.decoded.append(frame)
+        return f"code-{frame}", "QRCODE"
+
+
+def test_latest_frame_wins():
+    decoder = SlowDecoder()
+    done = threading.Event()
+    worker = barcode.BarcodeWorker(
+        decoder.decode, callback=lambda r: r.seq == 4 and done.set()
+    )
+    for seq in range(1, 5):
+        worker.submit(seq, seq)
+    for seq in range(1, 5):
+        decoder.release.setdefault(seq, threading.Event()).set()
+    assert done.wait(5)
+    worker.close()
+    assert decoder.decoded == [1, 4]
+    assert worker.dropped == 2
+    assert worker.latest() == barcode.BarcodeResult(4, "code-4", "QRCODE")
+
+
+def test_older_frame_never_replaces_a_newer_result():
+    decoder = SlowDecoder()
+    published = []
+    worker = barcode.BarcodeWorker(
+        decoder.decode, workers=2, callback=lambda r: published.append(r.seq)
+    )
+    worker.submit(1, 1)
+    worker.submit(2, 2)
+    decoder.release.setdefault(2, threading.Event()).set()
+    wait_until(lambda: worker.latest().seq == 2)
+    decoder.release.setdefault(1, threading.Event()).set()
+    wait_until(lambda: decoder.decoded == [2, 1])
+    worker.close()
+    assert published == [2]
+    assert worker.latest().seq == 2
+
+
+def test_frames_submitted_after_close_are_ignored():
+    decoder = SlowDecoder()
+    worker = barcode.BarcodeWorker(decoder.decode)
+    worker.close()
+    worker.submit(1, 1)
+    assert worker.latest() == barcode.BarcodeResult(-1, None, None)
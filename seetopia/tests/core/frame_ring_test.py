@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import pytest
+import numpy as np
+from src.core import frame_ring
+from src.core import replay
+
+
+def frame(value):
+    return np.full((4, 6, 3), value, dtype=np.uint8)
+
+
+def test_frames_are_read_with_their_detections():
+    name = f"ring-test-{os.getpid()}"
+    detection = replay.ReplayDetection(1, 0.9, 0.1, 0.2, 0.3, 0.4, (1, 2, 300))
+    with frame_ring.FrameRingWriter(name, (4, 6, 3), slots=2) as writer:
+        with frame_ring.FrameRingReader(name) as reader:
+            assert reader.read() is None
+            writer.write(7, frame(7), [detection], timestamp=1.5)
+            item = reader.read(copy=True)
+            assert item["seq"] == reader.latest_seq() == 7
+            assert item["timestamp"] == 1.5
+            assert (item["frame"] == 7).all()
+            assert item["detections"][0, 8] == 300
+
+
+def test_slots_being_written_or_overwritten_are_rejected():
+    name = f"ring-test-{os.getpid()}"
+    with frame_ring.FrameRingWriter(name, (4, 6, 3), slots=2) as writer:
+        with frame_ring.FrameRingReader(name) as reader:
+            writer.write(0, frame(0))
+            item = reader.read()
+            assert reader.valid(item)
+            # The writer wraps around the ring onto the slot of the view
+            writer.write(1, frame(1))
+            writer.write(2, frame(2))
+            assert not reader.valid(item)
+            # Torn slot, the writer is halfway through it
+            meta = writer.slots[int(writer.header[9])][0]
+            meta[0] = -1
+            assert reader.read() is None
+            meta[0] = 2
+            assert (reader.read()["frame"] == 2).all()
+
+
+def test_only_blocks_of_a_gone_writer_are_reclaimed():
+    name = f"ring-test-{os.getpid()}"
+    writer = frame_ring.FrameRingWriter(name, (4, 6, 3), slots=2)
+    with pytest.raises(FileExistsError):
+        frame_ring.FrameRingWriter(name, (4, 6, 3), slots=2)
+    # Crashed without unlinking the block
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    writer.header[10] = child.pid
+    writer.header = writer.slots = None
+    writer.shm.close()
+    with frame_ring.FrameRingWriter(name, (4, 6, 3), slots=2) as reclaimed:
+        assert reclaimed.header[10] == os.getpid()
@@ -0,0 +1,80 @@
+from src.core import journal
+
+
+class FlakyWms:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.received = {}
+
+    def send(self, updates):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("WMS is down")
+        for update in updates:
+            self.received.setdefault(update["key"], update)
+        return [update["key"] for update in updates]
+
+
+def test_updates_are_sent_in_batches_with_retries(tmp_path):
+    wms = FlakyWms(failures=2)
+    with journal.UpdateJournal(
+        str(tmp_path / "journal.jsonl"), wms.send, batch_size=2, backoff=0.01
+    ) as updates:
+        keys = [updates.append("flag", transfer_id) for transfer_id in range(5)]
+        assert updates.flush(timeout=5)
+    assert sorted(wms.received) == sorted(keys)
+
+
+def test_pending_updates_survive_a_restart(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    down = FlakyWms(failures=10**6)
+    with journal.UpdateJournal(path, down.send, backoff=10) as updates:
+        key = updates.append("override", 334456, {"length": 20})
+
+    wms = FlakyWms()
+    with journal.UpdateJournal(path, wms.send) as updates:
+        assert updates.flush(timeout=5)
+    assert wms.received[key]["payload"] == {"length": 20}
+
+
+class Rejected(Exception):
+    pass
+
+
+def test_rejected_updates_are_dead_lettered(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    received = []
+
+    def send(updates):
+        if any(update["payload"].get("invalid") for update in updates):
+            raise Rejected("rejected: 422")
+        received.extend(update["key"] for update in updates)
+        return [update["key"] for update in updates]
+
+    with journal.UpdateJournal(path, send, rejected=Rejected) as updates:
+        bad = updates.append("override", 1, {"invalid": True})
+        good = updates.append("flag", 2)
+        assert updates.flush(timeout=5)
+    assert received == [good]
+    assert "422" in updates.dead[bad]["error"]
+
+    with journal.UpdateJournal(path, send, rejected=Rejected) as updates:
+        assert not updates.pending
+        assert list(updates.dead) == [bad]
+
+
+def test_unaccepted_batches_are_retried_with_backoff(tmp_path):
+    calls = []
+
+    def send(updates):
+        calls.append(len(updates))
+        return []
+
+    with journal.UpdateJournal(
+        str(tmp_path / "journal.jsonl"), send, backoff=0.05
+    ) as updates:
+        updates.append("flag", 334456)
+        assert not updates.flush(timeout=0.2)
+    # 0.05 + 0.1 s of backoff, not a busy loop
+    assert 2 <= len(calls) <= 4
+    assert updates.failures >= 2
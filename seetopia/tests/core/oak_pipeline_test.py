@@ -0,0 +1,46 @@
+import numpy as np
+from src.core import oak_pipeline as op
+from src.conf import config
+from src.utils import estimator
+from src.utils import utils
+
+
+def box_on_mat():
+    frame = np.full((300, 300, 3), (60, 140, 60), dtype=np.uint8)
+    frame[100:200, 80:220] = 230
+    return frame
+
+
+def test_estimate_locks_before_the_frames_are_gated(tmp_path):
+    oak = op.OakPipeline(catalogue=utils.FeatureExtraction(str(tmp_path)))
+    oak.render = False
+    measurement = estimator.RollingMeasurement(min_samples=5)
+    gated = []
+    try:
+        for seq in range(10):
+            _, _, _, dimension = oak.process_frame(box_on_mat(), [], seq=seq)
+            gated.append(oak.gated)
+            if not oak.gated:
+                estimate = measurement.update(dimension)
+    finally:
+        oak.close()
+    # The frames settling after the change are measured, not the next ones
+    assert gated == [False] * 5 + [True] * 5
+    assert dimension["length"]
+    assert estimate.locked
+    assert estimate.samples == 5
+
+
+def test_background_is_learned_on_gated_frames(tmp_path):
+    config.reload(["cv.segmentation=background", "cv.background_learn_frames=8"])
+    oak = op.OakPipeline(catalogue=utils.FeatureExtraction(str(tmp_path)))
+    empty = np.full((300, 300, 3), (60, 140, 60), dtype=np.uint8)
+    try:
+        for seq in range(10):
+            oak.process_frame(empty, [], seq=seq)
+        # 5 frames measured after the first one, the 5 others gated
+        assert oak.gated_frames == 5
+        assert oak.background.ready
+    finally:
+        oak.close()
+        config.reload()
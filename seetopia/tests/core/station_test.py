@@ -0,0 +1,49 @@
+import os
+import numpy as np
+from src.core import oak_pipeline as op
+from src.core import replay
+from src.core import station
+from src.utils import utils
+
+
+def test_recordings_are_run_as_devices(tmp_path):
+    top, side = tmp_path / "top", tmp_path / "side"
+    top.mkdir()
+    side.mkdir()
+    sources = station.discover_devices([str(top), str(side)])
+    assert [s.device_id for s in sources] == [str(top), str(side)]
+    assert all(s.info is None for s in sources)
+
+
+def test_replay_is_used_when_no_device_is_listed(tmp_path):
+    (source,) = station.discover_devices([], replay_fpath=str(tmp_path))
+    assert source.replay_fpath == str(tmp_path)
+
+
+def test_lane_records_the_streams(tmp_path):
+    source, out = str(tmp_path / "source"), str(tmp_path / "out")
+    with replay.Recorder(source) as recorder:
+        for seq in range(3):
+            recorder.write(seq, np.full((300, 300, 3), seq, dtype=np.uint8), [])
+    oak = op.OakPipeline(
+        catalogue=utils.FeatureExtraction(str(tmp_path)),
+        source=station.DeviceSource(source, None, source),
+    )
+    results = []
+
+    def on_frame(result):
+        results.append(result)
+        oak.vid_capture = len(results) < 3
+
+    lane = station.Lane(oak, on_frame)
+    lane.record_fpath = out
+    try:
+        # Replays without depthai nor the model blob
+        lane.run()
+    finally:
+        lane.close()
+    assert sorted(os.listdir(os.path.join(out, "rgb"))) == [
+        f"{seq:06d}.png" for seq in range(3)
+    ]
+    recorded = replay.ReplayDevice(out, loop=False)
+    assert [int(frame[0, 0, 0]) for frame in recorded.frames] == [0, 1, 2]
@@ -0,0 +1,54 @@
+import datetime
+import numpy as np
+from src.core import replay
+from src.core import stream_sync
+
+
+def message(seq, seconds):
+    return replay.ReplayMessage(seq, datetime.timedelta(seconds=seconds))
+
+
+def test_frames_are_paired_with_their_detections():
+    sync = stream_sync.StreamSync(["rgb", "detections"], max_pending=4)
+    # Detections of frame 0 were lost, frame 2 has no detections yet
+    for seq in range(3):
+        sync.add("rgb", message(seq, seq / 30))
+    sync.add("detections", message(1, 1 / 30))
+    messages = sync.pop()
+    assert messages["rgb"].getSequenceNum() == 1
+    assert messages["detections"].getSequenceNum() == 1
+    assert sync.mismatched == 1
+    assert sync.dropped == {"rgb": 1, "detections": 0}
+    assert sync.pop() is None
+    assert len(sync.pending["rgb"]) == 1
+
+
+def test_depth_is_paired_by_timestamp_and_buffers_are_bounded():
+    sync = stream_sync.StreamSync(
+        ["rgb", "detections", "depth"], by_timestamp=["depth"], max_pending=2
+    )
+    for seq in range(4):
+        sync.add("rgb", message(seq, seq / 30))
+        sync.add("detections", message(seq, seq / 30))
+        sync.add("depth", message(100 + seq, seq / 30 + 0.002))
+    assert sync.dropped == {"rgb": 2, "detections": 2, "depth": 2}
+    messages = sync.pop()
+    assert messages["rgb"].getSequenceNum() == 3
+    assert messages["depth"].getSequenceNum() == 103
+
+
+def test_replayed_streams_are_drained_without_blocking(tmp_path):
+    with replay.Recorder(str(tmp_path)) as recorder:
+        for seq in range(3):
+            recorder.write(seq, np.zeros((8, 8, 3), dtype=np.uint8), [])
+    with replay.ReplayDevice(str(tmp_path), loop=False) as device:
+        queues = {name: device.getOutputQueue(name) for name in ("rgb", "detections")}
+        sync = stream_sync.StreamSync(list(queues))
+        seqs = []
+        while True:
+            messages = sync.get(device, queues, timeout=0.1)
+            if messages is None:
+                break
+            seqs.append(messages["rgb"].getSequenceNum())
+    assert seqs == [0, 1, 2]
+    assert sync.mismatched == 0
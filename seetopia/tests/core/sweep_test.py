@@ -0,0 +1,24 @@
+from src.core import sweep
+
+
+def test_sweep_syntax_is_parsed():
+    space = sweep.parse_space(
+        ["cv.thres_min=range(40,70,10)", "cv.scale_factor_x=0.9,1"]
+    )
+    assert space == {"cv.thres_min": (40, 50, 60), "cv.scale_factor_x": (0.9, 1)}
+    assert len(sweep.settings(space)) == 6
+    assert len(sweep.settings(space, samples=4)) == 4
+
+
+def test_error_ignores_orientation():
+    measured = {"length": 10.0, "width": 20.0, "depth": 0}
+    assert sweep.frame_error(measured, {"length": 20.0, "width": 10.0}) == 0
+
+
+def test_pareto_front_drops_dominated_settings():
+    results = [
+        sweep.SweepResult(["a"], 1.0, 0.0, 5.0, 10),
+        sweep.SweepResult(["b"], 2.0, 0.0, 6.0, 10),
+        sweep.SweepResult(["c"], 3.0, 0.0, 2.0, 10),
+    ]
+    assert [r.overrides for r in sweep.pareto_front(results)] == [["a"], ["c"]]
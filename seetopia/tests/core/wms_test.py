@@ -0,0 +1,76 @@
+import time
+import threading
+import pytest
+from src.core import wms
+
+TRANSFERS = {
+    "334456": {"transfer_id": 334456, "state": "awaiting qa"},
+    "https://qrco.de/bc5V4T": {"transfer_id": 12345, "state": "awaiting qa"},
+}
+
+
+def stand_in(client, **kwargs):
+    server = client.submit(wms.StandInServer(TRANSFERS, **kwargs).start()).result()
+    client.base_url = server.url
+    return server
+
+
+def test_get_transfer_reuses_connections():
+    with wms.WmsClient("", pool_size=2) as client:
+        server = stand_in(client)
+        assert client.get_transfer("334456").result(1)["transfer_id"] == 334456
+        assert (
+            client.get_transfer("https://qrco.de/bc5V4T").result(1)["transfer_id"]
+            == 12345
+        )
+        assert client.get_transfer("unknown").result(1) is None
+        assert server.requests == 3
+        assert server.connections == 1
+        client.submit(server.close()).result()
+
+
+def test_retries_then_fails():
+    with wms.WmsClient("", retries=2, backoff=0.01) as client:
+        server = stand_in(client, failures=2)
+        assert client.get_transfer("334456").result(1)["transfer_id"] == 334456
+        server.failures = 3
+        with pytest.raises(wms.WmsError):
+            client.get_transfer("334456").result(1)
+        client.submit(server.close()).result()
+
+
+def test_slow_wms_does_not_block_the_caller():
+    with wms.WmsClient("", timeout=0.05, retries=0) as client:
+        server = stand_in(client, delay=0.5)
+        done = threading.Event()
+        start = time.monotonic()
+        future = client.get_transfer("334456", callback=lambda f: done.set())
+        assert time.monotonic() - start < 0.05
+        assert done.wait(1)
+        with pytest.raises(wms.WmsError):
+            future.result()
+        client.submit(server.close()).result()
+
+
+class GarbledServer(wms.StandInServer):
+    def _respond(self, method, path, body):
+        return "200 OK", b"<html>Bad gateway</html>"
+
+
+def test_invalid_json_raises_wms_error():
+    with wms.WmsClient("", retries=0) as client:
+        server = client.submit(GarbledServer(TRANSFERS).start()).result()
+        client.base_url = server.url
+        with pytest.raises(wms.WmsError):
+            client.get_transfer("334456").result(1)
+        client.submit(server.close()).result()
+
+
+def test_chunked_responses_are_read():
+    with wms.WmsClient("", timeout=1.0, retries=0) as client:
+        server = stand_in(client, chunked=True)
+        assert client.get_transfer("334456").result(2)["transfer_id"] == 334456
+        assert client.post_updates([{"key": "a"}]).result(2) == ["a"]
+        assert client.get_transfer("unknown").result(2) is None
+        assert server.connections == 1
+        client.submit(server.close()).result()
@@ -0,0 +1,30 @@
+import numpy as np
+from src.utils import background
+
+
+def mat(brightness=1.0):
+    frame = np.empty((60, 80, 3), dtype=np.uint8)
+    frame[:] = np.array((60, 140, 60)) * brightness
+    return frame
+
+
+def test_objects_are_segmented_from_the_mat():
+    model = background.BackgroundModel(learn_frames=3)
+    for _ in range(3):
+        model.learn(mat())
+    assert model.ready
+    frame = mat()
+    frame[10:30, 20:50] = (200, 180, 40)
+    mask = model.segment(frame)
+    assert (mask[10:30, 20:50] == 255).all()
+    assert mask.sum() == 20 * 30 * 255
+
+
+def test_reference_follows_lighting_drift():
+    model = background.BackgroundModel(learn_frames=1, alpha=0.5)
+    model.learn(mat())
+    assert model.segment(mat(1.3)).any()
+    for brightness in np.linspace(1.0, 1.3, 16):
+        frame = mat(brightness)
+        model.update(frame, model.segment(frame))
+    assert not model.segment(mat(1.3)).any()
@@ -0,0 +1,89 @@
+from concurrent import futures
+from src.utils import cache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_barcode_appears_once_while_visible():
+    clock = Clock()
+    lookups = cache.BarcodeLookupCache(appear_timeout=1.0, clock=clock)
+    assert lookups.appeared("334456")
+    for _ in range(5):
+        clock.now += 0.5
+        assert not lookups.appeared("334456")
+    clock.now += 1.5
+    assert lookups.appeared("334456")
+
+
+def test_misses_expire_and_hits_stay():
+    clock = Clock()
+    lookups = cache.BarcodeLookupCache(miss_ttl=10.0, clock=clock)
+    lookups.put("unknown")
+    lookups.put("334456", {"transfer_id": 334456})
+    clock.now += 9.0
+    assert lookups.get("unknown") == (True, None)
+    clock.now += 2.0
+    assert lookups.get("unknown") == (False, None)
+    assert lookups.get("334456") == (True, {"transfer_id": 334456})
+    lookups.clear()
+    assert lookups.get("334456") == (False, None)
+
+
+def test_concurrent_lookups_share_one_request():
+    pending = []
+
+    def fetch(key):
+        pending.append(futures.Future())
+        return pending[-1]
+
+    master_data = cache.MasterDataCache(clock=Clock())
+    first = master_data.get("334456", fetch)
+    second = master_data.get("334456", fetch)
+    assert first is second and master_data.requests == 1
+    pending[0].set_result({"transfer_id": 334456})
+    assert master_data.get("334456", fetch).result() == {"transfer_id": 334456}
+    assert master_data.requests == 1
+
+
+def test_invalidated_lookups_are_fetched_again():
+    pending = []
+
+    def fetch(key):
+        pending.append(futures.Future())
+        return pending[-1]
+
+    master_data = cache.MasterDataCache(clock=Clock())
+    master_data.get("https://qrco.de/bc5V4T", fetch)
+    pending[0].set_result({"transfer_id": 12345})
+    master_data.invalidate(transfer_id=12345)
+    assert not len(master_data)
+    # Completed after the invalidation, so not cached
+    master_data.get("334456", fetch)
+    master_data.invalidate("334456")
+    pending[1].set_result({"transfer_id": 334456})
+    master_data.get("334456", fetch)
+    assert master_data.requests == 3
+
+
+def test_lookups_of_an_invalidated_transfer_in_flight_are_not_cached():
+    pending = []
+
+    def fetch(key):
+        pending.append(futures.Future())
+        return pending[-1]
+
+    master_data = cache.MasterDataCache(clock=Clock())
+    master_data.get("https://qrco.de/bc5V4T", fetch)
+    master_data.invalidate("12345", transfer_id=12345)
+    pending[0].set_result({"transfer_id": 12345, "state": "awaiting qa"})
+    assert not len(master_data)
+    # Fetched after the invalidation
+    master_data.get("https://qrco.de/bc5V4T", fetch)
+    pending[1].set_result({"transfer_id": 12345, "state": "done"})
+    assert len(master_data) == 1
@@ -0,0 +1,32 @@
+import os
+import cv2
+import numpy as np
+from src.utils import utils
+
+
+def test_empty_catalogue_writes_no_cache(tmp_path):
+    path = tmp_path / "catalogue"
+    path.mkdir()
+    rng = np.random.default_rng(0)
+    cv2.imwrite(str(path / "box.png"), rng.integers(0, 256, (200, 200), dtype=np.uint8))
+    catalogue = utils.FeatureExtraction(str(path), cache=True)
+    catalogue.update_prod_list()
+    assert os.path.exists(catalogue.cache_fpath)
+
+    os.remove(path / "box.png")
+    catalogue = utils.FeatureExtraction(str(path), cache=True)
+    catalogue.update_prod_list()
+    assert not os.path.exists(catalogue.cache_fpath)
+    assert not len(catalogue.index.query(np.zeros((5, 32), dtype=np.uint8))[0])
+
+
+def test_unwritable_cache_is_skipped(tmp_path):
+    path = tmp_path / "catalogue"
+    path.mkdir()
+    rng = np.random.default_rng(0)
+    cv2.imwrite(str(path / "box.png"), rng.integers(0, 256, (200, 200), dtype=np.uint8))
+    catalogue = utils.FeatureExtraction(str(path), cache=True)
+    catalogue.cache_fpath = str(tmp_path / "missing" / "catalogue.orb.npz")
+    catalogue.update_prod_list()
+    assert len(catalogue.des_list) == 1
+    assert not os.path.exists(catalogue.cache_fpath)
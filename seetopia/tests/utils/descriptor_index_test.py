@@ -0,0 +1,37 @@
+import numpy as np
+from src.utils import utils
+
+
+def flip_bits(des, n, rng):
+    """Returns ``des`` with ``n`` random bits flipped in every row"""
+    bits = np.unpackbits(des, axis=1)
+    for row in bits:
+        row[rng.choice(bits.shape[1], n, replace=False)] ^= 1
+    return np.packbits(bits, axis=1)
+
+
+def catalogue(rng):
+    logo = rng.integers(0, 256, (30, 32), dtype=np.uint8)
+    # The logo is printed twice on the first product
+    repeated = np.concatenate([logo, flip_bits(logo, 2, rng)])
+    plain = rng.integers(0, 256, (60, 32), dtype=np.uint8)
+    return logo, [repeated, plain]
+
+
+def test_repeated_patterns_pass_the_ratio_test():
+    rng = np.random.default_rng(0)
+    logo, des_list = catalogue(rng)
+    index = utils.DescriptorIndex(des_list)
+    ranked, votes = index.query(flip_bits(logo, 3, rng))
+    assert ranked[0] == 0
+    assert votes[0] == len(logo)
+
+
+def test_distinct_products_are_told_apart():
+    rng = np.random.default_rng(1)
+    _, des_list = catalogue(rng)
+    index = utils.DescriptorIndex(des_list)
+    ranked, votes = index.query(flip_bits(des_list[1][:20], 3, rng), thres=5)
+    assert ranked.tolist() == [1]
+    noise = rng.integers(0, 256, (50, 32), dtype=np.uint8)
+    assert not len(index.query(noise, thres=5)[0])
@@ -0,0 +1,40 @@
+from src.utils import estimator
+
+
+def box(length, width=10.0, depth=5.0):
+    return {"length": length, "width": width, "depth": depth}
+
+
+def test_stable_measurements_lock_in():
+    rolling = estimator.RollingMeasurement(min_samples=5, lock_std=0.3)
+    estimates = [rolling.update(box(20.0 + 0.1 * (i % 2))) for i in range(5)]
+    assert not any(e.locked for e in estimates[:4])
+    assert estimates[-1].locked
+    assert estimates[-1].dimension["length"] == 20.0
+
+
+def test_persistent_divergence_unlocks():
+    rolling = estimator.RollingMeasurement(min_samples=3, unlock_frames=3)
+    for _ in range(3):
+        rolling.update(box(20.0))
+    assert rolling.locked
+    # A single broken contour does not unlock the estimate
+    assert rolling.update(box(30.0)).locked
+    assert rolling.update(box(20.0)).dimension["length"] == 20.0
+    for _ in range(2):
+        assert rolling.update(box(30.0)).locked
+    estimate = rolling.update(box(30.0))
+    assert not estimate.locked and estimate.samples == 1
+    for _ in range(2):
+        estimate = rolling.update(box(30.0))
+    assert estimate.locked and estimate.dimension["length"] == 30.0
+
+
+def test_missing_object_resets():
+    rolling = estimator.RollingMeasurement(min_samples=3, max_missing=4)
+    for _ in range(3):
+        rolling.update(box(20.0))
+    for _ in range(3):
+        assert rolling.update(box(0)).locked
+    assert rolling.update(box(0)) is None
+    assert rolling.update(box(12.0)).dimension["length"] == 12.0
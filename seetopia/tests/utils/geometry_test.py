@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+from src.utils import utils
+
+
+def boxes_image():
+    img = np.zeros((300, 300), dtype=np.uint8)
+    for center, size, angle in [
+        ((60, 60), (80, 40), 0),
+        ((200, 80), (60, 30), 30),
+        ((150, 220), (120, 50), -15),
+        ((260, 260), (4, 4), 0),
+    ]:
+        cv2.fillPoly(img, [cv2.boxPoints((center, size, angle)).astype(np.int32)], 255)
+    contours, _ = cv2.findContours(img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    return contours
+
+
+def test_areas_match_opencv():
+    contours = boxes_image()
+    assert np.allclose(
+        utils.contour_areas(contours), [cv2.contourArea(cnt) for cnt in contours]
+    )
+
+
+def test_boxes_match_the_per_contour_measurements():
+    contours = boxes_image()
+    scale_factor = [0.92, 0.92]
+    boxes = utils.measure_boxes(contours, scale_factor, area_min=100)
+    assert len(boxes.index) == 3
+    for i, box, length, width in zip(
+        boxes.index, boxes.boxes, boxes.length, boxes.width
+    ):
+        expected = cv2.boxPoints(cv2.minAreaRect(contours[i])).astype(np.int32)
+        assert (box == expected).all()
+        corners = utils.re_order(expected)
+        assert length == round(
+            utils.find_distance(
+                corners[0] // scale_factor[0], corners[1] // scale_factor[0]
+            )
+            / 10,
+            1,
+        )
+        assert width == round(
+            utils.find_distance(
+                corners[0] // scale_factor[1], corners[2] // scale_factor[1]
+            )
+            / 10,
+            1,
+        )
+
+
+def test_depth_is_cropped_to_the_preview_for_off_centre_objects():
+    # Depth of the full 16:9 sensor, the square preview being its centre crop
+    depth = np.full((360, 640), 570, dtype=np.uint16)
+    depth[240:312, 164:236] = 470
+    contour = np.array([[[20, 200]], [[80, 200]], [[80, 260]], [[20, 260]]])
+    fov = utils.preview_fov((1920, 1080), (300, 300))
+    cropped = utils.crop_fov(depth, fov)
+    heights, _ = utils.measure_heights(cropped, [contour], (300, 300, 3), 57)
+    assert heights[0] == 10
+    stretched, _ = utils.measure_heights(depth, [contour], (300, 300, 3), 57)
+    assert stretched[0] != 10
@@ -0,0 +1,23 @@
+import json
+from src.utils import latency
+
+
+def test_percentiles_cover_the_latest_window():
+    tracer = latency.LatencyTracer(window=100)
+    for ms in range(200):
+        tracer.record("draw_measurements", ms / 1000)
+    stats = tracer.summary()["stages"]["draw_measurements"]
+    assert stats["count"] == 200
+    assert stats["p50"] == 149.5
+    assert stats["max"] == 199
+
+
+def test_summary_is_written_to_a_run_directory(tmp_path):
+    tracer = latency.LatencyTracer()
+    with tracer.stage("queue_wait"):
+        tracer.frame()
+    fpath = tracer.write(str(tmp_path))
+    with open(fpath) as f:
+        summary = json.load(f)
+    assert summary["frames"] == 1
+    assert summary["stages"]["queue_wait"]["count"] == 1
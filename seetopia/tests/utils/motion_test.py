@@ -0,0 +1,41 @@
+import numpy as np
+from src.utils import motion
+
+
+def scene(x=10):
+    frame = np.full((120, 160, 3), 90, dtype=np.uint8)
+    frame[40:80, x : x + 40] = 220
+    return frame
+
+
+def test_static_scene_is_reused_until_refresh():
+    detector = motion.ChangeDetector(refresh=3)
+    rng = np.random.default_rng(0)
+    noisy = [
+        np.clip(scene() + rng.normal(0, 2, (120, 160, 3)), 0, 255).astype(np.uint8)
+        for _ in range(5)
+    ]
+    assert [detector.changed(frame) for frame in noisy] == [
+        True,
+        False,
+        False,
+        False,
+        True,
+    ]
+
+
+def test_moved_object_is_a_change():
+    detector = motion.ChangeDetector()
+    assert detector.changed(scene())
+    assert detector.changed(scene(x=60))
+    assert not detector.changed(scene(x=60))
+
+
+def test_frames_settling_after_a_change_are_flagged():
+    detector = motion.ChangeDetector(settle=2)
+    changed, settling = [], []
+    for x in (10, 10, 10, 10, 60, 60, 60):
+        changed.append(detector.changed(scene(x)))
+        settling.append(detector.settling)
+    assert changed == [True, False, False, False, True, False, False]
+    assert settling == [False, True, True, False, False, True, True]